@@ -1,91 +1,287 @@
-import pandas as pd
-from sqlalchemy import create_engine, text
-import os
-import json
-from sqlalchemy.exc import SQLAlchemyError
-from datetime import datetime
-
-def main():
-    # 数据库连接设置
-    database_uri = os.environ.get('DATABASE_URI')
-    if not database_uri:
-        raise ValueError("未找到环境变量'DATABASE_URI'，请检查环境变量设置。")
-
-    try:
-        engine = create_engine(database_uri)
-        print("数据库连接已建立。")
-    except SQLAlchemyError as e:
-        print("数据库连接失败:", e)
-        exit()
-
-    uploaded_files_path = 'uploaded_files.json'
-
-    if os.path.exists(uploaded_files_path):
-        with open(uploaded_files_path, 'r', encoding='utf-8') as f:
-            uploaded_files = json.load(f)
-    else:
-        uploaded_files = []
-
-    folder_path = "C:\\Users\\86138\\Desktop\\RouteMate\\DataSets"
-
-    for file_name in os.listdir(folder_path):
-        if file_name.endswith('.csv'):
-            if file_name in uploaded_files:
-                print(f"文件 {file_name} 已上传，跳过该文件。")
-                continue
-
-            try:
-                user_id = int(file_name.split('_')[1])  # 提取用户ID
-                file_path = os.path.join(folder_path, file_name)
-
-                # 读取并检查数据
-                data = pd.read_csv(file_path)
-                if not all(column in data.columns for column in ['latitude', 'longitude', 'timestamp']):
-                    raise ValueError(f"文件 {file_name} 缺少必要的列。")
-                
-                # 对经纬度进行四舍五入操作（小数点后四位）
-                data['latitude'] = data['latitude'].round(4)
-                data['longitude'] = data['longitude'].round(4)
-
-                # 确保 timestamp 列为数值型并排序
-                data['timestamp'] = pd.to_numeric(data['timestamp'], errors='coerce')
-                data.dropna(subset=['timestamp'], inplace=True)
-                data = data.sort_values(by='timestamp')
-
-                # 设置时间阈值以划分轨迹
-                time_threshold = 300  # 5分钟
-                data['trajectory_id'] = (data['timestamp'].diff() > time_threshold).cumsum().fillna(0).astype(int)
-
-                # 转换为 JSON 格式以插入数据库
-                grouped_data = data.groupby('trajectory_id').apply(lambda x: {
-                    "trajectory_id": int(x['trajectory_id'].iloc[0]),
-                    "nodes": x[['latitude', 'longitude', 'timestamp']].to_dict(orient='records')
-                }).tolist()
-
-                # 将轨迹数据插入数据库
-                with engine.connect() as conn:
-                    query = text("""
-                        INSERT INTO Trajectory (user_id, trajectory_data)
-                        VALUES (:user_id, :trajectory_data)
-                    """)
-                    for traj in grouped_data:
-                        conn.execute(query, {"user_id": user_id, "trajectory_data": json.dumps(traj)})
-                
-                print(f"用户 {user_id} 的数据已成功导入数据库")
-
-                # 更新已上传的文件列表
-                uploaded_files.append(file_name)
-                with open(uploaded_files_path, 'w', encoding='utf-8') as f:
-                    json.dump(uploaded_files, f, ensure_ascii=False, indent=4)
-
-            except FileNotFoundError:
-                print(f"文件 {file_name} 未找到，请检查路径。")
-            except ValueError as ve:
-                print(f"数据验证错误：{ve}")
-            except SQLAlchemyError as se:
-                print(f"数据库插入错误：用户 {user_id} - {se}")
-
-    print("所有用户的轨迹数据已成功导入数据库。")
-
-if __name__ == "__main__":
-    main()
+import pandas as pd
+import numpy as np
+from sqlalchemy import create_engine, text
+import argparse
+import multiprocessing
+import os
+import json
+import math
+import time
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime
+
+# 相邻轨迹点的时间间隔超过该值（秒）时划分为新的轨迹
+TIME_THRESHOLD = 300  # 5分钟
+
+REQUIRED_COLUMNS = ['latitude', 'longitude', 'timestamp']
+
+# 已导入文件的检查点表：文件名与该文件的轨迹在同一个事务中写入，提交即完成检查点
+CREATE_IMPORTED_FILES_QUERY = text("""
+    CREATE TABLE IF NOT EXISTS ImportedFile (
+        file_name VARCHAR(255) PRIMARY KEY,
+        user_id INT NOT NULL,
+        imported_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+""")
+
+CHECKPOINT_QUERY = text("INSERT INTO ImportedFile (file_name, user_id) VALUES (:file_name, :user_id)")
+
+INSERT_QUERY = text("""
+    INSERT INTO Trajectory (user_id, trajectory_data, start_time, end_time,
+                            min_latitude, max_latitude, min_longitude, max_longitude)
+    VALUES (:user_id, :trajectory_data, :start_time, :end_time,
+            :min_latitude, :max_latitude, :min_longitude, :max_longitude)
+""")
+
+DEFAULT_FOLDER = "C:\\Users\\86138\\Desktop\\RouteMate\\DataSets"
+
+# 与 backend/app/cache.py 中的数据版本键一致，递增后 /track/analyze 的缓存结果失效
+TRAJECTORY_VERSION_KEY = "data_version_trajectory_{user_id}"
+
+
+def load_uploaded_files(engine, uploaded_files_path, journal_path):
+    """
+    读取已导入的文件：ImportedFile 检查点表，以及旧版的 uploaded_files.json 与逐行追加的检查点日志。
+
+    日志每行是一个文件导入完成后写入的 JSON 记录；进程在写入中途退出时最后一行可能不完整，直接忽略。
+    """
+    with engine.begin() as conn:
+        conn.execute(CREATE_IMPORTED_FILES_QUERY)
+        uploaded_files = set(conn.execute(text("SELECT file_name FROM ImportedFile")).scalars())
+    if os.path.exists(uploaded_files_path):
+        with open(uploaded_files_path, 'r', encoding='utf-8') as f:
+            uploaded_files.update(json.load(f))
+    if os.path.exists(journal_path):
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    uploaded_files.add(json.loads(line)['file'])
+                except (ValueError, KeyError):
+                    continue
+    return uploaded_files
+
+
+def parse_user_id(file_name):
+    """从 user_<id>_… 格式的文件名中提取用户 ID"""
+    try:
+        return int(file_name.split('_')[1])
+    except (IndexError, ValueError):
+        raise ValueError(f"文件名 {file_name} 不符合 user_<id>_… 的格式。")
+
+
+def read_points(file_path, chunk_size):
+    """
+    分块读取 CSV 中所需的三列并清洗，只保留紧凑的数值数组，再按时间戳整体排序。
+
+    返回：
+    - (latitudes, longitudes, timestamps): 按时间戳排序的 NumPy 数组。
+    """
+    latitudes, longitudes, timestamps = [], [], []
+    try:
+        chunks = pd.read_csv(file_path, usecols=REQUIRED_COLUMNS, chunksize=chunk_size)
+        for chunk in chunks:
+            # 确保 timestamp 列为数值型
+            chunk['timestamp'] = pd.to_numeric(chunk['timestamp'], errors='coerce')
+            chunk = chunk.dropna(subset=['timestamp'])
+            # 对经纬度进行四舍五入操作（小数点后四位）
+            latitudes.append(chunk['latitude'].round(4).to_numpy())
+            longitudes.append(chunk['longitude'].round(4).to_numpy())
+            timestamps.append(chunk['timestamp'].to_numpy())
+    except ValueError as e:
+        if 'Usecols' in str(e):
+            raise ValueError(f"文件 {os.path.basename(file_path)} 缺少必要的列。")
+        raise
+
+    if not timestamps:
+        return np.empty(0), np.empty(0), np.empty(0)
+    latitudes = np.concatenate(latitudes)
+    longitudes = np.concatenate(longitudes)
+    timestamps = np.concatenate(timestamps)
+    order = np.argsort(timestamps, kind='stable')
+    return latitudes[order], longitudes[order], timestamps[order]
+
+
+def iter_trajectories(latitudes, longitudes, timestamps):
+    """
+    按时间间隔划分轨迹：相邻两点的时间差超过 TIME_THRESHOLD 时开始新的轨迹。
+
+    边界由一次向量化的差分得到，不再使用 groupby(...).apply。
+
+    产出：
+    - trajectory: 包含 'trajectory_id' 与 'nodes' 的字典。
+    """
+    if not len(timestamps):
+        return
+    boundaries = np.flatnonzero(np.diff(timestamps) > TIME_THRESHOLD) + 1
+    starts = np.concatenate(([0], boundaries)).tolist()
+    stops = np.concatenate((boundaries, [len(timestamps)])).tolist()
+    latitudes, longitudes, timestamps = latitudes.tolist(), longitudes.tolist(), timestamps.tolist()
+    for trajectory_id, (start, stop) in enumerate(zip(starts, stops)):
+        yield {
+            "trajectory_id": trajectory_id,
+            "nodes": [
+                {"latitude": latitudes[i], "longitude": longitudes[i], "timestamp": timestamps[i]}
+                for i in range(start, stop)
+            ]
+        }
+
+
+def trajectory_extent(trajectory):
+    """
+    轨迹的时间范围与包围盒，与 backend/app/track/models.py 中的 Trajectory.extent 一致，用于按范围分析时的条件下推。
+    轨迹点已按时间排序，首末点即为时间范围。
+    """
+    nodes = trajectory['nodes']
+    latitudes = [node['latitude'] for node in nodes]
+    longitudes = [node['longitude'] for node in nodes]
+    return {
+        "start_time": math.floor(nodes[0]['timestamp']),
+        "end_time": math.ceil(nodes[-1]['timestamp']),
+        "min_latitude": min(latitudes),
+        "max_latitude": max(latitudes),
+        "min_longitude": min(longitudes),
+        "max_longitude": max(longitudes),
+    }
+
+
+def connect_cache(redis_url):
+    """连接后端使用的 Redis，未设置 REDIS_URL 时返回 None"""
+    if not redis_url:
+        return None
+    import redis
+    return redis.Redis.from_url(redis_url)
+
+
+def bump_trajectory_version(cache, user_id):
+    """递增用户的轨迹版本，使后端按旧轨迹缓存的分析结果失效"""
+    if cache is None:
+        return
+    try:
+        cache.incr(TRAJECTORY_VERSION_KEY.format(user_id=user_id))
+    except Exception as e:
+        print(f"递增用户 {user_id} 的轨迹版本失败：{e}")
+
+
+_engine = None
+
+
+def _init_worker(database_uri):
+    # 每个进程使用自己的数据库连接池
+    global _engine
+    _engine = create_engine(database_uri)
+
+
+def import_file(task):
+    """
+    导入一个 CSV 文件：轨迹以 executemany 分批写入，与 ImportedFile 中的检查点记录在同一个事务中提交，
+    进程在任何时刻退出都不会出现轨迹已写入而文件未记录（重新运行时重复导入）的情况。
+
+    返回：
+    - 导入结果字典，成功时包含 file、user_id、rows、trajectories 与 seconds，失败时 rows 为 None。
+    """
+    folder_path, file_name, chunk_size, batch_size = task
+    started = time.perf_counter()
+    user_id = None
+    try:
+        user_id = parse_user_id(file_name)
+        file_path = os.path.join(folder_path, file_name)
+
+        # 读取并检查数据
+        latitudes, longitudes, timestamps = read_points(file_path, chunk_size)
+
+        # 将轨迹数据插入数据库
+        trajectory_count = 0
+        with _engine.begin() as conn:
+            # 先写入检查点：同一文件被并发导入时，后提交的事务因主键冲突整体回滚
+            conn.execute(CHECKPOINT_QUERY, {"file_name": file_name, "user_id": user_id})
+            batch = []
+            for trajectory in iter_trajectories(latitudes, longitudes, timestamps):
+                batch.append(dict(trajectory_extent(trajectory), user_id=user_id, trajectory_data=json.dumps(trajectory)))
+                if len(batch) >= batch_size:
+                    conn.execute(INSERT_QUERY, batch)
+                    trajectory_count += len(batch)
+                    batch = []
+            if batch:
+                conn.execute(INSERT_QUERY, batch)
+                trajectory_count += len(batch)
+
+        return {
+            "file": file_name, "user_id": user_id, "rows": len(timestamps),
+            "trajectories": trajectory_count, "seconds": round(time.perf_counter() - started, 3)
+        }
+
+    except FileNotFoundError:
+        print(f"文件 {file_name} 未找到，请检查路径。")
+    except ValueError as ve:
+        print(f"数据验证错误：{ve}")
+    except SQLAlchemyError as se:
+        print(f"数据库插入错误：用户 {user_id} - {se}")
+    return {"file": file_name, "user_id": user_id, "rows": None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将清洗后的轨迹 CSV 文件导入 MySQL。")
+    parser.add_argument('--folder', default=DEFAULT_FOLDER, help="CSV 文件所在目录")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="并行导入的进程数")
+    parser.add_argument('--chunk-size', type=int, default=100000, help="分块读取 CSV 时每块的行数")
+    parser.add_argument('--batch-size', type=int, default=1000, help="每次 executemany 写入的轨迹数")
+    parser.add_argument('--journal', default='uploaded_files.journal', help="旧版逐行追加的检查点日志，其中的文件同样跳过")
+    args = parser.parse_args()
+
+    # 数据库连接设置
+    database_uri = os.environ.get('DATABASE_URI')
+    if not database_uri:
+        raise ValueError("未找到环境变量'DATABASE_URI'，请检查环境变量设置。")
+
+    try:
+        _init_worker(database_uri)
+        print("数据库连接已建立。")
+    except SQLAlchemyError as e:
+        print("数据库连接失败:", e)
+        exit()
+
+    cache = connect_cache(os.environ.get('REDIS_URL'))
+    if cache is None:
+        print("未设置环境变量'REDIS_URL'，导入完成后请清空后端的 Redis 缓存。")
+
+    uploaded_files = load_uploaded_files(_engine, 'uploaded_files.json', args.journal)
+
+    tasks = []
+    for file_name in sorted(os.listdir(args.folder)):
+        if file_name.endswith(('.csv', '.csv.gz')):
+            if file_name in uploaded_files:
+                print(f"文件 {file_name} 已上传，跳过该文件。")
+                continue
+            tasks.append((args.folder, file_name, args.chunk_size, args.batch_size))
+
+    started = time.perf_counter()
+    total_rows = 0
+    failed = 0
+    workers = max(1, min(args.workers, len(tasks)))
+    pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(database_uri,)) if workers > 1 else None
+    try:
+        results = pool.imap_unordered(import_file, tasks) if pool else map(import_file, tasks)
+        for result in results:
+            if result['rows'] is None:
+                failed += 1
+                continue
+            bump_trajectory_version(cache, result['user_id'])
+            total_rows += result['rows']
+            rate = result['rows'] / result['seconds'] if result['seconds'] else 0
+            print(f"用户 {result['user_id']} 的数据已成功导入数据库"
+                  f"（{result['rows']} 行，{result['trajectories']} 条轨迹，{rate:.0f} 行/秒）")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    elapsed = time.perf_counter() - started
+    rate = total_rows / elapsed if elapsed else 0
+    print(f"共导入 {total_rows} 行，耗时 {elapsed:.1f} 秒，吞吐量 {rate:.0f} 行/秒。")
+    if failed:
+        print(f"{failed} 个文件导入失败，重新运行将只导入这些文件。")
+    else:
+        print("所有用户的轨迹数据已成功导入数据库。")
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,187 @@
-import pandas as pd
-from datetime import datetime
-import os
-
-# 设置包含.plt文件的文件夹路径
-folder_path = "C:\\Users\\86138\Downloads\\Geolife Trajectories 1.3\\Geolife Trajectories 1.3\Data\\140\\Trajectory"  # 替换为实际的文件夹路径
-output_folder = "C:\\Users\\86138\\Desktop\\RouteMate\\DataSets"  # 替换为保存清洗后文件的路径
-
-# 如果输出文件夹不存在，创建它
-if not os.path.exists(output_folder):
-    os.makedirs(output_folder)
-
-def clean_plt_file(file_path):
-    # 读取.plt文件，跳过前6行的头部信息
-    data = pd.read_csv(file_path, skiprows=6, header=None)
-
-    # 为数据列命名
-    data.columns = ["latitude", "longitude", "altitude", "speed", "julian_time", "date", "time"]
-
-    # 合并 'date' 和 'time' 列为一个新的datetime列
-    data['datetime'] = pd.to_datetime(data['date'] + ' ' + data['time'], format='%Y-%m-%d %H:%M:%S')
-
-    # 将合并后的datetime转换为UNIX时间戳
-    data['timestamp'] = data['datetime'].apply(lambda x: int(datetime.timestamp(x)))
-
-    # 保留必要的列
-    cleaned_data = data[['latitude', 'longitude', 'timestamp']]
-
-    return cleaned_data
-
-# 设定用户ID（假设整个文件夹对应一个用户）
-user_id = 100000  # 可以根据实际情况调整(对应本地数据库中的id)
-
-# 初始化一个DataFrame用于存储合并的轨迹数据
-all_trajectory_data = pd.DataFrame()
-
-# 遍历文件夹中的所有.plt文件
-for file_name in os.listdir(folder_path):
-    if file_name.endswith('.plt'):
-        file_path = os.path.join(folder_path, file_name)
-        cleaned_data = clean_plt_file(file_path)
-
-        # 为每个清洗后的数据添加 user_id 和轨迹日期列
-        cleaned_data['user_id'] = user_id
-        cleaned_data['trajectory_date'] = file_name.replace('.plt', '')  # 用文件名表示轨迹日期
-
-        # 将清洗后的数据合并到总DataFrame中
-        all_trajectory_data = pd.concat([all_trajectory_data, cleaned_data], ignore_index=True)
-
-# 将合并的轨迹数据保存为一个CSV文件
-output_file_path = os.path.join(output_folder, f"user_{user_id}_trajectory.csv")
-all_trajectory_data.to_csv(output_file_path, index=False)
-print(f"已清洗并保存用户 {user_id} 的轨迹数据至文件：{output_file_path}")
+import pandas as pd
+from dateutil import tz
+import argparse
+import multiprocessing
+import os
+import time
+
+# Geolife 数据集的 Data 目录（其下为 <用户>/Trajectory/*.plt）
+DEFAULT_DATA_FOLDER = "C:\\Users\\86138\\Downloads\\Geolife Trajectories 1.3\\Geolife Trajectories 1.3\\Data"  # 替换为实际的文件夹路径
+DEFAULT_OUTPUT_FOLDER = "C:\\Users\\86138\\Desktop\\RouteMate\\DataSets"  # 替换为保存清洗后文件的路径
+
+PLT_COLUMNS = ["latitude", "longitude", "altitude", "speed", "julian_time", "date", "time"]
+OUTPUT_COLUMNS = ['latitude', 'longitude', 'timestamp', 'user_id', 'trajectory_date']
+
+# 输出格式与文件扩展名；csv.gz 可直接由 csv_to_mysql.py 导入
+OUTPUT_FORMATS = {'csv.gz': '.csv.gz', 'csv': '.csv', 'parquet': '.parquet'}
+
+EPOCH = pd.Timestamp(0)
+
+
+def clean_plt_file(file_path, timezone=None):
+    """
+    读取并清洗一个 .plt 文件。
+
+    日期与时间整列解析为 datetime，再整列换算为 UNIX 时间戳（秒），不再逐行调用 datetime.timestamp。
+
+    参数：
+    - timezone: .plt 中时间所在的时区名（如 'UTC'）；为 None 时按本机时区解释，与 datetime.timestamp 一致。
+
+    返回：
+    - cleaned_data: 包含 latitude、longitude、timestamp 列的 DataFrame。
+    """
+    # 读取.plt文件，跳过前6行的头部信息
+    data = pd.read_csv(file_path, skiprows=6, header=None, names=PLT_COLUMNS,
+                       usecols=["latitude", "longitude", "date", "time"])
+
+    # 合并 'date' 和 'time' 列为一个新的datetime列
+    datetimes = pd.to_datetime(data['date'] + ' ' + data['time'], format='%Y-%m-%d %H:%M:%S')
+
+    # 将合并后的datetime整列转换为UNIX时间戳
+    zone = tz.tzlocal() if timezone is None else tz.gettz(timezone)
+    datetimes = datetimes.dt.tz_localize(zone, ambiguous=True, nonexistent='shift_forward')
+    data['timestamp'] = (datetimes.dt.tz_convert('UTC').dt.tz_localize(None) - EPOCH) // pd.Timedelta(seconds=1)
+
+    # 保留必要的列
+    return data[['latitude', 'longitude', 'timestamp']]
+
+
+class _CsvWriter:
+    def __init__(self, path, compression):
+        self.path = path
+        self.compression = compression
+        self.mode = 'w'
+
+    def write(self, frame):
+        # gzip 流可以追加写入多个成员，读取时按一个文件解压
+        frame.to_csv(self.path, mode=self.mode, header=self.mode == 'w', index=False, compression=self.compression)
+        self.mode = 'a'
+
+    def close(self):
+        pass
+
+
+class _ParquetWriter:
+    def __init__(self, path):
+        # pyarrow 为可选依赖，只在输出 Parquet 时需要
+        import pyarrow
+        import pyarrow.parquet
+        self.pyarrow = pyarrow
+        self.path = path
+        self.writer = None
+        self.schema = None
+
+    def write(self, frame):
+        table = self.pyarrow.Table.from_pandas(frame, schema=self.schema, preserve_index=False)
+        if self.writer is None:
+            self.schema = table.schema
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def convert_user(task):
+    """
+    转换一个用户的全部 .plt 文件，逐个文件清洗后追加写入该用户的输出文件，内存中只保留当前文件的数据。
+
+    输出先写入临时文件，全部完成后再改名，中途退出不会留下不完整的输出。
+
+    返回：
+    - 转换结果字典，包含 user_id、files、rows、seconds 与 output；失败时包含 error。
+    """
+    user_folder, user_id, output_folder, output_format, timezone = task
+    started = time.perf_counter()
+    trajectory_folder = os.path.join(user_folder, 'Trajectory')
+    output_path = os.path.join(output_folder, f"user_{user_id}_trajectory{OUTPUT_FORMATS[output_format]}")
+    temporary_path = output_path + '.tmp'
+
+    files = rows = 0
+    try:
+        if output_format == 'parquet':
+            writer = _ParquetWriter(temporary_path)
+        else:
+            writer = _CsvWriter(temporary_path, 'gzip' if output_format == 'csv.gz' else None)
+        try:
+            for file_name in sorted(os.listdir(trajectory_folder)):
+                if not file_name.endswith('.plt'):
+                    continue
+                cleaned_data = clean_plt_file(os.path.join(trajectory_folder, file_name), timezone)
+
+                # 为每个清洗后的数据添加 user_id 和轨迹日期列
+                cleaned_data = cleaned_data.assign(user_id=user_id, trajectory_date=file_name.replace('.plt', ''))
+                writer.write(cleaned_data[OUTPUT_COLUMNS])
+                files += 1
+                rows += len(cleaned_data)
+        finally:
+            writer.close()
+    except Exception as e:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        return {"user_id": user_id, "error": str(e)}
+
+    if files:
+        os.replace(temporary_path, output_path)
+    return {
+        "user_id": user_id, "files": files, "rows": rows,
+        "seconds": round(time.perf_counter() - started, 3), "output": output_path if files else None
+    }
+
+
+def find_user_folders(data_folder, user_id_offset):
+    """
+    遍历 Geolife 的 Data 目录，返回 [(用户目录, 用户ID)]；用户ID 为 Geolife 用户编号加上偏移量（对应本地数据库中的id）。
+    """
+    users = []
+    for name in sorted(os.listdir(data_folder)):
+        user_folder = os.path.join(data_folder, name)
+        if name.isdigit() and os.path.isdir(os.path.join(user_folder, 'Trajectory')):
+            users.append((user_folder, int(name) + user_id_offset))
+    return users
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将 Geolife 数据集的 .plt 轨迹文件转换为按用户划分的列式文件。")
+    parser.add_argument('--data', default=DEFAULT_DATA_FOLDER, help="Geolife 数据集的 Data 目录")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_FOLDER, help="保存清洗后文件的目录")
+    parser.add_argument('--format', choices=sorted(OUTPUT_FORMATS), default='csv.gz', help="输出格式")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="并行处理用户的进程数")
+    parser.add_argument('--user-id-offset', type=int, default=100000, help="用户ID = Geolife 用户编号 + 偏移量")
+    parser.add_argument('--timezone', default=None, help="轨迹时间所在的时区（Geolife 为 UTC），默认按本机时区解释")
+    args = parser.parse_args()
+
+    # 如果输出文件夹不存在，创建它
+    if not os.path.exists(args.output):
+        os.makedirs(args.output)
+
+    tasks = [
+        (user_folder, user_id, args.output, args.format, args.timezone)
+        for user_folder, user_id in find_user_folders(args.data, args.user_id_offset)
+    ]
+
+    started = time.perf_counter()
+    total_rows = 0
+    workers = max(1, min(args.workers, len(tasks)))
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        results = pool.imap_unordered(convert_user, tasks) if pool else map(convert_user, tasks)
+        for result in results:
+            if 'error' in result:
+                print(f"用户 {result['user_id']} 的轨迹数据清洗失败：{result['error']}")
+            elif result['output']:
+                total_rows += result['rows']
+                print(f"已清洗并保存用户 {result['user_id']} 的轨迹数据至文件：{result['output']}"
+                      f"（{result['files']} 个文件，{result['rows']} 行）")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    elapsed = time.perf_counter() - started
+    print(f"共清洗 {len(tasks)} 个用户、{total_rows} 行，耗时 {elapsed:.1f} 秒。")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,13 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
+    # 结构化日志与 /metrics 指标
+    from backend.app.log_config import configure_logging
+    from backend.app.metrics import init_metrics
+
+    configure_logging(app.config['LOG_LEVEL'], app.config['LOG_FORMAT'])
+    init_metrics(app)
+
     # 初始化数据库和JWT
     db.init_app(app)
     jwt.init_app(app)
@@ -28,6 +35,17 @@ def create_app():
     app.register_blueprint(track_bp, url_prefix='/track')
     app.register_blueprint(recommendations_bp, url_prefix='/recommendations')
 
+    # 注册命令行工具
+    from backend.app.recommendations.spatial_index import spatial_index_cli
+    from backend.app.track.trajectory_store import trajectory_store_cli
+    from backend.app.track.scope import trajectory_cli
+    from backend.app.recommendations.carpool_matches import carpool_cli
+
+    app.cli.add_command(spatial_index_cli)
+    app.cli.add_command(trajectory_store_cli)
+    app.cli.add_command(trajectory_cli)
+    app.cli.add_command(carpool_cli)
+
     # Celery 配置
     make_celery(app)
 
@@ -43,6 +61,16 @@ def make_celery(app):
         result_backend=app.config['CELERY_RESULT_BACKEND']
     )
 
+    # 定时任务：按配置的间隔批量预计算拼车匹配（需要运行 celery beat）
+    from backend.app.recommendations.tasks import PRECOMPUTE_CARPOOL_TASK
+    if app.config.get('CARPOOL_BATCH_INTERVAL'):
+        celery.conf.beat_schedule = {
+            'precompute-carpool-matches': {
+                'task': PRECOMPUTE_CARPOOL_TASK,
+                'schedule': app.config['CARPOOL_BATCH_INTERVAL']
+            }
+        }
+
     class ContextTask(celery.Task):
         def __call__(self, *args, **kwargs):
             with app.app_context():
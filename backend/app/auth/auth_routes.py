@@ -1,9 +1,13 @@
+import logging
 import re
 from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask_jwt_extended import create_access_token
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt, get_jwt_identity, jwt_required
 from backend.app import db
 from backend.app.auth.models import User
+from backend.app.auth.passwords import PasswordHasherBusy, hash_password, needs_rehash, verify_password
+from backend.app.auth.tokens import revoke_token
+
+logger = logging.getLogger(__name__)
 
 # 创建 auth 蓝图
 auth_bp = Blueprint('auth', __name__)
@@ -13,15 +17,28 @@ EMAIL_REGEX = re.compile(r"[^@]+@[^@]+\.[^@]+")
 PASSWORD_REGEX = re.compile(r'^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[@$!%*?&])[A-Za-z\d@$!%*?&]{8,}$')
 
 
+def _hasher_busy_response():
+    return jsonify({'message': 'Server is busy, please try again later'}), 503, {'Retry-After': '1'}
+
+
+def _token_response(identity, status=200):
+    # 同时签发访问令牌与刷新令牌
+    return jsonify({
+        'access_token': create_access_token(identity=identity),
+        'refresh_token': create_refresh_token(identity=identity)
+    }), status
+
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     # 解析JSON请求体
     data = request.get_json()
-    print(f"Received data: {data}")  # 打印接收到的数据以调试
+    # 只记录字段名，不记录密码等字段的值
+    logger.debug("Received register request", extra={"fields": sorted(data) if isinstance(data, dict) else None})
 
     # 检查输入数据是否完整
     if not data or not all(key in data for key in ['username', 'email', 'password', 'phone_number']):
-        print("Missing fields")  # 打印缺少的字段信息
+        logger.info("Register rejected: missing fields")
         return jsonify({'message': 'Missing username, email, password, or phone number'}), 400
 
     # 去除字段前后空格，确保数据一致性
@@ -32,27 +49,31 @@ def register():
 
     # 验证邮箱格式
     if not EMAIL_REGEX.match(email):
-        print("Invalid email format")  # 打印邮箱格式错误
+        logger.info("Register rejected: invalid email format")
         return jsonify({'message': 'Invalid email format'}), 400
 
     # 验证密码格式
     if not PASSWORD_REGEX.match(password):
-        print("Invalid password format")  # 打印密码格式错误
+        logger.info("Register rejected: invalid password format")
         return jsonify({
             'message': 'Password must contain at least 8 characters, including one uppercase letter, one lowercase letter, one number, and one special character.'
         }), 400
 
     # 检查用户名和邮箱是否已存在
     if User.query.filter_by(email=email).first():
-        print("Email already exists")  # 打印邮箱已存在
+        logger.info("Register rejected: email already exists")
         return jsonify({'message': 'User with this email already exists'}), 400
 
     if User.query.filter_by(username=username).first():
-        print("Username already exists")  # 打印用户名已存在
+        logger.info("Register rejected: username already exists")
         return jsonify({'message': 'User with this username already exists'}), 400
 
-    # 哈希密码
-    hashed_password = generate_password_hash(password, method='sha256')
+    # 在哈希线程池中计算密码哈希
+    try:
+        hashed_password = hash_password(password)
+    except PasswordHasherBusy as e:
+        logger.warning("Password hashing rejected", extra={"error": str(e)})
+        return _hasher_busy_response()
 
     # 创建新用户
     new_user = User(
@@ -66,10 +87,10 @@ def register():
     try:
         db.session.add(new_user)
         db.session.commit()
-        print("User registered successfully")  # 打印注册成功信息
+        logger.info("User registered", extra={"user_id": new_user.id})
         return jsonify({'message': 'User registered successfully!'}), 201
     except Exception as e:
-        print(f"Database error: {e}")  # 打印数据库错误信息
+        logger.exception("Database error while registering user")
         db.session.rollback()
         return jsonify({'message': 'Internal server error'}), 500
 
@@ -78,11 +99,11 @@ def register():
 def login():
     # 解析JSON请求体
     data = request.get_json()
-    print(f"Received login data: {data}")  # 打印接收到的数据
+    logger.debug("Received login request", extra={"fields": sorted(data) if isinstance(data, dict) else None})
 
     # 检查输入数据是否完整
     if not data or not all(key in data for key in ['email', 'password']):
-        print("Missing email or password")  # 打印缺少字段信息
+        logger.info("Login rejected: missing email or password")
         return jsonify({'message': 'Missing email or password'}), 400
 
     # 去除字段前后空格，确保数据一致性
@@ -94,14 +115,62 @@ def login():
 
     # 检查用户是否存在以及密码是否正确
     if not user:
-        print("User not found")  # 打印用户未找到信息
+        logger.info("Login rejected: user not found")
         return jsonify({'message': 'Invalid email or password!'}), 401
 
-    if not check_password_hash(user.password_hash, password):
-        print("Incorrect password")  # 打印密码错误信息
+    try:
+        password_valid = verify_password(user.password_hash, password)
+    except PasswordHasherBusy as e:
+        logger.warning("Password verification rejected", extra={"error": str(e)})
+        return _hasher_busy_response()
+
+    if not password_valid:
+        logger.info("Login rejected: incorrect password", extra={"user_id": user.id})
         return jsonify({'message': 'Invalid email or password!'}), 401
 
-    # 创建访问令牌
-    access_token = create_access_token(identity=user.id)
-    print("User logged in successfully")  # 打印登录成功信息
-    return jsonify({'access_token': access_token}), 200
+    # 已保存的哈希使用旧的算法或工作因子时，用本次的明文密码升级；失败不影响登录
+    if needs_rehash(user.password_hash):
+        try:
+            user.password_hash = hash_password(password)
+            db.session.commit()
+        except Exception as e:
+            logger.warning("Password rehash failed", extra={"user_id": user.id, "error": str(e)})
+            db.session.rollback()
+
+    # 创建访问令牌与刷新令牌
+    logger.info("User logged in", extra={"user_id": user.id})
+    return _token_response(user.id)
+
+
+@auth_bp.route('/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
+    """
+    用刷新令牌换取新的访问令牌，不再重新校验密码。
+
+    刷新令牌只能使用一次：旧令牌被吊销并签发新的刷新令牌，并发使用同一个刷新令牌时只有一个请求成功。
+    """
+    try:
+        revoked = revoke_token(get_jwt())
+    except Exception as e:
+        logger.warning("Token revocation failed", extra={"error": str(e)})
+        return jsonify({'message': 'Token service unavailable'}), 503
+
+    if not revoked:
+        logger.info("Refresh rejected: token already used", extra={"user_id": get_jwt_identity()})
+        return jsonify({'message': 'Token has been revoked'}), 401
+
+    return _token_response(get_jwt_identity())
+
+
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required(refresh=True)
+def logout():
+    """吊销请求携带的刷新令牌，已签发的访问令牌在过期前仍然有效"""
+    try:
+        revoke_token(get_jwt())
+    except Exception as e:
+        logger.warning("Token revocation failed", extra={"error": str(e)})
+        return jsonify({'message': 'Token service unavailable'}), 503
+
+    return jsonify({'message': 'Logged out successfully'}), 200
@@ -1,5 +1,5 @@
 from backend.app import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from backend.app.auth.passwords import hash_password, verify_password
 # from datetime import datetime
 
 
@@ -12,7 +12,7 @@ class User(db.Model):
     phone_number = db.Column(db.String(15))
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
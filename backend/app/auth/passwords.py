@@ -0,0 +1,86 @@
+import hashlib
+import hmac
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+from backend.config import Config
+
+# 密码哈希的并发限制：同时计算的哈希最多 PASSWORD_HASH_WORKERS 个，另有 PASSWORD_HASH_QUEUE_SIZE 个可排队，
+# 超出时立即拒绝（接口返回 503），避免突发的注册/登录请求占满 CPU。
+# 这不是把计算卸载出请求线程：请求线程仍阻塞等待结果（最长 PASSWORD_HASH_TIMEOUT 秒），期间不能处理其他请求
+_executor = None
+_executor_lock = threading.Lock()
+
+# 允许排队（含正在执行）的哈希任务数，超出时立即拒绝而不是无限排队
+_slots = threading.BoundedSemaphore(Config.PASSWORD_HASH_WORKERS + Config.PASSWORD_HASH_QUEUE_SIZE)
+
+
+class PasswordHasherBusy(RuntimeError):
+    """哈希线程池已满或等待结果超时"""
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=Config.PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash'
+                )
+    return _executor
+
+
+def _run(function, *args):
+    """
+    在哈希线程池中执行 function 并阻塞等待结果；名额已满或等待超时时抛出 PasswordHasherBusy。
+
+    超时后任务仍在线程池中执行完毕并继续占用名额，直到完成才释放。
+    """
+    if not _slots.acquire(blocking=False):
+        raise PasswordHasherBusy("Password hasher is saturated")
+    try:
+        future = _get_executor().submit(function, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=Config.PASSWORD_HASH_TIMEOUT)
+    except FutureTimeoutError:
+        raise PasswordHasherBusy("Password hashing timed out")
+
+
+def _check_legacy_hash(password_hash, password):
+    # 旧版本以 method='sha256' 生成的哈希（sha256$salt$hmac），新版 werkzeug 已不再支持该格式
+    _, salt, expected = password_hash.split('$', 2)
+    actual = hmac.new(salt.encode('utf-8'), password.encode('utf-8'), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(actual, expected)
+
+
+def _verify(password_hash, password):
+    if password_hash.startswith('sha256$'):
+        return _check_legacy_hash(password_hash, password)
+    return check_password_hash(password_hash, password)
+
+
+def hash_password(password):
+    """
+    按 PASSWORD_HASH_METHOD 配置的算法与工作因子计算密码哈希，受哈希并发限制，调用方阻塞直到得到结果。
+
+    名额已满或超时时抛出 PasswordHasherBusy。
+    """
+    return _run(generate_password_hash, password, Config.PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+    """
+    校验密码，兼容旧版的 sha256 哈希，受哈希并发限制，调用方阻塞直到得到结果。
+
+    名额已满或超时时抛出 PasswordHasherBusy。
+    """
+    return _run(_verify, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """哈希的算法或工作因子与当前配置不一致时返回 True，登录成功后据此升级已保存的哈希"""
+    return password_hash.split('$', 1)[0] != Config.PASSWORD_HASH_METHOD
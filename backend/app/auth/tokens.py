@@ -0,0 +1,29 @@
+import time
+from backend.app import jwt
+from backend.app.cache import cache
+
+# 已吊销的刷新令牌在 Redis 中的键前缀，键在令牌原本的过期时间之后自动删除
+REVOKED_TOKEN_PREFIX = "revoked_token_"
+
+
+def _revoked_key(jti):
+    return f"{REVOKED_TOKEN_PREFIX}{jti}"
+
+
+def revoke_token(jwt_payload):
+    """
+    吊销令牌：以 SET NX 写入 jti，有效期为令牌的剩余有效期。
+
+    返回：
+    - revoked: 本次调用是否完成了吊销；令牌已被吊销（例如并发刷新时另一个请求先用掉了它）时为 False。
+    """
+    ttl = max(1, int(jwt_payload['exp'] - time.time()))
+    return bool(cache.set(_revoked_key(jwt_payload['jti']), 1, ex=ttl, nx=True))
+
+
+@jwt.token_in_blocklist_loader
+def is_token_revoked(jwt_header, jwt_payload):
+    # 只有刷新令牌可以吊销；访问令牌有效期短，不为每个请求增加一次 Redis 查询
+    if jwt_payload.get('type') != 'refresh':
+        return False
+    return bool(cache.exists(_revoked_key(jwt_payload['jti'])))
@@ -1,8 +1,24 @@
+import logging
 import redis
 import json
+import time
+import uuid
+from backend.config import Config
+from backend.app.metrics import instrument_redis
 
-# 初始化 Redis 连接，使用同步的 Redis 客户端
-cache = redis.StrictRedis(host='localhost', port=6379, db=0, decode_responses=True)
+logger = logging.getLogger(__name__)
+
+# 初始化 Redis 连接池与同步的 Redis 客户端，地址与连接数等参数来自配置
+pool = redis.ConnectionPool.from_url(
+    Config.REDIS_URL,
+    max_connections=Config.REDIS_MAX_CONNECTIONS,
+    socket_timeout=Config.REDIS_SOCKET_TIMEOUT,
+    decode_responses=True
+)
+cache = instrument_redis(redis.StrictRedis(connection_pool=pool))
+
+# 等待其他请求计算结果时的轮询间隔（秒）
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
 
 # ---------- 热点轨迹缓存逻辑 ----------
 
@@ -19,7 +35,7 @@ def cache_hotspot_trajectories(user_id, hotspots, expiration=3600):
         # 使用 setex 方法缓存热点轨迹
         cache.setex(cache_key, expiration, json.dumps(hotspots))  # 确保是同步调用
     except Exception as e:
-        print(f"Error caching hotspot trajectories: {e}")
+        logger.warning("Error caching hotspot trajectories", extra={"error": str(e)})
 
 
 def get_cached_hotspots(user_id):
@@ -30,7 +46,7 @@ def get_cached_hotspots(user_id):
             return json.loads(cached_data)  # 反序列化 JSON 数据
         return None
     except Exception as e:
-        print(f"Error retrieving cached hotspot trajectories: {e}")
+        logger.warning("Error retrieving cached hotspot trajectories", extra={"error": str(e)})
         return None
 
 
@@ -39,7 +55,7 @@ def delete_cached_hotspots(user_id):
         cache_key = f"hotspots_{user_id}"
         cache.delete(cache_key)  # 同步方法删除缓存数据
     except Exception as e:
-        print(f"Error deleting cached hotspot trajectories: {e}")
+        logger.warning("Error deleting cached hotspot trajectories", extra={"error": str(e)})
 
 # ---------- 拼车推荐缓存逻辑 ----------
 
@@ -50,7 +66,7 @@ def cache_recommendations(user_id, recommendations, expiration=3600):
         # 使用 setex 方法缓存推荐数据
         cache.setex(cache_key, expiration, json.dumps(recommendations))
     except Exception as e:
-        print(f"Error caching recommendations: {e}")
+        logger.warning("Error caching recommendations", extra={"error": str(e)})
 
 
 def get_cached_recommendations(user_id):
@@ -61,7 +77,7 @@ def get_cached_recommendations(user_id):
             return json.loads(cached_data)  # 反序列化 JSON 数据
         return None
     except Exception as e:
-        print(f"Error retrieving cached recommendations: {e}")
+        logger.warning("Error retrieving cached recommendations", extra={"error": str(e)})
         return None
 
 
@@ -70,4 +86,126 @@ def delete_cached_recommendations(user_id):
         cache_key = f"recommendations_{user_id}"
         cache.delete(cache_key)  # 同步方法删除缓存数据
     except Exception as e:
-        print(f"Error deleting cached recommendations: {e}")
+        logger.warning("Error deleting cached recommendations", extra={"error": str(e)})
+
+# ---------- 版本化读穿缓存 ----------
+
+
+def _data_version_key(user_id, kind):
+    return f"data_version_{kind}_{user_id}"
+
+
+def data_version(user_id, kind):
+    """
+    获取用户数据的当前版本号，kind 为 'trajectory'（轨迹写入时递增）、'hotspot'（热点写入时递增）
+    或 'carpool'（预计算的拼车匹配写入时递增）。
+    缓存键中带上版本号，数据写入后旧键自然失效，无需逐个删除。
+    """
+    try:
+        return int(cache.get(_data_version_key(user_id, kind)) or 0)
+    except Exception as e:
+        logger.warning("Error retrieving data version", extra={"error": str(e)})
+        return None
+
+
+def bump_data_version(user_id, kind):
+    """
+    递增用户数据的版本号，使依赖该数据的缓存结果失效。
+    """
+    try:
+        cache.incr(_data_version_key(user_id, kind))
+    except Exception as e:
+        logger.warning("Error bumping data version", extra={"error": str(e)})
+
+
+def bump_data_versions(user_ids, kind):
+    """在一个 pipeline 中递增多个用户的数据版本号，用于批量任务写入大量用户的数据之后"""
+    try:
+        with cache.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.incr(_data_version_key(user_id, kind))
+            pipe.execute()
+    except Exception as e:
+        logger.warning("Error bumping data versions", extra={"error": str(e)})
+
+
+def _release_lock(lock_key, token):
+    # 只释放自己持有的锁：锁已超时并被其他请求获取时不做删除
+    with cache.pipeline() as pipe:
+        try:
+            pipe.watch(lock_key)
+            if pipe.get(lock_key) == token:
+                pipe.multi()
+                pipe.delete(lock_key)
+                pipe.execute()
+        except redis.WatchError:
+            pass
+
+
+def read_through(cache_key, compute, expiration=None, on_hit=None):
+    """
+    读穿缓存：命中时直接返回缓存结果，未命中时计算并写入缓存。
+
+    同一个键同时未命中时只有一个请求执行计算（single-flight），其余请求等待其结果；
+    等待超时或计算结果不可缓存时各自计算。Redis 不可用时直接计算，不影响请求。
+
+    参数：
+    - cache_key: 缓存键，调用方负责在其中带上数据版本号与请求参数。
+    - compute: 无参回调，返回 (payload, status)；只有 status 为 200 的结果会被缓存。
+    - expiration: 缓存的有效时间 (秒)，默认使用 CACHE_TTL 配置。
+    - on_hit: 可选回调，结果来自缓存时以缓存的 payload 调用，用于恢复计算时产生的副作用。
+
+    返回：
+    - (payload, status)
+    """
+    if cache_key is None:
+        return compute()
+    expiration = expiration or Config.CACHE_TTL
+
+    def hit(cached_data):
+        payload = json.loads(cached_data)
+        if on_hit is not None:
+            on_hit(payload)
+        return payload, 200
+
+    lock_key = f"{cache_key}_lock"
+    token = str(uuid.uuid4())
+
+    try:
+        cached_data = cache.get(cache_key)
+        if cached_data is None:
+            acquired = cache.set(lock_key, token, nx=True, ex=Config.CACHE_LOCK_TIMEOUT)
+    except Exception as e:
+        logger.warning("Error reading cache", extra={"error": str(e)})
+        return compute()
+    if cached_data is not None:
+        return hit(cached_data)
+
+    if not acquired:
+        # 其他请求正在计算同一个键，等待其写入缓存
+        deadline = time.monotonic() + Config.CACHE_LOCK_TIMEOUT
+        try:
+            while time.monotonic() < deadline:
+                time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+                cached_data = cache.get(cache_key)
+                if cached_data is not None or not cache.exists(lock_key):
+                    break
+        except Exception as e:
+            logger.warning("Error waiting for cache", extra={"error": str(e)})
+        if cached_data is not None:
+            return hit(cached_data)
+        return compute()
+
+    try:
+        payload, status = compute()
+        if status == 200:
+            try:
+                cache.setex(cache_key, expiration, json.dumps(payload))
+            except Exception as e:
+                logger.warning("Error writing cache", extra={"error": str(e)})
+        return payload, status
+    finally:
+        try:
+            _release_lock(lock_key, token)
+        except Exception as e:
+            logger.warning("Error releasing cache lock", extra={"error": str(e)})
@@ -0,0 +1,40 @@
+import json
+import logging
+from datetime import datetime, timezone
+
+# LogRecord 自带的属性，其余属性视为通过 extra 传入的结构化字段
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON：时间、级别、logger 名称、消息，以及 extra 传入的字段"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level, log_format='json'):
+    """
+    配置 backend 包的日志：按 level 过滤，log_format 为 'json'（每行一个 JSON 对象）或 'text'。
+    """
+    handler = logging.StreamHandler()
+    if log_format == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    logger = logging.getLogger('backend')
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
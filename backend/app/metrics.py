@@ -0,0 +1,156 @@
+import os
+import time
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 挖掘指标中 k 标签的上限，更长的路径归入同一个标签，避免标签数量随路径长度无限增长
+MAX_K_LABEL = 20
+
+# 路径表、轨迹图规模等计数类直方图的桶
+SIZE_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+REQUEST_LATENCY = Histogram(
+    'routemate_http_request_duration_seconds', '接口请求耗时', ['endpoint', 'method', 'status']
+)
+DB_QUERY_LATENCY = Histogram(
+    'routemate_db_query_duration_seconds', '数据库语句耗时（_count 即调用次数）', ['operation']
+)
+REDIS_COMMAND_LATENCY = Histogram(
+    'routemate_redis_command_duration_seconds', 'Redis 命令耗时（_count 即调用次数）', ['command']
+)
+REDIS_COMMAND_ERRORS = Counter(
+    'routemate_redis_command_errors_total', 'Redis 命令失败次数', ['command']
+)
+MINING_RUNS = Counter(
+    'routemate_mining_runs_total', '热点挖掘运行次数', ['algorithm', 'mode']
+)
+MINING_PATH_TABLE_SIZE = Histogram(
+    'routemate_mining_path_table_size', '每一阶剪枝后的频繁路径表大小', ['algorithm', 'k'], buckets=SIZE_BUCKETS
+)
+MINING_JOIN_CANDIDATES = Counter(
+    'routemate_mining_join_candidates_total', '生成每一阶路径表时检查的候选路径数', ['algorithm', 'k']
+)
+MINING_PRUNED_ENTRIES = Counter(
+    'routemate_mining_pruned_entries_total', '因支持度不足被剪掉的候选路径数', ['algorithm', 'k']
+)
+MINING_LEVEL_LATENCY = Histogram(
+    'routemate_mining_level_duration_seconds', '计算每一阶路径表的耗时', ['algorithm', 'k']
+)
+MINING_GRAPH_SIZE = Histogram(
+    'routemate_mining_graph_size', 'TTHS 轨迹图的节点数、边数与频繁边数', ['kind'], buckets=SIZE_BUCKETS
+)
+
+_DB_OPERATIONS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE'}
+
+
+def _k_label(k):
+    return str(k) if k <= MAX_K_LABEL else f"{MAX_K_LABEL}+"
+
+
+def mining_observer(algorithm):
+    """
+    返回传给 NDTTJ / NDTTT / TTHS 的 observe 回调，把算法上报的 (指标名, 数值, k) 记录到对应的指标。
+    """
+    def observe(name, value, k=None):
+        if name in ('graph_nodes', 'graph_edges', 'frequent_edges'):
+            MINING_GRAPH_SIZE.labels(name).observe(value)
+            return
+        labels = (algorithm, _k_label(k))
+        if name == 'path_table_size':
+            MINING_PATH_TABLE_SIZE.labels(*labels).observe(value)
+        elif name == 'join_candidates':
+            MINING_JOIN_CANDIDATES.labels(*labels).inc(value)
+        elif name == 'pruned_entries':
+            MINING_PRUNED_ENTRIES.labels(*labels).inc(value)
+        elif name == 'level_seconds':
+            MINING_LEVEL_LATENCY.labels(*labels).observe(value)
+    return observe
+
+
+def _timed_redis(command, function):
+    def wrapper(*args, **kwargs):
+        label = command or (str(args[0]).upper() if args else 'UNKNOWN')
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            REDIS_COMMAND_ERRORS.labels(label).inc()
+            raise
+        finally:
+            REDIS_COMMAND_LATENCY.labels(label).observe(time.perf_counter() - started)
+    return wrapper
+
+
+def instrument_redis(client):
+    """
+    为 Redis 客户端的每条命令计时；pipeline 整体作为一条 PIPELINE 记录。
+    """
+    client.execute_command = _timed_redis(None, client.execute_command)
+    create_pipeline = client.pipeline
+
+    def pipeline(*args, **kwargs):
+        pipe = create_pipeline(*args, **kwargs)
+        pipe.execute = _timed_redis('PIPELINE', pipe.execute)
+        return pipe
+
+    client.pipeline = pipeline
+    return client
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+    DB_QUERY_LATENCY.labels(operation if operation in _DB_OPERATIONS else 'OTHER').observe(
+        time.perf_counter() - started
+    )
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(exception_context):
+    # 失败的语句不会触发 after_cursor_execute，丢弃其开始时间
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+
+def metrics_response():
+    """
+    以 Prometheus 文本格式输出指标；设置了 PROMETHEUS_MULTIPROC_DIR 时汇总同一主机上所有进程
+    （多个 Web 工作进程与 Celery 工作进程）的指标。
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app):
+    """注册请求计时钩子与 /metrics 接口"""
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_latency(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_LATENCY.labels(endpoint, request.method, response.status_code).observe(
+                time.perf_counter() - started
+            )
+        return response
+
+    app.add_url_rule('/metrics', 'metrics', metrics_response)
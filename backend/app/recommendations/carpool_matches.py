@@ -0,0 +1,236 @@
+import heapq
+import json
+import multiprocessing
+import time
+import click
+from collections import defaultdict
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func
+from backend.app import db
+from backend.app.cache import bump_data_version, bump_data_versions
+from backend.app.track.models import HotspotTrajectory
+from backend.app.recommendations.models import Recommendation
+from backend.app.recommendations.similarity import HotspotPathSet, score_path_sets
+from backend.app.recommendations.spatial_index import MAX_INDEXED_PATHS, find_candidate_user_ids, hotspot_cells
+
+# 服务端流式读取热点数据的批大小
+LOAD_BATCH_SIZE = 200
+
+# 批量写入 Recommendation 表时每条 INSERT 的行数
+WRITE_BATCH_SIZE = 500
+
+# 并行计算时每个进程一次领取的用户数
+SCORE_CHUNK_SIZE = 16
+
+carpool_cli = AppGroup('carpool', help='拼车匹配预计算命令')
+
+
+def load_current_hotspots(user_ids=None, batch_size=LOAD_BATCH_SIZE):
+    """
+    读取每个用户当前的热点记录（与 HotspotTrajectory.current 一致，即 id 最大的一行），只查询所需的列。
+
+    参数：
+    - user_ids: 只读取这些用户；为 None 时读取全部用户。
+
+    返回：
+    - user_hotspots: {user_id: (hotspot_hash, 前 MAX_INDEXED_PATHS 条热点路径)}，没有热点路径的用户不包含在内。
+    """
+    if user_ids is not None and not user_ids:
+        return {}
+
+    current_hotspot_ids = db.session.query(func.max(HotspotTrajectory.id)).group_by(HotspotTrajectory.user_id)
+    query = db.session.query(
+        HotspotTrajectory.user_id, HotspotTrajectory.hotspot_hash, HotspotTrajectory.hotspot_data
+    ).filter(HotspotTrajectory.id.in_(current_hotspot_ids))
+    if user_ids is not None:
+        query = query.filter(HotspotTrajectory.user_id.in_(user_ids))
+
+    return {
+        user_id: (hotspot_hash, hotspot_data[:MAX_INDEXED_PATHS])
+        for user_id, hotspot_hash, hotspot_data in query.yield_per(batch_size)
+        if hotspot_data
+    }
+
+
+def candidate_blocks(user_hotspots):
+    """
+    空间分块：在内存中建立网格到用户的倒排表，每个用户只与经过相同或相邻网格的用户比较
+    （与 find_candidate_user_ids 的规则一致），其余用户对的相似度必为 0。
+
+    相似度是对称的，每个用户对只出现一次（只保留 ID 更大的候选用户）。
+
+    产出：
+    - (user_id, candidate_ids): 用户 ID 与按 ID 排序的候选用户列表。
+    """
+    user_cells = {user_id: hotspot_cells(hotspots) for user_id, (_, hotspots) in user_hotspots.items()}
+    cell_users = defaultdict(list)
+    for user_id, cells in user_cells.items():
+        for cell in cells:
+            cell_users[cell].append(user_id)
+
+    for user_id, cells in user_cells.items():
+        candidate_ids = {
+            other_id
+            for row, col in cells
+            for d_row in (-1, 0, 1)
+            for d_col in (-1, 0, 1)
+            for other_id in cell_users.get((row + d_row, col + d_col), ())
+            if other_id > user_id
+        }
+        if candidate_ids:
+            yield user_id, sorted(candidate_ids)
+
+
+_shared_hotspots = None
+_path_sets = {}
+
+
+def _init_worker(user_hotspots):
+    # 热点数据只在创建进程池时传给各进程一次，HotspotPathSet 在各进程内按需构建并复用
+    global _shared_hotspots
+    _shared_hotspots = user_hotspots
+    _path_sets.clear()
+
+
+def _path_set(user_id):
+    path_set = _path_sets.get(user_id)
+    if path_set is None:
+        path_set = _path_sets[user_id] = HotspotPathSet(_shared_hotspots[user_id][1])
+    return path_set
+
+
+def _score_block(block):
+    """计算一个用户与其全部候选用户的相似度，只返回相似度大于 0 的用户对"""
+    user_id, candidate_ids = block
+    user_path_set = _path_set(user_id)
+    scores = []
+    for other_id in candidate_ids:
+        similarity = score_path_sets(user_path_set, _path_set(other_id))
+        if similarity > 0:
+            scores.append((user_id, other_id, similarity))
+    return scores
+
+
+def _use_parallel(workers):
+    # 守护进程（如 Celery prefork 工作进程）不能再创建子进程，回退为顺序执行
+    return workers > 1 and not multiprocessing.current_process().daemon
+
+
+def _push_match(heap, top_n, similarity, other_id):
+    # 小顶堆只保留相似度最高的 top_n 个用户，相似度相同时 ID 较小者优先；top_n 为 None 时不限制
+    item = (similarity, -other_id)
+    if top_n is None or len(heap) < top_n:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
+
+
+def _ranked(heap):
+    return [{"id": -negative_id, "similarity": similarity} for similarity, negative_id in sorted(heap, reverse=True)]
+
+
+def compute_all_matches(user_hotspots, top_n, workers=1):
+    """
+    计算全体用户两两之间的热点相似度，为每个用户保留排名前 top_n 的匹配。
+
+    参数：
+    - user_hotspots: load_current_hotspots 的返回值。
+    - top_n: 每个用户保留的匹配数，为 None 时保留全部相似度大于 0 的匹配。
+    - workers: 并行进程数，1 表示顺序执行。
+
+    返回：
+    - matches: {user_id: [{"id", "similarity"}, ...]}，按相似度从高到低排序；没有任何匹配的用户对应空列表。
+    """
+    heaps = {user_id: [] for user_id in user_hotspots}
+    blocks = candidate_blocks(user_hotspots)
+
+    pool = None
+    if _use_parallel(workers):
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(user_hotspots,))
+        results = pool.imap_unordered(_score_block, blocks, chunksize=SCORE_CHUNK_SIZE)
+    else:
+        _init_worker(user_hotspots)
+        results = map(_score_block, blocks)
+
+    try:
+        for scores in results:
+            for user_id, other_id, similarity in scores:
+                _push_match(heaps[user_id], top_n, similarity, other_id)
+                _push_match(heaps[other_id], top_n, similarity, user_id)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        _init_worker(None)
+
+    return {user_id: _ranked(heap) for user_id, heap in heaps.items()}
+
+
+def compute_user_matches(user_id, hotspots, top_n):
+    """
+    实时计算单个用户的匹配：通过空间倒排索引取候选用户，只读取候选用户的热点数据。
+
+    返回：
+    - matches: [{"id", "similarity"}, ...]，按相似度从高到低排序。
+    """
+    user_path_set = HotspotPathSet(hotspots[:MAX_INDEXED_PATHS])
+    candidates = load_current_hotspots(find_candidate_user_ids(user_id, hotspots[:MAX_INDEXED_PATHS]))
+
+    heap = []
+    for other_id, (_, other_hotspots) in candidates.items():
+        similarity = score_path_sets(user_path_set, HotspotPathSet(other_hotspots))
+        if similarity > 0:
+            _push_match(heap, top_n, similarity, other_id)
+    return _ranked(heap)
+
+
+def store_user_matches(user_id, hotspot_hash, matches):
+    """替换单个用户已保存的匹配并提交事务"""
+    Recommendation.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    db.session.add(Recommendation(
+        user_id=user_id, hotspot_hash=hotspot_hash, recommendation_data=json.dumps(matches)
+    ))
+    db.session.commit()
+    bump_data_version(user_id, 'carpool')
+
+
+def precompute_carpool_matches(top_n=None, workers=None):
+    """
+    批量预计算全体用户的拼车匹配并整体替换 Recommendation 表，所有写入在同一个事务中提交，
+    读取方在提交之前看到的仍是上一批的结果。
+
+    返回：
+    - (user_count, pair_count): 写入的用户数与匹配条数。
+    """
+    top_n = top_n or current_app.config['CARPOOL_TOP_N']
+    workers = workers or current_app.config['CARPOOL_BATCH_WORKERS']
+
+    user_hotspots = load_current_hotspots()
+    matches = compute_all_matches(user_hotspots, top_n, workers)
+
+    rows = [
+        {"user_id": user_id, "hotspot_hash": user_hotspots[user_id][0], "recommendation_data": json.dumps(ranked)}
+        for user_id, ranked in matches.items()
+    ]
+    try:
+        db.session.query(Recommendation).delete(synchronize_session=False)
+        for start in range(0, len(rows), WRITE_BATCH_SIZE):
+            db.session.execute(Recommendation.__table__.insert(), rows[start:start + WRITE_BATCH_SIZE])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    bump_data_versions(matches, 'carpool')
+    return len(rows), sum(len(ranked) for ranked in matches.values())
+
+
+@carpool_cli.command('precompute')
+@click.option('--top-n', type=int, default=None, help='每个用户保存的匹配数，默认使用 CARPOOL_TOP_N（未设置时不限制）')
+@click.option('--workers', type=int, default=None, help='并行进程数，默认使用 CARPOOL_BATCH_WORKERS')
+def precompute_command(top_n, workers):
+    """批量预计算全体用户的拼车匹配"""
+    started = time.perf_counter()
+    user_count, pair_count = precompute_carpool_matches(top_n, workers)
+    click.echo(f"拼车匹配预计算完成，共 {user_count} 个用户、{pair_count} 条匹配，耗时 {time.perf_counter() - started:.1f} 秒")
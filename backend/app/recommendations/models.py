@@ -4,6 +4,7 @@ class Recommendation(db.Model):
     __tablename__ = 'Recommendation'  # 确保与数据库表名一致
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('User.id'), nullable=False)
-    recommendation_data = db.Column(db.Text, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
+    recommendation_data = db.Column(db.Text, nullable=False)  # 按相似度排序的前 N 个拼车匹配（JSON）
+    hotspot_hash = db.Column(db.String(32))  # 计算匹配时所用热点记录的 hotspot_hash，用于判断结果是否过期
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
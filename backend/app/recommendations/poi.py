@@ -0,0 +1,156 @@
+import numpy as np
+
+# 地球平均半径（米）
+EARTH_RADIUS_METERS = 6371008.8
+
+# POI 预处理模式：按距离阈值抽稀，或 Douglas–Peucker 线简化
+POI_MODES = ('distance', 'simplify')
+
+
+class PathArrays:
+    """
+    一个用户全部热点路径的坐标数组表示。
+
+    所有路径点拼接为一个 (N, 2) 的经纬度数组（度），并记录每条路径的长度与起始偏移，
+    预处理时所有路径在同一批数组运算中一起处理。
+    """
+
+    def __init__(self, hotspots):
+        self.lengths = np.array([len(path) for path in hotspots], dtype=np.int64)
+        self.starts = np.cumsum(self.lengths) - self.lengths
+        coords = [(point['latitude'], point['longitude']) for path in hotspots for point in path]
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def to_paths(self, keep):
+        """
+        按保留标记把坐标还原为路径列表。
+
+        参数：
+        - keep: 长度为 N 的布尔数组，标记每个点是否保留。
+
+        返回：
+        - paths: 路径列表，每个点为包含 'latitude' 与 'longitude' 的字典。
+        """
+        kept = self.coords[keep].tolist()
+        # 只对非空路径分段求和，空路径的保留点数为 0
+        nonempty = self.lengths > 0
+        kept_lengths = np.zeros(len(self.lengths), dtype=np.int64)
+        if nonempty.any():
+            kept_lengths[nonempty] = np.add.reduceat(keep.astype(np.int64), self.starts[nonempty])
+
+        paths = []
+        offset = 0
+        for length in kept_lengths.tolist():
+            paths.append([{"latitude": lat, "longitude": lon} for lat, lon in kept[offset:offset + length]])
+            offset += length
+        return paths
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    向量化的 haversine 球面距离（米），参数为经纬度（度）数组，按元素计算。
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def filter_by_distance(path_arrays, distance_threshold):
+    """
+    距离阈值抽稀：保留每条路径的第一个点，之后只保留与上一个保留点距离大于阈值的点。
+
+    逐个位置推进，每一步对所有仍有剩余点的路径一起计算到各自上一个保留点的距离，
+    循环次数为最长路径的长度，而不是点的总数。
+
+    返回：
+    - keep: 长度为 N 的布尔数组，标记每个点是否保留。
+    """
+    coords = path_arrays.coords
+    keep = np.zeros(len(coords), dtype=bool)
+    nonempty = path_arrays.lengths > 0
+    keep[path_arrays.starts[nonempty]] = True
+
+    # 每条路径上一个保留点的下标
+    anchors = path_arrays.starts.copy()
+    for position in range(1, int(path_arrays.lengths.max(initial=0))):
+        active = np.flatnonzero(path_arrays.lengths > position)
+        points = path_arrays.starts[active] + position
+        last = anchors[active]
+        distances = haversine(coords[points, 0], coords[points, 1], coords[last, 0], coords[last, 1])
+        far = distances > distance_threshold
+        keep[points[far]] = True
+        anchors[active[far]] = points[far]
+    return keep
+
+
+def simplify(path_arrays, tolerance):
+    """
+    Douglas–Peucker 线简化：保留每条路径的首尾点，递归保留偏离首尾连线超过 tolerance（米）的最远点。
+
+    坐标先整体投影到以各路径平均纬度为基准的局部平面（米），点到线段的距离在各段上向量化计算。
+
+    返回：
+    - keep: 长度为 N 的布尔数组，标记每个点是否保留。
+    """
+    coords = path_arrays.coords
+    keep = np.zeros(len(coords), dtype=bool)
+    if not len(coords):
+        return keep
+
+    # 等距圆柱投影：经度按路径平均纬度的余弦缩放
+    nonempty = path_arrays.lengths > 0
+    mean_lat = np.zeros(len(path_arrays))
+    mean_lat[nonempty] = np.add.reduceat(coords[:, 0], path_arrays.starts[nonempty]) / path_arrays.lengths[nonempty]
+    reference_lat = np.repeat(mean_lat, path_arrays.lengths)
+    xy = np.radians(coords) * EARTH_RADIUS_METERS
+    xy[:, 1] *= np.cos(np.radians(reference_lat))
+
+    for start, length in zip(path_arrays.starts[nonempty].tolist(), path_arrays.lengths[nonempty].tolist()):
+        end = start + length - 1
+        keep[start] = keep[end] = True
+        stack = [(start, end)]
+        while stack:
+            first, last = stack.pop()
+            if last - first < 2:
+                continue
+            distances = _segment_distances(xy[first + 1:last], xy[first], xy[last])
+            farthest = int(np.argmax(distances))
+            if distances[farthest] > tolerance:
+                index = first + 1 + farthest
+                keep[index] = True
+                stack.append((first, index))
+                stack.append((index, last))
+    return keep
+
+
+def _segment_distances(points, a, b):
+    """点集到线段 ab 的平面距离，首尾重合时退化为到该点的距离"""
+    ab = b - a
+    denominator = ab @ ab
+    if denominator == 0:
+        return np.hypot(*(points - a).T)
+    t = np.clip((points - a) @ ab / denominator, 0.0, 1.0)
+    projection = a + t[:, None] * ab
+    return np.hypot(*(points - projection).T)
+
+
+def preprocess_hotspots(hotspots, mode='distance', distance_threshold=200, tolerance=50):
+    """
+    POI 预处理：按所选模式抽稀一个用户的全部热点路径。
+
+    参数：
+    - hotspots: 热点路径列表，每个点为包含 'latitude' 与 'longitude' 的字典。
+    - mode: 'distance' 为距离阈值抽稀（distance_threshold，米），'simplify' 为 Douglas–Peucker 线简化（tolerance，米）。
+
+    返回：
+    - filtered_hotspots: 抽稀后的路径列表，每个点只包含 'latitude' 与 'longitude'。
+    """
+    path_arrays = PathArrays(hotspots)
+    if mode == 'simplify':
+        keep = simplify(path_arrays, tolerance)
+    else:
+        keep = filter_by_distance(path_arrays, distance_threshold)
+    return path_arrays.to_paths(keep)
@@ -1,50 +1,20 @@
-from flask import Blueprint, jsonify, request
+import logging
+from flask import Blueprint, current_app, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 import json
+from backend.app import db
 from backend.app.track.models import HotspotTrajectory
 from backend.app.auth.models import User
-from geopy.distance import geodesic
-from scipy.spatial import KDTree
-import numpy as np
+from backend.app.cache import data_version, read_through
+from backend.app.recommendations.carpool_matches import compute_user_matches, store_user_matches
+from backend.app.recommendations.models import Recommendation
+from backend.app.recommendations.poi import POI_MODES, preprocess_hotspots
+from backend.app.recommendations.spatial_index import MAX_INDEXED_PATHS
 
-recommendations_bp = Blueprint('recommendations', __name__)
-
-
-def compute_similarity(hotspots1, hotspots2, distance_threshold=100):
-    def create_kd_tree(points):
-        """将路径点集构建为KDTree，以加速距离查询"""
-        coords = [(point['latitude'], point['longitude']) for point in points]
-        return KDTree(np.radians(coords))
-
-    def calculate_min_distance(path1, path2_tree, distance_threshold):
-        """计算路径1中的每个点到路径2的最小距离并过滤低于阈值的点"""
-        matches = 0
-        for point1 in path1:
-            coord1 = (point1['latitude'], point1['longitude'])
-            distance, _ = path2_tree.query(np.radians([coord1]), distance_upper_bound=np.radians(distance_threshold / 6371))  # 使用地球半径（6371 km）归一化
-            if distance < distance_threshold / 6371:  # 转换为弧度
-                matches += 1
-        return matches
+logger = logging.getLogger(__name__)
 
-    total_matches = 0
-    total_pairs = 0
-
-    # 遍历每条路径，对比当前用户和其他用户的路径
-    for path1 in hotspots1:
-        path1_tree = create_kd_tree(path1)  # 创建KDTree加速距离计算
-        for path2 in hotspots2:
-            path2_tree = create_kd_tree(path2)  # 创建另一条路径的KDTree
-            match_count1 = calculate_min_distance(path1, path2_tree, distance_threshold)
-            match_count2 = calculate_min_distance(path2, path1_tree, distance_threshold)
-
-            # 如果任意一侧匹配足够的点，视为路径相似
-            if match_count1 > len(path1) * 0.5 or match_count2 > len(path2) * 0.5:  # 超过50%匹配则判为相似
-                total_matches += 1
-            total_pairs += 1
-
-    similarity_score = total_matches / total_pairs if total_pairs > 0 else 0
-    return similarity_score
+recommendations_bp = Blueprint('recommendations', __name__)
 
 
 @recommendations_bp.route('carpool', methods=['POST'])
@@ -55,57 +25,98 @@ def get_carpool_recommendations():
     # 获取请求中的参数，提供默认空字典以避免 NoneType 错误
     data = request.get_json() or {}
     similarity_threshold = data.get('similarity_threshold', 0.7)  # 调整到合理默认值
-
-    user_hotspot = HotspotTrajectory.query.filter_by(user_id=user_id).first()
-    if not user_hotspot or not user_hotspot.hotspot_data:
-        return jsonify({"message": "No hotspot data found for the user"}), 404
-
-    # 限制用户热点轨迹数量为前30条
-    user_hotspots = user_hotspot.hotspot_data[:30]
+    refresh = bool(data.get('refresh', True))
+
+    # 结果依赖当前用户的热点数据与已保存的拼车匹配，缓存键带上两者的版本号
+    version = data_version(user_id, 'hotspot')
+    carpool_version = data_version(user_id, 'carpool')
+    cache_key = None
+    if version is not None and carpool_version is not None:
+        cache_key = f"carpool_{user_id}_h{version}_c{carpool_version}_{similarity_threshold}_{int(refresh)}"
+    response, status = read_through(
+        cache_key, lambda: _recommend_carpool(user_id, similarity_threshold, refresh)
+    )
+    return jsonify(response), status
+
+
+def _recommend_carpool(user_id, similarity_threshold, refresh=True):
+    """
+    返回拼车推荐：优先读取批量任务预计算的匹配（Recommendation 表中的一行）。
+
+    当前用户的热点数据在上次批量计算之后发生了变化（或尚未计算过）时，
+    refresh 为 True 则实时重新计算该用户的匹配并写回 Recommendation 表，否则仍返回已保存的匹配。
+
+    返回：
+    - (response, status): 响应内容与 HTTP 状态码。
+    """
+    # 一次查询同时取得已保存的匹配与当前用户当前热点记录（见 HotspotTrajectory.current）的哈希
+    current_hash = db.session.query(HotspotTrajectory.hotspot_hash).filter(
+        HotspotTrajectory.user_id == user_id
+    ).order_by(HotspotTrajectory.id.desc()).limit(1).scalar_subquery()
+    saved = db.session.query(
+        Recommendation.recommendation_data, Recommendation.hotspot_hash,
+        Recommendation.created_at, current_hash.label('current_hash')
+    ).filter(Recommendation.user_id == user_id).first()
+
+    if saved is not None and (saved.hotspot_hash == saved.current_hash or not refresh):
+        matches = json.loads(saved.recommendation_data)
+        source, computed_at = "stored", saved.created_at
+    else:
+        user_hotspot = HotspotTrajectory.current(user_id)
+        if not user_hotspot or not user_hotspot.hotspot_data:
+            return {"message": "No hotspot data found for the user"}, 404
+
+        # 限制用户热点轨迹数量为前30条（按支持度排序保存，即最强的 30 条）
+        matches = compute_user_matches(
+            user_id, user_hotspot.hotspot_data[:MAX_INDEXED_PATHS], current_app.config['CARPOOL_TOP_N']
+        )
+        try:
+            store_user_matches(user_id, user_hotspot.hotspot_hash, matches)
+        except Exception as e:
+            logger.warning("Error storing carpool matches", extra={"user_id": user_id, "error": str(e)})
+            db.session.rollback()
+        source, computed_at = "live", datetime.utcnow()
+
+    # 一次主键查询取得匹配用户的联系方式
+    contacts = {
+        row.id: row for row in db.session.query(User.id, User.phone_number, User.email).filter(
+            User.id.in_([match["id"] for match in matches])
+        )
+    } if matches else {}
 
     similar_users = []
     highest_similarity_user = None
-    highest_similarity_score = 0
     debug_info = []  # 用于存储调试信息
-
-    # 遍历其他用户并计算相似度
-    for other_user in User.query.filter(User.id != user_id).all():
-        other_user_hotspot = HotspotTrajectory.query.filter_by(user_id=other_user.id).first()
-        if not other_user_hotspot or not other_user_hotspot.hotspot_data:
+    for match in matches:
+        contact = contacts.get(match["id"])
+        if contact is None:
             continue
-
-        # 限制其他用户的热点轨迹数量为前30条
-        other_user_hotspots = other_user_hotspot.hotspot_data[:30]
-        similarity = compute_similarity(user_hotspots, other_user_hotspots)
-
-        # 添加调试信息
-        debug_info.append(f"User ID {other_user.id} similarity with current user: {similarity}")
+        user_info = {
+            "id": match["id"],
+            "phone": contact.phone_number,
+            "email": contact.email,
+            "similarity": match["similarity"]
+        }
+        debug_info.append(f"User ID {match['id']} similarity with current user: {match['similarity']}")
 
         # 检查是否超过阈值
-        if similarity >= similarity_threshold:
-            similar_users.append({
-                "id": other_user.id,
-                "phone": other_user.phone_number,
-                "email": other_user.email,
-                "similarity": similarity
-            })
-
-        # 记录相似度最高的用户
-        if similarity > highest_similarity_score:
-            highest_similarity_score = similarity
-            highest_similarity_user = {
-                "id": other_user.id,
-                "phone": other_user.phone_number,
-                "email": other_user.email,
-                "similarity": similarity
-            }
+        if match["similarity"] >= similarity_threshold:
+            similar_users.append(user_info)
+        # 匹配已按相似度排序，第一个即为相似度最高的用户
+        if highest_similarity_user is None:
+            highest_similarity_user = user_info
 
     # 如果没有超过阈值的用户，则返回相似度最高的用户
     if not similar_users and highest_similarity_user:
         similar_users.append(highest_similarity_user)
 
-    # 返回相似用户列表和调试信息
-    return jsonify({"similar_users": similar_users, "debug_info": debug_info}), 200
+    # 返回相似用户列表、调试信息以及匹配的来源与计算时间
+    return {
+        "similar_users": similar_users,
+        "debug_info": debug_info,
+        "source": source,
+        "computed_at": computed_at.isoformat() if computed_at else None
+    }, 200
 
 
 @recommendations_bp.route('poi', methods=['POST'])
@@ -113,51 +124,50 @@ def get_carpool_recommendations():
 def get_poi_recommendations():
     user_id = get_jwt_identity()
 
-    user_hotspot = HotspotTrajectory.query.filter_by(user_id=user_id).first()
+    # 预处理模式：distance 为距离阈值抽稀（米），simplify 为 Douglas–Peucker 线简化（容差，米）
+    data = request.get_json(silent=True) or {}
+    mode = data.get('mode', 'distance')
+    if mode not in POI_MODES:
+        return jsonify({"message": f"mode must be one of {', '.join(POI_MODES)}"}), 400
+    distance_threshold = data.get('distance_threshold', 200)  # 调整清洗条件的距离阈值
+    tolerance = data.get('tolerance', 50)
+
+    # 结果只依赖当前用户的热点数据与预处理参数，缓存键带上热点版本号
+    version = data_version(user_id, 'hotspot')
+    cache_key = None
+    if version is not None:
+        parameter = tolerance if mode == 'simplify' else distance_threshold
+        cache_key = f"poi_{user_id}_h{version}_{mode}_{parameter}"
+    response, status = read_through(
+        cache_key, lambda: _recommend_poi(user_id, mode, distance_threshold, tolerance)
+    )
+    return jsonify(response), status
+
+
+def _recommend_poi(user_id, mode='distance', distance_threshold=200, tolerance=50):
+    """
+    清洗热点路径，得到 POI 推荐。
+
+    返回：
+    - (response, status): 响应内容与 HTTP 状态码。
+    """
+    user_hotspot = HotspotTrajectory.current(user_id)
     if not user_hotspot or not user_hotspot.hotspot_data:
-        return jsonify({"message": "No hotspot data found for the user"}), 404
+        return {"message": "No hotspot data found for the user"}, 404
 
     # hotspots 数据已经是列表格式，直接使用即可
     hotspots = user_hotspot.hotspot_data
-    filtered_hotspots = []
 
     # 判断热点路径数量
     if len(hotspots) <= 10:
         # 如果少于等于10条，不清洗直接返回
         filtered_hotspots = hotspots
     else:
-        # 清洗热点轨迹，增大距离阈值以减少保留点数量
-        distance_threshold = 200  # 调整清洗条件的距离阈值
-        for path in hotspots:
-            filtered_path = []
-            last_point = None
-
-            for point in path:
-                current_point = {
-                    "latitude": point['latitude'],
-                    "longitude": point['longitude'],
-                }
-
-                if last_point:
-                    distance = geodesic(
-                        (current_point['latitude'], current_point['longitude']),
-                        (last_point['latitude'], last_point['longitude'])
-                    ).meters
-
-                    # 如果距离大于distance_threshold则保留该点
-                    if distance > distance_threshold:
-                        filtered_path.append(current_point)
-                        last_point = current_point
-                else:
-                    filtered_path.append(current_point)
-                    last_point = current_point
-
-            filtered_hotspots.append(filtered_path)
-
-        # 如果清洗后的热点条数仍然多于10条，均匀选取10个点
-        if len(filtered_hotspots) > 10:
-            step = len(filtered_hotspots) // 10
-            filtered_hotspots = [filtered_hotspots[i * step] for i in range(10)]
-
-    return jsonify({"filtered_hotspots": filtered_hotspots}), 200
-
+        # 抽稀不改变路径条数，先均匀选取10条路径，只清洗被选中的路径
+        step = len(hotspots) // 10
+        selected = [hotspots[i * step] for i in range(10)]
+        filtered_hotspots = preprocess_hotspots(
+            selected, mode=mode, distance_threshold=distance_threshold, tolerance=tolerance
+        )
+
+    return {"filtered_hotspots": filtered_hotspots}, 200
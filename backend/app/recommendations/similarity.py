@@ -0,0 +1,132 @@
+import numpy as np
+from scipy.spatial import KDTree
+
+
+def match_radius(distance_threshold):
+    """
+    计算 KDTree 查询使用的匹配半径（弧度坐标空间）。
+    与原实现保持一致：先按地球半径（6371 km）归一化，再转换为弧度。
+    """
+    return np.radians(distance_threshold / 6371)
+
+
+class HotspotPathSet:
+    """
+    一个用户热点路径集合的批量表示。
+
+    所有路径点拼接为一个弧度坐标数组，并记录每个点所属的路径编号，
+    整个集合只构建一次 KDTree，可在同一请求中与任意多个用户重复比较。
+    """
+
+    def __init__(self, hotspots):
+        self.lengths = np.array([len(path) for path in hotspots], dtype=np.int64)
+        coords = [(point['latitude'], point['longitude']) for path in hotspots for point in path]
+        self.coords = np.radians(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+        self.labels = np.repeat(np.arange(len(self.lengths)), self.lengths)
+        self.tree = KDTree(self.coords) if len(self.coords) else None
+
+        # 每条路径的包围盒 (min_lat, min_lon, max_lat, max_lon)，空路径保持 NaN
+        self.bounds = np.full((len(self.lengths), 4), np.nan)
+        nonempty = self.lengths > 0
+        if nonempty.any():
+            starts = (np.cumsum(self.lengths) - self.lengths)[nonempty]
+            self.bounds[nonempty, :2] = np.minimum.reduceat(self.coords, starts, axis=0)
+            self.bounds[nonempty, 2:] = np.maximum.reduceat(self.coords, starts, axis=0)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def count_points_near_bounds(self, other, radius):
+        """
+        统计本集合每条路径落在对方每条路径包围盒（外扩 radius）内的点数，
+        作为匹配点数的上界，返回形状为 (len(self), len(other)) 的矩阵。
+        """
+        counts = np.zeros((len(self), len(other)), dtype=np.int64)
+        if self.tree is None or other.tree is None:
+            return counts
+        lat = self.coords[:, 0:1]
+        lon = self.coords[:, 1:2]
+        in_box = (
+            (lat > other.bounds[:, 0] - radius) & (lat < other.bounds[:, 2] + radius) &
+            (lon > other.bounds[:, 1] - radius) & (lon < other.bounds[:, 3] + radius)
+        )
+        np.add.at(counts, self.labels, in_box)
+        return counts
+
+    def count_nearest_matches(self, other, radius):
+        """
+        每个点只查询对方集合中最近的一个点，最近点在 radius 内时该点一定与最近点所在的路径匹配，
+        按 (本方路径, 对方路径) 统计得到匹配点数的下界，返回形状为 (len(self), len(other)) 的矩阵。
+        """
+        counts = np.zeros((len(self), len(other)), dtype=np.int64)
+        if self.tree is None or other.tree is None:
+            return counts
+        distances, indices = other.tree.query(self.coords, distance_upper_bound=radius)
+        hit = distances < radius
+        np.add.at(counts, (self.labels[hit], other.labels[indices[hit]]), 1)
+        return counts
+
+
+def _count_matched_points(point_index, other_labels, labels, shape):
+    """按 (本方路径, 对方路径) 统计至少有一个邻近点的本方点数量"""
+    n_other = shape[1]
+    keys = np.unique(point_index * n_other + other_labels)
+    flat = labels[keys // n_other] * n_other + keys % n_other
+    return np.bincount(flat, minlength=shape[0] * shape[1]).reshape(shape)
+
+
+def score_path_sets(path_set1, path_set2, distance_threshold=100):
+    """
+    以一次数组运算计算两个热点路径集合之间的相似度。
+
+    对每一对路径 (path1, path2)，若 path1 中超过 50% 的点在 path2 附近，
+    或 path2 中超过 50% 的点在 path1 附近，则视为相似；
+    相似度为相似路径对占全部路径对的比例。
+
+    参数：
+    - path_set1, path_set2: HotspotPathSet 实例。
+    - distance_threshold: 距离阈值，含义与原实现一致。
+
+    返回：
+    - similarity_score: 0 到 1 之间的相似度。
+    """
+    shape = (len(path_set1), len(path_set2))
+    total_pairs = shape[0] * shape[1]
+    if total_pairs == 0:
+        return 0
+
+    radius = match_radius(distance_threshold)
+    half1 = path_set1.lengths[:, None] * 0.5
+    half2 = path_set2.lengths[None, :] * 0.5
+
+    # 提前判定：包围盒上界都达不到 50% 的路径对一定不相似，无需逐点比较
+    undecided = (
+        (path_set1.count_points_near_bounds(path_set2, radius) > half1) |
+        (path_set2.count_points_near_bounds(path_set1, radius).T > half2)
+    )
+    if not undecided.any():
+        return 0
+
+    # 提前判定：按最近邻统计的匹配点数是下界，下界已超过 50% 的路径对一定相似
+    similar = undecided & (
+        (path_set1.count_nearest_matches(path_set2, radius) > half1) |
+        (path_set2.count_nearest_matches(path_set1, radius).T > half2)
+    )
+    undecided &= ~similar
+
+    if undecided.any():
+        # 两棵 KDTree 一次遍历得到所有距离小于阈值的点对，双向匹配数都由它统计
+        pairs = path_set1.tree.sparse_distance_matrix(
+            path_set2.tree, max_distance=np.nextafter(radius, 0), output_type='ndarray'
+        )
+        i, j = pairs['i'], pairs['j']
+        match_count1 = _count_matched_points(i, path_set2.labels[j], path_set1.labels, shape)
+        match_count2 = _count_matched_points(j, path_set1.labels[i], path_set2.labels, shape[::-1]).T
+        similar |= undecided & ((match_count1 > half1) | (match_count2 > half2))
+
+    return int(similar.sum()) / total_pairs
+
+
+def compute_similarity(hotspots1, hotspots2, distance_threshold=100):
+    """计算两组热点路径之间的相似度，参见 score_path_sets"""
+    return score_path_sets(HotspotPathSet(hotspots1), HotspotPathSet(hotspots2), distance_threshold)
@@ -0,0 +1,109 @@
+import math
+import click
+from flask.cli import AppGroup
+from backend.app import db
+from backend.app.track.models import HotspotTrajectory, HotspotCell
+
+# 每个用户参与拼车匹配的热点轨迹条数，与拼车推荐接口的截取保持一致
+MAX_INDEXED_PATHS = 30
+
+# 网格边长（度）：取拼车相似度的匹配半径，保证可匹配的两个点位于相同或相邻网格
+CELL_SIZE = 100 / 6371
+
+# 单条 IN 查询携带的网格数量上限
+QUERY_BATCH_SIZE = 1000
+
+spatial_index_cli = AppGroup('spatial-index', help='热点轨迹空间倒排索引维护命令')
+
+
+def hotspot_cells(hotspots):
+    """
+    计算热点路径经过的所有网格单元。
+
+    参数：
+    - hotspots: 热点路径列表，每条路径是包含 'latitude' 和 'longitude' 的点列表。
+
+    返回：
+    - cells: 网格编号 (行, 列) 的集合。
+    """
+    return {
+        (math.floor(point['latitude'] / CELL_SIZE), math.floor(point['longitude'] / CELL_SIZE))
+        for path in hotspots[:MAX_INDEXED_PATHS]
+        for point in path
+    }
+
+
+def _cell_key(cell):
+    return f"{cell[0]}:{cell[1]}"
+
+
+def index_user_hotspots(user_id, hotspots):
+    """
+    将用户新的热点路径写入倒排索引（只插入尚未登记的网格），由调用方负责提交事务。
+    """
+    keys = {_cell_key(cell) for cell in hotspot_cells(hotspots)}
+    existing = {row.cell for row in HotspotCell.query.filter_by(user_id=user_id).with_entities(HotspotCell.cell)}
+    missing = keys - existing
+    if missing:
+        db.session.execute(
+            HotspotCell.__table__.insert(),
+            [{"cell": key, "user_id": user_id} for key in missing]
+        )
+
+
+def find_candidate_user_ids(user_id, hotspots):
+    """
+    查找热点路径与给定路径经过相同或相邻网格的其他用户。
+
+    没有共享网格的用户与当前用户不存在任何可匹配的点对，相似度必为 0，可直接跳过。
+
+    返回：
+    - candidate_ids: 候选用户 ID 的集合。
+    """
+    keys = sorted({
+        _cell_key((row + d_row, col + d_col))
+        for row, col in hotspot_cells(hotspots)
+        for d_row in (-1, 0, 1)
+        for d_col in (-1, 0, 1)
+    })
+
+    candidate_ids = set()
+    for start in range(0, len(keys), QUERY_BATCH_SIZE):
+        rows = db.session.query(HotspotCell.user_id).filter(
+            HotspotCell.cell.in_(keys[start:start + QUERY_BATCH_SIZE]),
+            HotspotCell.user_id != user_id
+        ).distinct()
+        candidate_ids.update(row.user_id for row in rows)
+    return candidate_ids
+
+
+def rebuild_index():
+    """
+    根据 HotspotTrajectory 表全量重建倒排索引。
+
+    返回：
+    - total_cells: 重建后的索引条目数。
+    """
+    db.session.query(HotspotCell).delete()
+
+    user_cells = {}
+    for record in HotspotTrajectory.query.yield_per(100):
+        if record.hotspot_data:
+            user_cells.setdefault(record.user_id, set()).update(hotspot_cells(record.hotspot_data))
+
+    rows = [
+        {"cell": _cell_key(cell), "user_id": user_id}
+        for user_id, cells in user_cells.items()
+        for cell in cells
+    ]
+    if rows:
+        db.session.execute(HotspotCell.__table__.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+@spatial_index_cli.command('rebuild')
+def rebuild_command():
+    """离线全量重建热点轨迹空间倒排索引"""
+    total_cells = rebuild_index()
+    click.echo(f"空间倒排索引重建完成，共 {total_cells} 条记录")
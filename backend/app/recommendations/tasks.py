@@ -0,0 +1,17 @@
+from backend.app import celery
+from backend.app.recommendations.carpool_matches import precompute_carpool_matches
+
+# Celery beat 调度批量预计算时使用的任务名
+PRECOMPUTE_CARPOOL_TASK = 'recommendations.precompute_carpool_matches'
+
+
+@celery.task(name=PRECOMPUTE_CARPOOL_TASK)
+def precompute_carpool_matches_task():
+    """
+    批量预计算全体用户的拼车匹配，由 Celery beat 按 CARPOOL_BATCH_INTERVAL 定时调度。
+
+    返回：
+    - 包含写入的用户数 users 与匹配条数 matches 的字典。
+    """
+    user_count, pair_count = precompute_carpool_matches()
+    return {"users": user_count, "matches": pair_count}
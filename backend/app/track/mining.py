@@ -0,0 +1,441 @@
+import functools
+import hashlib
+import json
+import logging
+from flask import current_app
+from sqlalchemy import func
+from backend.scripts.NDTTJ import iter_NDTTJ, top_k_NDTTJ
+from backend.scripts.NDTTT import iter_NDTTT, top_k_NDTTT
+from backend.scripts.TTHS import iter_TTHS, top_k_TTHS
+from backend.scripts.planner import load_cost_model, plan_mining
+from backend.scripts.topk import rank_paths
+from backend.scripts.incremental import (
+    STATE_VERSION, update_NDTTJ_state, update_NDTTT_state, iter_hotspots_from_state, top_k_from_state
+)
+from backend.app import db
+from backend.app.cache import bump_data_version
+from backend.app.metrics import MINING_RUNS, mining_observer
+from backend.app.track.models import Trajectory, HotspotTrajectory, MiningState
+from backend.app.recommendations.spatial_index import index_user_hotspots
+from backend.app.track.trajectory_store import store_enabled, sync_user_trajectories
+from backend.app.track.scope import apply_scope
+
+logger = logging.getLogger(__name__)
+
+# 回读旧轨迹时单条 IN 查询携带的 ID 数量上限
+LOAD_BATCH_SIZE = 500
+
+# 挖掘算法实现的版本号，算法输出（路径集合或顺序）发生变化时递增，使按旧版本输入指纹保存的结果失效
+MINING_ALGORITHM_VERSION = 2
+
+
+def _to_processed_data(trajectory_records):
+    """
+    将 Trajectory 记录整合为挖掘算法所需的嵌套结构，trajectory_id 使用数据库主键以保持稳定。
+    """
+    processed_data = []
+    for trajectory in trajectory_records:
+        trajectory_data = trajectory.trajectory_data.get('nodes', [])
+        if trajectory_data:
+            processed_data.append({
+                "trajectory_id": trajectory.id,
+                "nodes": trajectory_data
+            })
+    return processed_data
+
+
+def _has_repeated_points(trajectory):
+    points = [(node['latitude'], node['longitude']) for node in trajectory['nodes']]
+    return len(set(points)) < len(points)
+
+
+def load_processed_data(user_id, scope=None):
+    """
+    从数据库中获取用户的所有轨迹数据，整合为挖掘算法所需的嵌套结构。
+
+    参数：
+    - scope: 可选的分析范围（见 backend.app.track.scope.parse_scope），只读取与之有交集的轨迹。
+
+    返回：
+    - processed_data: 轨迹列表，每个轨迹是一个包含 'trajectory_id' 和 'nodes' 的字典；
+      设置了 TRAJECTORY_STORE_PATH 时为列式存储的 ColumnarTrajectories（可同样传给挖掘算法）；
+      用户没有任何轨迹记录时返回 None，范围内没有轨迹时返回空列表。
+    """
+    if store_enabled():
+        # 列式存储已启用时直接返回内存映射的轨迹集合，不解析轨迹 JSON
+        trajectories = sync_user_trajectories(user_id)
+        if trajectories is None or not scope:
+            return trajectories
+        # 范围条件在数据库中只选出轨迹 ID，再从列式存储中截取这些轨迹
+        scoped_ids = apply_scope(db.session.query(Trajectory.id).filter_by(user_id=user_id), scope)
+        return trajectories.select(row[0] for row in scoped_ids)
+
+    trajectory_records = apply_scope(Trajectory.query.filter_by(user_id=user_id), scope).all()
+    if not trajectory_records:
+        # 区分用户没有任何轨迹与范围内没有轨迹
+        if not scope or db.session.query(Trajectory.id).filter_by(user_id=user_id).first() is None:
+            return None
+    return _to_processed_data(trajectory_records)
+
+
+def input_fingerprint(user_id, min_support, min_length, incremental=False, top_k=None, scope=None):
+    """
+    在挖掘之前计算输入指纹：（分析范围内）用户轨迹的 ID 与更新时间、挖掘参数、影响算法选择与输出的配置，以及算法版本。
+
+    只查询轨迹的 ID 与更新时间两列，不读取轨迹 JSON；指纹不变时挖掘结果必然不变。
+
+    返回：
+    - fingerprint: 32 位十六进制字符串；用户没有任何轨迹记录时返回 None。
+    """
+    rows = apply_scope(db.session.query(Trajectory.id, Trajectory.updated_at).filter_by(
+        user_id=user_id
+    ), scope).order_by(Trajectory.id).all()
+    if not rows:
+        return None
+
+    digest = hashlib.md5(json.dumps({
+        "version": MINING_ALGORITHM_VERSION,
+        "min_support": min_support,
+        "min_length": min_length,
+        "incremental": bool(incremental),
+        "top_k": top_k,
+        "scope": scope,
+        "cost_model": current_app.config['MINING_COST_MODEL'],
+        "tths_max_length": current_app.config['TTHS_MAX_LENGTH'],
+        "tths_max_results": current_app.config['TTHS_MAX_RESULTS']
+    }, sort_keys=True).encode('utf-8'))
+    for trajectory_id, updated_at in rows:
+        digest.update(f"{trajectory_id}:{updated_at}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_fingerprinted_result(user_id, fingerprint):
+    """
+    查找由相同输入挖掘得到的已保存结果，找到时该记录重新成为用户当前的热点记录（见 make_current）。
+
+    返回：
+    - result: 结构与 /track/analyze 响应一致的字典；没有匹配的热点记录时返回 None。
+    """
+    if fingerprint is None:
+        return None
+    hotspot = HotspotTrajectory.query.filter_by(user_id=user_id, input_fingerprint=fingerprint).first()
+    if hotspot is None:
+        return None
+    hotspot = make_current(hotspot)
+
+    meta = hotspot.analysis_meta or {}
+    result = {"plan": meta.get('plan')}
+    if meta.get('supports') is not None:
+        result["supports"] = meta['supports']
+    result["hotspots"] = hotspot.hotspot_data
+    result["hotspot_hash"] = hotspot.hotspot_hash
+    result["message"] = "Hotspot data already exists, no new data was added"
+    return result
+
+
+@functools.lru_cache(maxsize=None)
+def _cost_model(path):
+    return load_cost_model(path)
+
+
+def plan_algorithm(processed_data, min_length, min_support):
+    """
+    统计轨迹特征并估计各算法的代价，选择代价最小的算法。
+
+    返回：
+    - plan: 包含 algorithm、estimates 与 statistics 的字典，见 backend.scripts.planner.plan_mining。
+    """
+    return plan_mining(
+        processed_data, kmin=min_length, mmin=min_support,
+        cost_model=_cost_model(current_app.config['MINING_COST_MODEL']),
+        max_length=current_app.config['TTHS_MAX_LENGTH'],
+        max_results=current_app.config['TTHS_MAX_RESULTS']
+    )
+
+
+def run_mining(processed_data, min_length, min_support, progress=None, plan=None, stream=False, top_k=None):
+    """
+    根据代价估计选择合适的算法挖掘热点路径。
+
+    参数：
+    - processed_data: load_processed_data 返回的轨迹列表。
+    - min_length: 最小路径长度。
+    - min_support: 最小频繁度。
+    - progress: 可选的进度回调，透传给挖掘算法。
+    - plan: 可选的已有规划结果，不传时由 plan_algorithm 计算。
+    - stream: 为 True 时 hotspots 为逐条产出路径的生成器，挖掘随迭代进行。
+    - top_k: 可选，只返回支持度最高的 top_k 条路径，忽略 stream。
+
+    返回：
+    - (hotspots, plan): 按支持度排序的、包含 'path' 和 'support' 的字典列表（stream 模式下为按挖掘顺序
+      逐条产出路径的生成器），以及所选算法与各算法的代价估计。
+    """
+    if plan is None:
+        plan = plan_algorithm(processed_data, min_length, min_support)
+    algorithm = plan['algorithm']
+    mode = 'top_k' if top_k else ('stream' if stream else 'full')
+    MINING_RUNS.labels(algorithm, mode).inc()
+    logger.info("Mining hotspots", extra={
+        "algorithm": algorithm, "mode": mode, "trajectories": len(processed_data),
+        "min_length": min_length, "min_support": min_support
+    })
+
+    # 各阶路径表大小、连接候选数、剪枝数、每阶耗时与轨迹图规模记录到 /metrics
+    observe = mining_observer(algorithm)
+    if top_k:
+        return _top_k_algorithm(algorithm, processed_data, min_length, min_support, top_k, progress, observe), plan
+    hotspots = _iter_algorithm(algorithm, processed_data, min_length, min_support, progress, observe, not stream)
+    return (hotspots if stream else _rank(hotspots)), plan
+
+
+def _top_k_algorithm(algorithm, processed_data, min_length, min_support, top_k, progress=None, observe=None):
+    if algorithm == 'NDTTJ':
+        return top_k_NDTTJ(
+            processed_data, kmin=min_length, mmin=min_support, top_k=top_k, progress=progress, observe=observe
+        )
+    elif algorithm == 'NDTTT':
+        return top_k_NDTTT(
+            processed_data, kmin=min_length, mmin=min_support, top_k=top_k, progress=progress,
+            workers=current_app.config['MINING_WORKERS'], observe=observe
+        )
+    else:
+        return top_k_TTHS(
+            processed_data, kmin=min_length, mmin=min_support, top_k=top_k, progress=progress,
+            max_length=current_app.config['TTHS_MAX_LENGTH'], observe=observe
+        )
+
+
+def _rank(hotspots_with_support):
+    # 完整结果按与 top-k 相同的规则排序，保存的热点数据中靠前的路径即为支持度最高的路径
+    return [{'path': path, 'support': support} for path, support in rank_paths(hotspots_with_support)]
+
+
+def split_ranked(ranked_paths):
+    """
+    将排序后的挖掘结果拆分为热点路径列表（可直接保存）与对应的支持度列表。
+    """
+    return [item['path'] for item in ranked_paths], [item['support'] for item in ranked_paths]
+
+
+def _iter_algorithm(algorithm, processed_data, min_length, min_support, progress=None, observe=None,
+                    with_support=False):
+    if algorithm == 'NDTTJ':
+        return iter_NDTTJ(
+            processed_data, kmin=min_length, mmin=min_support, progress=progress, observe=observe,
+            with_support=with_support
+        )  # 使用 NDTTJ 算法
+    elif algorithm == 'NDTTT':
+        return iter_NDTTT(
+            processed_data, kmin=min_length, mmin=min_support, progress=progress,
+            workers=current_app.config['MINING_WORKERS'], observe=observe, with_support=with_support
+        )  # 使用 NDTTT 算法
+    else:
+        return iter_TTHS(
+            processed_data, kmin=min_length, mmin=min_support, progress=progress,
+            max_length=current_app.config['TTHS_MAX_LENGTH'],
+            max_results=current_app.config['TTHS_MAX_RESULTS'], observe=observe, with_support=with_support
+        )  # 使用 TTHS 算法
+
+
+def _observing_progress(progress, observe):
+    # 增量挖掘只通过进度回调上报各阶路径表大小
+    def report(k, table_size):
+        observe('path_table_size', table_size, k)
+        if progress:
+            progress(k, table_size)
+    return report
+
+
+def run_incremental_mining(user_id, min_length, min_support, progress=None, stream=False, top_k=None):
+    """
+    增量挖掘热点路径：只合并水位线之后新增的轨迹，结果与全量挖掘一致。
+
+    NDTTJ / NDTTT 的路径表状态保存在 MiningState 表中，沿用状态建立时规划器选中的算法；
+    没有可用状态时加载全部轨迹重新规划，选中 TTHS 时（不支持增量）直接全量挖掘。
+    水位线以内的轨迹数量发生变化（例如轨迹被删除）或状态格式版本变化时，状态失效并全量重建。
+
+    参数 stream / top_k 同 run_mining。
+
+    返回：
+    - (hotspots, plan): 同 run_mining；用户没有任何轨迹记录时返回 (None, None)。
+    """
+    user_trajectories = Trajectory.query.filter_by(user_id=user_id)
+    if user_trajectories.count() == 0:
+        return None, None
+
+    record = MiningState.query.filter_by(
+        user_id=user_id, min_support=min_support
+    ).order_by(MiningState.updated_at.desc(), MiningState.id.desc()).first()
+    state, watermark = None, 0
+    if record:
+        folded_count = user_trajectories.filter(Trajectory.id <= record.watermark).count()
+        if folded_count == record.trajectory_count:
+            state, watermark = record.load_state(), record.watermark
+            if state.get("version") != STATE_VERSION:
+                state, watermark = None, 0
+
+    new_watermark = db.session.query(func.max(Trajectory.id)).filter(Trajectory.user_id == user_id).scalar()
+    new_trajectories = []
+    if state is not None and new_watermark > watermark:
+        new_trajectories = _to_processed_data(user_trajectories.filter(
+            Trajectory.id > watermark, Trajectory.id <= new_watermark
+        ).all())
+        # 新轨迹中有重复经过的点时可能形成环路，NDTTJ 的连接不会终止，需要重新规划
+        if record.algorithm == 'NDTTJ' and any(_has_repeated_points(trajectory) for trajectory in new_trajectories):
+            state, watermark = None, 0
+
+    if state is None:
+        # 重建状态前先对全部轨迹做一次代价规划
+        new_trajectories = _to_processed_data(user_trajectories.filter(Trajectory.id <= new_watermark).all())
+        plan = plan_algorithm(new_trajectories, min_length, min_support)
+        algorithm = plan['algorithm']
+        if algorithm == 'TTHS':
+            return run_mining(
+                new_trajectories, min_length, min_support, progress=progress, plan=plan, stream=stream, top_k=top_k
+            )
+        record = MiningState.query.filter_by(user_id=user_id, algorithm=algorithm, min_support=min_support).first()
+    else:
+        algorithm = record.algorithm
+        plan = {"algorithm": algorithm, "incremental_state": True}
+
+    if state is None or new_watermark > watermark:
+        MINING_RUNS.labels(algorithm, 'incremental').inc()
+        logger.info("Updating incremental mining state", extra={
+            "algorithm": algorithm, "new_trajectories": len(new_trajectories), "min_support": min_support
+        })
+        progress = _observing_progress(progress, mining_observer(algorithm))
+        if algorithm == 'NDTTJ':
+            state = update_NDTTJ_state(state, new_trajectories, min_support, progress=progress)
+        else:
+            def load_trajectories(trajectory_ids):
+                trajectory_ids = sorted(trajectory_ids)
+                for start in range(0, len(trajectory_ids), LOAD_BATCH_SIZE):
+                    yield from _to_processed_data(Trajectory.query.filter(
+                        Trajectory.id.in_(trajectory_ids[start:start + LOAD_BATCH_SIZE])
+                    ))
+
+            state = update_NDTTT_state(state, new_trajectories, min_support, load_trajectories, progress=progress)
+
+        trajectory_count = user_trajectories.filter(Trajectory.id <= new_watermark).count()
+        if record is None:
+            record = MiningState(user_id=user_id, algorithm=algorithm, min_support=min_support)
+            db.session.add(record)
+        record.watermark = new_watermark
+        record.trajectory_count = trajectory_count
+        record.dump_state(state)
+        db.session.commit()
+
+    if top_k:
+        return top_k_from_state(state, min_length, top_k), plan
+    hotspots = iter_hotspots_from_state(state, min_length, with_support=not stream)
+    return (hotspots if stream else _rank(hotspots)), plan
+
+
+def store_hotspots(user_id, hotspots, fingerprint=None, meta=None, hotspot_hash=None):
+    """
+    保存热点路径，已存在相同热点数据时不重复写入。
+
+    参数：
+    - fingerprint: 可选的挖掘输入指纹（input_fingerprint），与热点数据一同保存，之后相同输入的请求直接返回该结果。
+    - meta: 可选的附加信息（plan 与 supports），随指纹一同保存。
+    - hotspot_hash: 可选的 HotspotTrajectory.generate_hash(hotspots)，调用方已计算时传入以免重复序列化。
+
+    返回：
+    - created: 是否写入了新的热点数据。
+    """
+    # 检查是否已存在相同的热点数据
+    hotspot_hash = hotspot_hash or HotspotTrajectory.generate_hash(hotspots)
+    existing = HotspotTrajectory.query.filter_by(user_id=user_id, hotspot_hash=hotspot_hash).first()
+    if existing is not None:
+        # 数据相同，不重复写入，只记录最新的输入指纹；这份数据仍是最近一次的分析结果，作为当前热点记录
+        if fingerprint is not None and existing.input_fingerprint != fingerprint:
+            existing.input_fingerprint = fingerprint
+            existing.analysis_meta = meta
+            db.session.commit()
+        make_current(existing)
+        return False
+
+    # 如果是新数据，插入 `HotspotTrajectory` 表，并同步更新空间倒排索引
+    new_hotspot = HotspotTrajectory(
+        user_id=user_id, hotspot_data=hotspots, hotspot_hash=hotspot_hash,
+        input_fingerprint=fingerprint, analysis_meta=meta
+    )
+    db.session.add(new_hotspot)
+    index_user_hotspots(user_id, hotspots)
+    db.session.commit()
+    # 热点数据变化后，依赖它的拼车与 POI 推荐缓存随版本号失效
+    bump_data_version(user_id, 'hotspot')
+    return True
+
+
+def restore_current(user_id, hotspot_hash):
+    """
+    /track/analyze 的结果来自缓存时调用：使产生该结果的已保存记录重新成为用户当前的热点记录，
+    与重新分析（store_hotspots / load_fingerprinted_result）的效果一致。
+    """
+    if not hotspot_hash:
+        return
+    hotspot = HotspotTrajectory.query.filter_by(user_id=user_id, hotspot_hash=hotspot_hash).first()
+    if hotspot is not None:
+        make_current(hotspot)
+
+
+def make_current(hotspot):
+    """
+    使已保存的热点记录成为用户当前的热点记录（HotspotTrajectory.current，id 最大的一行）。
+
+    相同的热点数据不会重复保存，当最近一次分析的结果与较早的某条记录相同时，重新插入该记录使其 id 最大，
+    并递增热点版本，拼车与 POI 推荐随之改用这份数据。
+
+    返回：
+    - hotspot: 当前的热点记录（原记录或重新插入的记录）。
+    """
+    latest_id = db.session.query(func.max(HotspotTrajectory.id)).filter(
+        HotspotTrajectory.user_id == hotspot.user_id
+    ).scalar()
+    if hotspot.id == latest_id:
+        return hotspot
+
+    current = HotspotTrajectory(
+        user_id=hotspot.user_id, hotspot_data=hotspot.hotspot_data, hotspot_hash=hotspot.hotspot_hash,
+        input_fingerprint=hotspot.input_fingerprint, analysis_meta=hotspot.analysis_meta
+    )
+    # 哈希列唯一，先删除原记录再插入
+    db.session.delete(hotspot)
+    db.session.flush()
+    db.session.add(current)
+    db.session.commit()
+    bump_data_version(current.user_id, 'hotspot')
+    return current
+
+
+def stream_hotspots(user_id, hotspots, plan):
+    """
+    以 NDJSON 格式逐行输出热点路径（每行一条路径），最后一行输出汇总信息。
+
+    内存中只保留当前路径，占用不随结果数量增长。哈希随输出逐条累积，与 HotspotTrajectory.generate_hash
+    对完整列表的计算结果一致，随汇总行返回。流式结果按挖掘顺序输出、不含支持度，因此不保存为热点记录，
+    不会成为拼车与 POI 推荐使用的当前热点数据；需要保存时使用非流式或异步模式。
+
+    参数：
+    - hotspots: 逐条产出热点路径的可迭代对象（run_mining / run_incremental_mining 的 stream 模式）。
+    - plan: 规划结果，随汇总行输出。
+
+    产出：
+    - NDJSON 文本行；挖掘中途出错时输出包含 error 的汇总行。
+    """
+    digest = hashlib.md5()
+    count = 0
+    try:
+        # json.dumps 对列表的输出即各元素以 ", " 连接并加上方括号，逐段累积哈希与完整序列化一致
+        digest.update(b'[')
+        for path in hotspots:
+            digest.update(((', ' if count else '') + json.dumps(path, sort_keys=True)).encode('utf-8'))
+            count += 1
+            yield json.dumps(path) + '\n'
+        digest.update(b']')
+        summary = {"done": True, "count": count, "plan": plan, "hotspot_hash": digest.hexdigest()}
+    except Exception as e:
+        logger.exception("Error running the algorithm", extra={"user_id": user_id})
+        summary = {"done": False, "count": count, "message": "Error running the algorithm", "error": str(e)}
+    yield json.dumps(summary) + '\n'
@@ -1,15 +1,58 @@
 from backend.app import db
 import hashlib
 import json
+import math
+import pickle
+import zlib
 
 
 class Trajectory(db.Model):
     __tablename__ = 'Trajectory'
+    __table_args__ = (
+        # 时间窗口与空间范围的分析范围条件按用户下推到这两个索引
+        db.Index('ix_trajectory_user_time', 'user_id', 'start_time', 'end_time'),
+        db.Index('ix_trajectory_user_bbox', 'user_id', 'min_latitude', 'max_latitude', 'min_longitude', 'max_longitude'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     trajectory_data = db.Column(db.JSON, nullable=False)  # 使用JSON格式存储轨迹数据
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp(), index=True)
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    # 轨迹的时间范围（首末轨迹点的 UNIX 时间戳，秒）与包围盒，写入时由 trajectory_data 计算
+    start_time = db.Column(db.BigInteger)
+    end_time = db.Column(db.BigInteger)
+    min_latitude = db.Column(db.Double)
+    max_latitude = db.Column(db.Double)
+    min_longitude = db.Column(db.Double)
+    max_longitude = db.Column(db.Double)
+
+    @staticmethod
+    def extent(trajectory_data):
+        """
+        计算轨迹的时间范围与包围盒，返回可直接作为列值写入的字典；没有轨迹点（或时间戳）时对应的值为 None。
+        """
+        nodes = (trajectory_data or {}).get('nodes') or []
+        latitudes = [node['latitude'] for node in nodes]
+        longitudes = [node['longitude'] for node in nodes]
+        timestamps = [node['timestamp'] for node in nodes if node.get('timestamp') is not None]
+        return {
+            "start_time": math.floor(min(timestamps)) if timestamps else None,
+            "end_time": math.ceil(max(timestamps)) if timestamps else None,
+            "min_latitude": min(latitudes) if latitudes else None,
+            "max_latitude": max(latitudes) if latitudes else None,
+            "min_longitude": min(longitudes) if longitudes else None,
+            "max_longitude": max(longitudes) if longitudes else None,
+        }
+
+
+@db.event.listens_for(Trajectory, 'before_insert')
+@db.event.listens_for(Trajectory, 'before_update')
+def _set_trajectory_extent(mapper, connection, target):
+    # 通过 ORM 写入的轨迹自动维护时间范围与包围盒列；Core 批量插入需自行传入 Trajectory.extent 的结果
+    for column, value in Trajectory.extent(target.trajectory_data).items():
+        setattr(target, column, value)
 
 
 class HotspotTrajectory(db.Model):
@@ -19,6 +62,8 @@ class HotspotTrajectory(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     hotspot_data = db.Column(db.JSON, nullable=False)  # 使用JSON格式存储热点数据
     hotspot_hash = db.Column(db.String(32), unique=True)  # 新增的hash字段，确保唯一性
+    input_fingerprint = db.Column(db.String(32), index=True)  # 产生该热点数据的挖掘输入指纹，见 mining.input_fingerprint
+    analysis_meta = db.Column(db.JSON)  # 产生该热点数据的规划结果（plan）与 top-k 支持度（supports）
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
 
     @staticmethod
@@ -27,3 +72,43 @@ class HotspotTrajectory(db.Model):
         为热点数据生成唯一哈希值。
         """
         return hashlib.md5(json.dumps(hotspot_data, sort_keys=True).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def current(cls, user_id):
+        """
+        用户当前的热点记录，即最近一次分析保存的热点数据（id 最大的一行）；拼车与 POI 推荐均以它为准。
+        """
+        return cls.query.filter_by(user_id=user_id).order_by(cls.id.desc()).first()
+
+
+class MiningState(db.Model):
+    """
+    增量热点挖掘的中间状态：各阶路径表及其支持集，以及已合并轨迹的水位线。
+    """
+    __tablename__ = 'MiningState'
+    __table_args__ = (db.UniqueConstraint('user_id', 'algorithm', 'min_support', name='uq_mining_state'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    algorithm = db.Column(db.String(16), nullable=False)
+    min_support = db.Column(db.Integer, nullable=False)
+    watermark = db.Column(db.Integer, nullable=False)  # 已合并轨迹的最大 Trajectory.id
+    trajectory_count = db.Column(db.Integer, nullable=False)  # 水位线以内已合并的轨迹数
+    state_data = db.Column(db.LargeBinary(length=(2 ** 32) - 1), nullable=False)  # zlib 压缩的 pickle 状态
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    def load_state(self):
+        return pickle.loads(zlib.decompress(self.state_data))
+
+    def dump_state(self, state):
+        self.state_data = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class HotspotCell(db.Model):
+    """
+    热点轨迹空间倒排索引：记录每个网格单元内有热点路径经过的用户。
+    """
+    __tablename__ = 'HotspotCell'
+
+    cell = db.Column(db.String(32), primary_key=True)  # 网格单元编号，格式为 "行:列"
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True, index=True)
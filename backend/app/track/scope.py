@@ -0,0 +1,122 @@
+import hashlib
+import json
+import time
+import click
+from flask.cli import AppGroup
+from backend.app import db
+from backend.app.cache import bump_data_versions
+from backend.app.track.models import Trajectory
+
+# 以 days 指定相对时间窗口时，起点按该粒度（秒）取整，同一时段内的请求得到相同的范围与缓存键
+SCOPE_TIME_QUANTUM = 3600
+
+# 回填轨迹时间范围与包围盒时每批处理的行数
+BACKFILL_BATCH_SIZE = 500
+
+trajectory_cli = AppGroup('trajectory', help='轨迹数据维护命令')
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def parse_scope(data, now=None):
+    """
+    从请求参数中解析热点分析的范围。
+
+    支持的参数：
+    - since / until: 时间窗口的起止 UNIX 时间戳（秒），与轨迹的时间范围有交集的轨迹参与分析。
+    - days: 最近若干天，与 since 互斥；起点按 SCOPE_TIME_QUANTUM 取整。
+    - bbox: [min_latitude, min_longitude, max_latitude, max_longitude]，与包围盒有交集的轨迹参与分析。
+
+    返回：
+    - scope: 只包含 since、until、bbox 的字典；没有指定任何范围时返回 None。
+
+    参数无效时抛出 ValueError。
+    """
+    since, until, days, bbox = data.get('since'), data.get('until'), data.get('days'), data.get('bbox')
+    if since is None and until is None and days is None and bbox is None:
+        return None
+
+    scope = {}
+    if days is not None:
+        if since is not None:
+            raise ValueError("days and since cannot be combined")
+        if not _is_number(days) or days <= 0:
+            raise ValueError("days must be a positive number")
+        now = time.time() if now is None else now
+        since = int(now) // SCOPE_TIME_QUANTUM * SCOPE_TIME_QUANTUM - int(days * 86400)
+    for name, value in (('since', since), ('until', until)):
+        if value is not None:
+            if not _is_number(value):
+                raise ValueError(f"{name} must be a UNIX timestamp")
+            scope[name] = value
+    if since is not None and until is not None and since > until:
+        raise ValueError("since must not be later than until")
+
+    if bbox is not None:
+        if not isinstance(bbox, list) or len(bbox) != 4 or not all(_is_number(value) for value in bbox):
+            raise ValueError("bbox must be [min_latitude, min_longitude, max_latitude, max_longitude]")
+        if bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            raise ValueError("bbox minimums must not exceed maximums")
+        scope['bbox'] = bbox
+    return scope
+
+
+def scope_key(scope):
+    """分析范围在缓存键与任务键中的表示，不限范围时为 'all'"""
+    if not scope:
+        return 'all'
+    return hashlib.md5(json.dumps(scope, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def apply_scope(query, scope):
+    """
+    把分析范围作为 Trajectory 的时间范围与包围盒列上的条件下推到数据库查询。
+    """
+    if not scope:
+        return query
+    if 'since' in scope:
+        query = query.filter(Trajectory.end_time >= scope['since'])
+    if 'until' in scope:
+        query = query.filter(Trajectory.start_time <= scope['until'])
+    if 'bbox' in scope:
+        min_latitude, min_longitude, max_latitude, max_longitude = scope['bbox']
+        query = query.filter(
+            Trajectory.max_latitude >= min_latitude, Trajectory.min_latitude <= max_latitude,
+            Trajectory.max_longitude >= min_longitude, Trajectory.min_longitude <= max_longitude
+        )
+    return query
+
+
+def backfill_extents():
+    """
+    为时间范围与包围盒列为空的历史轨迹计算并写入这些列。
+
+    写入会更新轨迹的 updated_at，每批提交后递增涉及用户的轨迹版本，使 /track/analyze 的缓存结果失效。
+
+    返回：
+    - updated: 更新的轨迹数。
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        records = Trajectory.query.filter(
+            Trajectory.id > last_id, Trajectory.min_latitude.is_(None)
+        ).order_by(Trajectory.id).limit(BACKFILL_BATCH_SIZE).all()
+        if not records:
+            return updated
+        db.session.execute(Trajectory.__table__.update().where(
+            Trajectory.id == db.bindparam('trajectory_id')
+        ), [dict(Trajectory.extent(record.trajectory_data), trajectory_id=record.id) for record in records])
+        db.session.commit()
+        bump_data_versions({record.user_id for record in records}, 'trajectory')
+        updated += len(records)
+        last_id = records[-1].id
+
+
+@trajectory_cli.command('backfill-extent')
+def backfill_extent_command():
+    """为历史轨迹回填时间范围与包围盒列"""
+    updated = backfill_extents()
+    click.echo(f"轨迹时间范围与包围盒回填完成，共 {updated} 条记录")
@@ -0,0 +1,122 @@
+import uuid
+from backend.app import celery
+from backend.app.cache import cache
+from backend.app.track.scope import scope_key
+from backend.app.track.mining import (
+    input_fingerprint, load_fingerprinted_result, load_processed_data, run_mining, run_incremental_mining,
+    store_hotspots, split_ranked
+)
+from backend.app.track.models import HotspotTrajectory
+
+# 挖掘任务去重标记的有效期（秒），防止异常退出的任务永久占用
+MINING_JOB_TTL = 6 * 3600
+
+
+def _job_key(user_id, min_support, min_length, top_k=None, scope=None):
+    return f"mining_job_{user_id}_{min_support}_{min_length}_{top_k or 'all'}_{scope_key(scope)}"
+
+
+def _job_owner_key(job_id):
+    return f"mining_job_owner_{job_id}"
+
+
+@celery.task(bind=True, name='track.mine_hotspots')
+def mine_hotspots_task(self, user_id, min_support, min_length, incremental=False, top_k=None, scope=None):
+    """
+    异步挖掘用户热点路径，并在每完成一阶路径表时上报进度。
+
+    返回：
+    - 包含 hotspots 的结果字典，结构与同步的 /track/analyze 响应一致。
+    """
+    table_sizes = {}
+
+    def report_progress(k, table_size):
+        table_sizes[str(k)] = table_size
+        self.update_state(state='PROGRESS', meta={"k": k, "table_sizes": table_sizes})
+
+    try:
+        # 轨迹与参数都未变化时直接返回已保存的结果
+        fingerprint = input_fingerprint(user_id, min_support, min_length, incremental, top_k, scope)
+        result = load_fingerprinted_result(user_id, fingerprint)
+        if result is not None:
+            return result
+
+        if incremental:
+            hotspots, plan = run_incremental_mining(
+                user_id, min_length, min_support, progress=report_progress, top_k=top_k
+            )
+            if hotspots is None:
+                return {"hotspots": [], "message": "No trajectory data to analyze"}
+        else:
+            processed_data = load_processed_data(user_id, scope)
+            if not processed_data:
+                return {"hotspots": [], "message": "No trajectory data to analyze"}
+
+            hotspots, plan = run_mining(processed_data, min_length, min_support, progress=report_progress, top_k=top_k)
+
+        hotspots, supports = split_ranked(hotspots)
+        hotspot_hash = HotspotTrajectory.generate_hash(hotspots)
+        result = {"plan": plan, "supports": supports, "hotspots": hotspots, "hotspot_hash": hotspot_hash}
+        meta = {"plan": plan, "supports": supports}
+        if not store_hotspots(user_id, hotspots, fingerprint, meta, hotspot_hash):
+            result["message"] = "Hotspot data already exists, no new data was added"
+        return result
+    finally:
+        # 任务结束后释放去重标记，之后的相同提交会启动新的挖掘
+        key = _job_key(user_id, min_support, min_length, top_k, scope)
+        if cache.get(key) == self.request.id:
+            cache.delete(key)
+
+
+def submit_mining_job(user_id, min_support, min_length, incremental=False, top_k=None, scope=None):
+    """
+    提交异步挖掘任务；相同用户和参数的任务仍在执行时，直接复用该任务。
+    增量与全量挖掘的结果一致，因此去重时不区分两种模式。
+
+    任务入队失败（例如消息代理不可用）时释放去重标记并重新抛出异常，之后的相同提交可以重试。
+
+    返回：
+    - (job_id, attached): 任务 ID，以及是否复用了已有任务。
+    """
+    key = _job_key(user_id, min_support, min_length, top_k, scope)
+    while True:
+        job_id = str(uuid.uuid4())
+        if cache.set(key, job_id, nx=True, ex=MINING_JOB_TTL):
+            cache.setex(_job_owner_key(job_id), MINING_JOB_TTL, user_id)
+            try:
+                mine_hotspots_task.apply_async(
+                    args=(user_id, min_support, min_length, incremental, top_k, scope), task_id=job_id
+                )
+            except Exception:
+                if cache.get(key) == job_id:
+                    cache.delete(key)
+                cache.delete(_job_owner_key(job_id))
+                raise
+            return job_id, False
+
+        existing_job_id = cache.get(key)
+        if existing_job_id:
+            return existing_job_id, True
+        # 已有任务恰好在两次读取之间结束，重新尝试提交
+
+
+def get_mining_job(user_id, job_id):
+    """
+    查询异步挖掘任务的状态；任务不存在或不属于该用户时返回 None。
+
+    返回：
+    - 状态字典：state，以及进度 (k, table_sizes) 或最终结果 / 错误信息。
+    """
+    owner = cache.get(_job_owner_key(job_id))
+    if owner is None or str(owner) != str(user_id):
+        return None
+
+    result = mine_hotspots_task.AsyncResult(job_id)
+    status = {"job_id": job_id, "state": result.state}
+    if result.state == 'PROGRESS':
+        status.update(result.info or {})
+    elif result.state == 'SUCCESS':
+        status["result"] = result.result
+    elif result.state == 'FAILURE':
+        status["error"] = str(result.result)
+    return status
@@ -1,10 +1,19 @@
-from flask import Blueprint, jsonify, request
+import logging
+from flask import Blueprint, Response, jsonify, request, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from backend.scripts.NDTTJ import NDTTJ
-from backend.scripts.NDTTT import NDTTT
-from backend.scripts.TTHS import TTHS
-from backend.app import db
-from backend.app.track.models import Trajectory, HotspotTrajectory
+from backend.app.track.mining import (
+    input_fingerprint, load_fingerprinted_result, load_processed_data, run_mining, run_incremental_mining,
+    restore_current, store_hotspots, stream_hotspots, split_ranked
+)
+from backend.app.track.models import HotspotTrajectory
+from backend.app.track.tasks import submit_mining_job, get_mining_job
+from backend.app.track.upload import (
+    UPLOAD_FORMATS, UploadError, iter_csv_points, iter_ndjson_points, store_uploaded_trajectories
+)
+from backend.app.cache import data_version, read_through
+from backend.app.track.scope import parse_scope, scope_key
+
+logger = logging.getLogger(__name__)
 
 track_bp = Blueprint('track', __name__)
 
@@ -14,57 +23,152 @@ track_bp = Blueprint('track', __name__)
 def analyze_trajectory():
     user_id = get_jwt_identity()
 
-    # 从数据库中获取用户的所有轨迹数据
-    trajectory_records = Trajectory.query.filter_by(user_id=user_id).all()
-    if not trajectory_records:
-        return jsonify({"message": "No trajectory data found for this user"}), 404
-
-    # 整合每个用户的多条轨迹数据，形成嵌套结构
-    processed_data = []
-    for idx, trajectory in enumerate(trajectory_records, start=1):
-        trajectory_data = trajectory.trajectory_data.get('nodes', [])
-        if trajectory_data:
-            processed_data.append({
-                "trajectory_id": idx,
-                "nodes": trajectory_data
-            })
-
-    print("Processed data for algorithm:", processed_data)
-
     # 从请求中获取算法的参数
     data = request.get_json() or {}
     min_support = data.get('min_support', 6)
     min_length = data.get('min_length', 3)
-
-    # 根据轨迹数量选择合适的算法
+    incremental = data.get('incremental', current_app.config['INCREMENTAL_MINING'])
+    # Top-k 模式：只返回支持度最高的 top_k 条路径及其支持度
+    top_k = data.get('top_k')
+    if top_k is not None and (not isinstance(top_k, int) or top_k < 1):
+        return jsonify({"message": "top_k must be a positive integer"}), 400
+    # 流式模式：以 NDJSON 逐行返回热点路径，内存占用不随结果数量增长；top-k 结果数量有限，不使用流式输出
+    stream = data.get('stream', False) and not top_k
+    # 分析范围：时间窗口与空间范围，只分析与之有交集的轨迹；限定范围的分析不使用（也不更新）增量挖掘状态
     try:
-        if len(processed_data) == 0:
+        scope = parse_scope(data)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    if scope:
+        incremental = False
+
+    # 异步模式：提交挖掘任务并返回任务 ID，相同参数的进行中任务会被复用
+    if data.get('async'):
+        try:
+            job_id, attached = submit_mining_job(user_id, min_support, min_length, incremental, top_k, scope)
+        except Exception as e:
+            logger.exception("Error submitting the mining job", extra={"user_id": user_id})
+            return jsonify({"message": "Error submitting the mining job", "error": str(e)}), 503
+        return jsonify({"job_id": job_id, "attached": attached}), 202
+
+    if stream:
+        try:
+            hotspots, plan = _mine(user_id, min_support, min_length, incremental, stream=True, scope=scope)
+        except Exception as e:
+            logger.exception("Error running the algorithm", extra={"user_id": user_id})
+            return jsonify({"message": "Error running the algorithm", "error": str(e)}), 500
+        if hotspots is None:
+            return jsonify({"message": "No trajectory data found for this user"}), 404
+        if not hotspots and plan is None:
             return jsonify({"message": "No trajectory data to analyze"}), 400
+        return Response(stream_with_context(stream_hotspots(user_id, hotspots, plan)), mimetype='application/x-ndjson')
+
+    # 结果按用户轨迹数据版本缓存：轨迹不变时相同参数（与范围）的请求直接返回缓存结果
+    version = data_version(user_id, 'trajectory')
+    cache_key = None
+    if version is not None:
+        mode = 'inc' if incremental else 'full'
+        cache_key = f"analyze_{user_id}_t{version}_{min_support}_{min_length}_{top_k or 'all'}_{mode}_{scope_key(scope)}"
+    # 命中缓存时不再经过 store_hotspots，需要让对应的热点记录重新成为当前记录，拼车与 POI 推荐才与本次结果一致
+    response, status = read_through(
+        cache_key, lambda: _analyze(user_id, min_support, min_length, incremental, top_k, scope),
+        on_hit=lambda payload: restore_current(user_id, payload.get('hotspot_hash'))
+    )
+    return jsonify(response), status
+
+
+def _mine(user_id, min_support, min_length, incremental, stream=False, top_k=None, scope=None):
+    """
+    按增量或全量模式挖掘热点路径。
+
+    返回：
+    - (hotspots, plan): 用户没有轨迹数据时为 (None, None)，轨迹数据为空时为 ([], None)。
+    """
+    if incremental:
+        # 增量模式：只合并上次挖掘之后新增的轨迹
+        return run_incremental_mining(user_id, min_length, min_support, stream=stream, top_k=top_k)
+
+    # 从数据库中获取用户（范围内）的所有轨迹数据，并整合为嵌套结构
+    processed_data = load_processed_data(user_id, scope)
+    if processed_data is None:
+        return None, None
+
+    if len(processed_data) == 0:
+        return [], None
+
+    # 根据代价估计选择合适的算法
+    return run_mining(processed_data, min_length, min_support, stream=stream, top_k=top_k)
+
 
-        total_trajectories = len(processed_data)
-        print("Total trajectories in processed data:", total_trajectories)
+def _analyze(user_id, min_support, min_length, incremental, top_k, scope=None):
+    """
+    挖掘并保存热点路径。
 
-        if total_trajectories < 50:
-            hotspots = NDTTJ(processed_data, kmin=min_length, mmin=min_support)  # 使用 NDTTJ 算法
-        elif 50 <= total_trajectories <= 1000:
-            hotspots = NDTTT(processed_data, kmin=min_length, mmin=min_support)  # 使用 NDTTT 算法
-        else:
-            hotspots = TTHS(processed_data, kmin=min_length, mmin=min_support)  # 使用 TTHS 算法
+    返回：
+    - (response, status): 响应内容与 HTTP 状态码。
+    """
+    try:
+        # 轨迹与参数都未变化时直接返回已保存的结果，不读取轨迹数据也不运行挖掘算法
+        fingerprint = input_fingerprint(user_id, min_support, min_length, incremental, top_k, scope)
+        result = load_fingerprinted_result(user_id, fingerprint)
+        if result is not None:
+            return result, 200
 
+        hotspots, plan = _mine(user_id, min_support, min_length, incremental, top_k=top_k, scope=scope)
     except Exception as e:
-        print("Error running the algorithm:", str(e))
-        return jsonify({"message": "Error running the algorithm", "error": str(e)}), 500
+        logger.exception("Error running the algorithm", extra={"user_id": user_id})
+        return {"message": "Error running the algorithm", "error": str(e)}, 500
+
+    if hotspots is None:
+        return {"message": "No trajectory data found for this user"}, 404
+    if not hotspots and plan is None:
+        return {"message": "No trajectory data to analyze"}, 400
 
-    # 检查是否已存在相同的热点数据
+    # 结果已按支持度从高到低排序，支持度随热点数据一同保存
+    hotspots, supports = split_ranked(hotspots)
     hotspot_hash = HotspotTrajectory.generate_hash(hotspots)
-    existing_hotspot = HotspotTrajectory.query.filter_by(user_id=user_id, hotspot_hash=hotspot_hash).first()
+    response = {"plan": plan, "supports": supports, "hotspots": hotspots, "hotspot_hash": hotspot_hash}
+
+    meta = {"plan": plan, "supports": supports}
+    if not store_hotspots(user_id, hotspots, fingerprint, meta, hotspot_hash):
+        response["message"] = "Hotspot data already exists, no new data was added"
+    return response, 200
+
+
+@track_bp.route('/upload', methods=['POST'])
+@jwt_required()
+def upload_trajectories():
+    user_id = get_jwt_identity()
+
+    # 根据 Content-Type 选择解析方式：NDJSON 每行一个轨迹点，CSV 首行为表头
+    upload_format = UPLOAD_FORMATS.get(request.mimetype)
+    if upload_format is None:
+        return jsonify({"message": "Content-Type must be application/x-ndjson or text/csv"}), 415
 
-    if existing_hotspot:
-        return jsonify({"hotspots": hotspots, "message": "Hotspot data already exists, no new data was added"}), 200
+    # 请求体逐行解析，边解析边按时间间隔划分轨迹并分批写入
+    stream = request.stream
+    points = iter_csv_points(stream) if upload_format == 'csv' else iter_ndjson_points(stream)
+    try:
+        trajectory_count, point_count = store_uploaded_trajectories(user_id, points)
+    except UploadError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        logger.exception("Error uploading trajectories", extra={"user_id": user_id})
+        return jsonify({"message": "Error uploading trajectories", "error": str(e)}), 500
+
+    if trajectory_count == 0:
+        return jsonify({"message": "No trajectory points found in the upload"}), 400
+    return jsonify({"trajectories": trajectory_count, "points": point_count}), 201
+
+
+@track_bp.route('/analyze/<job_id>', methods=['GET'])
+@jwt_required()
+def get_analyze_job(job_id):
+    user_id = get_jwt_identity()
 
-    # 如果是新数据，插入 `HotspotTrajectory` 表
-    new_hotspot = HotspotTrajectory(user_id=user_id, hotspot_data=hotspots, hotspot_hash=hotspot_hash)
-    db.session.add(new_hotspot)
-    db.session.commit()
+    # 查询异步挖掘任务的进度（当前路径长度 k 与各阶路径表大小）或最终结果
+    status = get_mining_job(user_id, job_id)
+    if status is None:
+        return jsonify({"message": "Job not found"}), 404
 
-    return jsonify({"hotspots": hotspots}), 200
+    return jsonify(status), 200
@@ -0,0 +1,101 @@
+import hashlib
+import os
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from backend.app import db
+from backend.app.track.models import Trajectory
+from backend.scripts.columnar import ColumnarTrajectories, read_columnar, write_columnar
+
+# 从 Trajectory 表重建列式存储时每批读取的行数
+SYNC_BATCH_SIZE = 500
+
+trajectory_store_cli = AppGroup('trajectory-store', help='列式轨迹存储维护命令')
+
+
+def store_enabled():
+    return bool(current_app.config.get('TRAJECTORY_STORE_PATH'))
+
+
+def _store_path(user_id):
+    return os.path.join(current_app.config['TRAJECTORY_STORE_PATH'], f"user_{user_id}.trj")
+
+
+def _versions_digest(rows):
+    # 轨迹 ID 与更新时间的摘要，用于判断已写入存储的轨迹是否被修改或删除
+    digest = hashlib.md5()
+    for trajectory_id, updated_at in rows:
+        digest.update(f"{trajectory_id}:{updated_at}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _load_columnar(query, meta=None):
+    # 分批读取轨迹记录，只保留紧凑的坐标数组
+    records = query.order_by(Trajectory.id).yield_per(SYNC_BATCH_SIZE)
+    return ColumnarTrajectories.from_trajectories(
+        ({"trajectory_id": record.id, "nodes": record.trajectory_data.get('nodes', [])} for record in records), meta
+    )
+
+
+def sync_user_trajectories(user_id):
+    """
+    使用户的列式轨迹存储与 Trajectory 表保持一致，并返回内存映射的轨迹集合。
+
+    存储中记录了已写入轨迹的最大 ID（水位线）以及水位线以内轨迹 ID 与更新时间的摘要：
+    摘要不变时只把水位线之后新增的轨迹追加到存储中；有轨迹被修改或删除时从 Trajectory 表全量重建。
+
+    返回：
+    - trajectories: ColumnarTrajectories；用户没有任何轨迹记录时返回 None。
+    """
+    rows = db.session.query(Trajectory.id, Trajectory.updated_at).filter_by(
+        user_id=user_id
+    ).order_by(Trajectory.id).all()
+    if not rows:
+        return None
+
+    watermark = rows[-1][0]
+    meta = {"watermark": watermark, "digest": _versions_digest(rows)}
+    path = _store_path(user_id)
+    user_trajectories = Trajectory.query.filter_by(user_id=user_id)
+
+    store = read_columnar(path)
+    if store is not None:
+        stored_watermark = store.meta.get("watermark", 0)
+        folded_rows = [row for row in rows if row[0] <= stored_watermark]
+        if _versions_digest(folded_rows) == store.meta.get("digest"):
+            if stored_watermark == watermark:
+                return store
+            # 只读取并追加新增的轨迹
+            new_trajectories = _load_columnar(user_trajectories.filter(
+                Trajectory.id > stored_watermark, Trajectory.id <= watermark
+            ))
+            write_columnar(path, store.append(new_trajectories, meta))
+            return read_columnar(path)
+
+    # 没有存储或存储已过期：从 Trajectory 表全量重建
+    write_columnar(path, _load_columnar(user_trajectories.filter(Trajectory.id <= watermark), meta))
+    return read_columnar(path)
+
+
+@trajectory_store_cli.command('sync')
+@click.option('--user-id', type=int, default=None, help='只同步指定用户，默认同步所有用户')
+@click.option('--rebuild', is_flag=True, help='删除已有存储后全量重建')
+def sync_command(user_id, rebuild):
+    """从 Trajectory 表同步（或重建）列式轨迹存储"""
+    if not store_enabled():
+        raise click.ClickException("未设置 TRAJECTORY_STORE_PATH")
+
+    if user_id is None:
+        user_ids = [row[0] for row in db.session.query(Trajectory.user_id).distinct().order_by(Trajectory.user_id)]
+    else:
+        user_ids = [user_id]
+
+    total_points = 0
+    for current_user_id in user_ids:
+        path = _store_path(current_user_id)
+        if rebuild and os.path.exists(path):
+            os.remove(path)
+        trajectories = sync_user_trajectories(current_user_id)
+        if trajectories is not None:
+            total_points += len(trajectories.latitudes)
+    click.echo(f"列式轨迹存储同步完成，共 {len(user_ids)} 个用户、{total_points} 个轨迹点")
@@ -0,0 +1,151 @@
+import csv
+import json
+from backend.app import db
+from backend.app.cache import bump_data_version
+from backend.app.track.models import Trajectory
+
+# 相邻轨迹点的时间间隔超过该值（秒）时划分为新的轨迹，与 DataPreprocessing/csv_to_mysql.py 一致
+TRAJECTORY_GAP_SECONDS = 300
+
+# 每条多行 INSERT 语句写入的轨迹数
+UPLOAD_BATCH_SIZE = 500
+
+# 每次从请求体读取一行的最大字节数
+READ_LINE_LIMIT = 1 << 20
+
+REQUIRED_COLUMNS = ('latitude', 'longitude', 'timestamp')
+
+UPLOAD_FORMATS = {
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'text/csv': 'csv',
+}
+
+
+class UploadError(ValueError):
+    """上传内容无法解析或不满足要求，message 用于直接返回给客户端"""
+
+
+def _iter_lines(stream):
+    # 逐行读取请求体，不缓冲整个请求
+    for line_number, raw_line in enumerate(iter(lambda: stream.readline(READ_LINE_LIMIT), b''), start=1):
+        try:
+            line = raw_line.decode('utf-8')
+        except UnicodeDecodeError:
+            raise UploadError(f"Invalid UTF-8 on line {line_number}")
+        yield line
+
+
+def _parse_number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    value = str(value).strip()
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def _to_point(record, line_number):
+    """把一行记录转换为轨迹点，经纬度保留小数点后四位（与 csv_to_mysql.py 一致）"""
+    try:
+        return {
+            "latitude": round(float(_parse_number(record['latitude'])), 4),
+            "longitude": round(float(_parse_number(record['longitude'])), 4),
+            "timestamp": _parse_number(record['timestamp'])
+        }
+    except (KeyError, TypeError, ValueError):
+        raise UploadError(f"Invalid point on line {line_number}: latitude, longitude and timestamp are required")
+
+
+def iter_ndjson_points(stream):
+    """
+    逐行解析 NDJSON 请求体，每行是一个包含 latitude、longitude、timestamp 的 JSON 对象，空行忽略。
+
+    产出：
+    - point: 包含 'latitude'、'longitude'、'timestamp' 的字典。
+    """
+    for line_number, line in enumerate(_iter_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            raise UploadError(f"Invalid JSON on line {line_number}")
+        if not isinstance(record, dict):
+            raise UploadError(f"Invalid point on line {line_number}: expected a JSON object")
+        yield _to_point(record, line_number)
+
+
+def iter_csv_points(stream):
+    """
+    逐行解析 CSV 请求体，首行为表头，必须包含 latitude、longitude、timestamp 列，其余列忽略。
+
+    产出：
+    - point: 包含 'latitude'、'longitude'、'timestamp' 的字典。
+    """
+    reader = csv.DictReader(_iter_lines(stream))
+    if reader.fieldnames is None or not all(column in reader.fieldnames for column in REQUIRED_COLUMNS):
+        raise UploadError("CSV header must contain latitude, longitude and timestamp columns")
+    for record in reader:
+        yield _to_point(record, reader.line_num)
+
+
+def split_trajectories(points, gap=TRAJECTORY_GAP_SECONDS):
+    """
+    按时间间隔把有序的轨迹点划分为轨迹：相邻两点的时间差超过 gap 秒时开始新的轨迹。
+
+    轨迹点必须按时间戳非递减的顺序上传，流式解析无法在全部读完之前重新排序。
+
+    产出：
+    - trajectory_data: 包含 'trajectory_id'（本次上传内从 0 开始的序号）与 'nodes' 的字典。
+    """
+    trajectory_id = 0
+    nodes = []
+    for point in points:
+        if nodes:
+            delta = point['timestamp'] - nodes[-1]['timestamp']
+            if delta < 0:
+                raise UploadError("Points must be ordered by timestamp")
+            if delta > gap:
+                yield {"trajectory_id": trajectory_id, "nodes": nodes}
+                trajectory_id += 1
+                nodes = []
+        nodes.append(point)
+    if nodes:
+        yield {"trajectory_id": trajectory_id, "nodes": nodes}
+
+
+def store_uploaded_trajectories(user_id, points, batch_size=UPLOAD_BATCH_SIZE):
+    """
+    划分轨迹并以多行 INSERT 分批写入 Trajectory 表，所有批次在同一个事务中提交；
+    解析或写入失败时整体回滚。写入成功后递增用户的轨迹版本号，使依赖轨迹的缓存结果失效。
+
+    参数：
+    - points: 逐个产出轨迹点的可迭代对象（iter_ndjson_points / iter_csv_points）。
+
+    返回：
+    - (trajectory_count, point_count): 写入的轨迹数与轨迹点数。
+    """
+    trajectory_count = 0
+    point_count = 0
+    batch = []
+    try:
+        for trajectory_data in split_trajectories(points):
+            # Core 批量插入不经过 ORM 事件，时间范围与包围盒列在这里计算
+            batch.append(dict(Trajectory.extent(trajectory_data), user_id=user_id, trajectory_data=trajectory_data))
+            trajectory_count += 1
+            point_count += len(trajectory_data['nodes'])
+            if len(batch) >= batch_size:
+                db.session.execute(Trajectory.__table__.insert().values(batch))
+                batch = []
+        if batch:
+            db.session.execute(Trajectory.__table__.insert().values(batch))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if trajectory_count:
+        bump_data_version(user_id, 'trajectory')
+    return trajectory_count, point_count
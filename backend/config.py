@@ -16,11 +16,46 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)  # 设置 Access Token 的过期时间为 1 小时
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)  # 设置 Refresh Token 的过期时间为 30 天
 
+    # 密码哈希配置：werkzeug 格式的算法与工作因子（如 pbkdf2:sha256:600000、scrypt:32768:8:1），
+    # 已保存的哈希与此不一致时在下次登录成功后重新计算
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))  # 哈希线程池大小
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', 16))  # 线程池已满时允许排队的任务数
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))  # 等待哈希结果的超时时间（秒）
+
     # Celery 配置
     CELERY_BROKER_URL = 'redis://localhost:6379/0'
     CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 
+    # 热点挖掘配置：默认对 NDTTJ / NDTTT 启用增量挖掘
+    INCREMENTAL_MINING = os.getenv('INCREMENTAL_MINING', 'true').lower() == 'true'
+    # TTHS 可选的路径长度与结果数量上限，未设置时不限制
+    TTHS_MAX_LENGTH = int(os.getenv('TTHS_MAX_LENGTH')) if os.getenv('TTHS_MAX_LENGTH') else None
+    TTHS_MAX_RESULTS = int(os.getenv('TTHS_MAX_RESULTS')) if os.getenv('TTHS_MAX_RESULTS') else None
+    # 挖掘算法代价模型系数文件（JSON），可用 `python -m backend.scripts.benchmark --calibrate` 生成，未设置时使用默认系数
+    MINING_COST_MODEL = os.getenv('MINING_COST_MODEL')
+    # NDTTT 每一阶路径扩展的并行进程数，1 表示顺序执行
+    MINING_WORKERS = int(os.getenv('MINING_WORKERS', 1))
+    # 列式轨迹存储目录，设置后全量挖掘从内存映射的列式文件读取轨迹，未设置时直接解析 Trajectory 表中的 JSON
+    TRAJECTORY_STORE_PATH = os.getenv('TRAJECTORY_STORE_PATH')
+
+    # 拼车匹配预计算配置：每个用户保存的匹配数、批量任务的并行进程数，
+    # 以及 Celery beat 调度批量任务的间隔（秒），未设置时只能通过 `flask carpool precompute` 手动运行
+    CARPOOL_TOP_N = int(os.getenv('CARPOOL_TOP_N')) if os.getenv('CARPOOL_TOP_N') else None
+    CARPOOL_BATCH_WORKERS = int(os.getenv('CARPOOL_BATCH_WORKERS', 1))
+    CARPOOL_BATCH_INTERVAL = int(os.getenv('CARPOOL_BATCH_INTERVAL')) if os.getenv('CARPOOL_BATCH_INTERVAL') else None
+
     # Redis 配置
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))  # 连接池最大连接数
+    REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', 5))  # 单次 Redis 调用的超时时间（秒）
+
+    # 读穿缓存配置：结果有效期，以及同一键并发未命中时计算锁的超时时间（秒）
+    CACHE_TTL = int(os.getenv('CACHE_TTL', 3600))
+    CACHE_LOCK_TIMEOUT = int(os.getenv('CACHE_LOCK_TIMEOUT', 60))
+
+    # 日志配置：级别（DEBUG / INFO / WARNING / ERROR）与格式（json 每行一个 JSON 对象，text 为普通文本）
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
 
     DEBUG = os.getenv('FLASK_DEBUG', False)
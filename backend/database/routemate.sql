@@ -20,6 +20,16 @@ CREATE TABLE IF NOT EXISTS Trajectory
     user_id         INT  NOT NULL,
     trajectory_data JSON NOT NULL,
     created_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP, -- 参与挖掘输入指纹
+    start_time      BIGINT,           -- 轨迹时间范围（UNIX 时间戳）
+    end_time        BIGINT,
+    min_latitude    DOUBLE,           -- 轨迹包围盒
+    max_latitude    DOUBLE,
+    min_longitude   DOUBLE,
+    max_longitude   DOUBLE,
+    INDEX ix_Trajectory_created_at (created_at),
+    INDEX ix_trajectory_user_time (user_id, start_time, end_time),
+    INDEX ix_trajectory_user_bbox (user_id, min_latitude, max_latitude, min_longitude, max_longitude),
     FOREIGN KEY (user_id) REFERENCES User (id) ON DELETE CASCADE,
     CHECK (
         JSON_VALID(trajectory_data) AND
@@ -37,7 +47,10 @@ CREATE TABLE IF NOT EXISTS HotspotTrajectory
     user_id      INT  NOT NULL,
     hotspot_data LONGTEXT NOT NULL, -- 修改数据类型为LONGTEXT
     hotspot_hash VARCHAR(255), -- 添加热点轨迹哈希字段
+    input_fingerprint VARCHAR(32), -- 产生该热点数据的挖掘输入指纹
+    analysis_meta     JSON,        -- 规划结果（plan）与支持度（supports）
     created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_HotspotTrajectory_input_fingerprint (input_fingerprint),
     FOREIGN KEY (user_id) REFERENCES User (id) ON DELETE CASCADE,
     CHECK (
         JSON_VALID(hotspot_data) AND
@@ -49,18 +62,67 @@ CREATE TABLE IF NOT EXISTS HotspotTrajectory
 -- 为 HotspotTrajectory 表添加唯一索引，确保每个用户的热点数据唯一
 CREATE UNIQUE INDEX idx_user_hotspot ON HotspotTrajectory (user_id, hotspot_hash);
 
+-- 增量挖掘状态表 (MiningState)
+CREATE TABLE IF NOT EXISTS MiningState
+(
+    id               INT AUTO_INCREMENT PRIMARY KEY,
+    user_id          INT         NOT NULL,
+    algorithm        VARCHAR(16) NOT NULL,
+    min_support      INT         NOT NULL,
+    watermark        INT         NOT NULL, -- 已合并轨迹的最大 Trajectory.id
+    trajectory_count INT         NOT NULL, -- 水位线以内已合并的轨迹数
+    state_data       LONGBLOB    NOT NULL, -- zlib 压缩的 pickle 状态
+    updated_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_mining_state (user_id, algorithm, min_support),
+    FOREIGN KEY (user_id) REFERENCES User (id) ON DELETE CASCADE
+);
+
+-- 热点轨迹空间倒排索引表 (HotspotCell)
+CREATE TABLE IF NOT EXISTS HotspotCell
+(
+    cell    VARCHAR(32) NOT NULL, -- 网格单元编号，格式为 "行:列"
+    user_id INT         NOT NULL,
+    PRIMARY KEY (cell, user_id),
+    INDEX idx_hotspot_cell_user (user_id),
+    FOREIGN KEY (user_id) REFERENCES User (id) ON DELETE CASCADE
+);
+
 -- 推荐结果表 (Recommendation)
 CREATE TABLE IF NOT EXISTS Recommendation
 (
     id                  INT AUTO_INCREMENT PRIMARY KEY,
     user_id             INT  NOT NULL,
-    recommendation_data TEXT NOT NULL,
+    recommendation_data TEXT NOT NULL,        -- 按相似度排序的前 N 个拼车匹配（JSON）
+    hotspot_hash        VARCHAR(32),          -- 计算匹配时所用热点记录的哈希
     created_at          TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_recommendation_user (user_id),
     FOREIGN KEY (user_id) REFERENCES User (id) ON DELETE CASCADE
 );
 
+-- ---------- 已有数据库升级 ----------
+-- CREATE TABLE IF NOT EXISTS 不会修改已存在的表，按旧版脚本建立的数据库需手动执行以下语句（每条只执行一次）：
+-- ALTER TABLE Trajectory ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP;
+-- ALTER TABLE HotspotTrajectory ADD COLUMN input_fingerprint VARCHAR(32), ADD COLUMN analysis_meta JSON,
+--     ADD INDEX ix_HotspotTrajectory_input_fingerprint (input_fingerprint);
+-- ALTER TABLE Trajectory ADD COLUMN start_time BIGINT, ADD COLUMN end_time BIGINT,
+--     ADD COLUMN min_latitude DOUBLE, ADD COLUMN max_latitude DOUBLE,
+--     ADD COLUMN min_longitude DOUBLE, ADD COLUMN max_longitude DOUBLE,
+--     ADD INDEX ix_Trajectory_created_at (created_at),
+--     ADD INDEX ix_trajectory_user_time (user_id, start_time, end_time),
+--     ADD INDEX ix_trajectory_user_bbox (user_id, min_latitude, max_latitude, min_longitude, max_longitude);
+-- 新增范围列后执行 `flask trajectory backfill-extent` 为已有轨迹回填时间范围与包围盒
+
 -- 删除 Trajectory 表中的所有数据
 DELETE FROM Trajectory;
 
 -- 删除 HotspotTrajectory 表中的所有数据
 DELETE FROM HotspotTrajectory;
+
+-- 删除 MiningState 表中的所有数据
+DELETE FROM MiningState;
+
+-- 删除 HotspotCell 表中的所有数据
+DELETE FROM HotspotCell;
+
+-- 删除 Recommendation 表中的所有数据
+DELETE FROM Recommendation;
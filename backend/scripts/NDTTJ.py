@@ -1,7 +1,11 @@
 import collections
+import time
+from backend.scripts.bitmap import BitmapIndex, popcount
+from backend.scripts.encoding import encode_trajectories
+from backend.scripts.topk import TopK
 
 
-def NDTTJ(trajectories, kmin, mmin):
+def NDTTJ(trajectories, kmin, mmin, progress=None, observe=None):
     """
     NDTTJ（N-Degree Trajectory Table Join）算法实现，用于从轨迹数据中挖掘热点路径。
 
@@ -9,69 +13,153 @@ def NDTTJ(trajectories, kmin, mmin):
     - trajectories: 轨迹列表，每个轨迹是一个包含 'nodes' 和 'trajectory_id' 的字典。
     - kmin: 最小路径长度（节点数量）。
     - mmin: 最小频繁度（路径出现的最小轨迹数）。
+    - progress: 可选的进度回调，每完成一阶路径表时以 (当前路径长度 k, 路径表大小) 调用。
+    - observe: 可选的统计回调，以 (指标名, 数值, k) 调用，上报每一阶的路径表大小 path_table_size、
+      连接候选数 join_candidates、剪枝的表项数 pruned_entries 与计算耗时 level_seconds。
 
     返回：
     - hotspot_paths: 热点路径列表，每个路径是轨迹点的列表。
     """
+    return list(iter_NDTTJ(trajectories, kmin, mmin, progress, observe))
+
+
+def iter_NDTTJ(trajectories, kmin, mmin, progress=None, observe=None, with_support=False):
+    """
+    NDTTJ 的生成器版本：每完成一阶路径表，就逐条产出其中满足 kmin 的路径，
+    只保留当前一阶的路径表，内存占用不随结果总量增长；产出顺序与 NDTTJ 的返回值一致。
+
+    参数：
+    - trajectories: 轨迹列表，每个轨迹是一个包含 'nodes' 和 'trajectory_id' 的字典。
+    - kmin: 最小路径长度（节点数量）。
+    - mmin: 最小频繁度（路径出现的最小轨迹数）。
+    - progress: 可选的进度回调，每完成一阶路径表时以 (当前路径长度 k, 路径表大小) 调用。
+    - observe: 可选的统计回调，同 NDTTJ。
+    - with_support: 为 True 时产出 (路径, 支持轨迹数)。
+
+    产出：
+    - hotspot_path: 热点路径，即轨迹点的列表。
+    """
 
     if not trajectories:
         raise ValueError("轨迹数据为空或无效")
 
-    # 步骤 1：初始化 1 阶路径表（长度为 2 的路径）
-    path_table = collections.defaultdict(set)
-    for trajectory in trajectories:
-        trajectory_id = trajectory['trajectory_id']
-        nodes = trajectory['nodes']
-        for i in range(len(nodes) - 1):
-            # 只使用经纬度作为比较键，忽略时间戳
-            point1 = (nodes[i]['latitude'], nodes[i]['longitude'])
-            point2 = (nodes[i + 1]['latitude'], nodes[i + 1]['longitude'])
-            path = (point1, point2)
-            path_table[path].add(trajectory_id)
+    # 轨迹点编码为整数 ID，路径为点 ID 元组
+    encoder, encoded = encode_trajectories(trajectories)
+
+    # 每一阶的路径在连接出下一阶之前产出（解码为所需的输出格式）
+    for k, pruned_table in _iter_levels(encoded, mmin, progress, observe=observe):
+        if k >= kmin:
+            for path, traj_bits in pruned_table.items():
+                yield (encoder.decode_path(path), popcount(traj_bits)) if with_support else encoder.decode_path(path)
+
+
+def top_k_NDTTJ(trajectories, kmin, mmin, top_k, progress=None, observe=None):
+    """
+    Top-k 版 NDTTJ：返回支持度最高的 top_k 条热点路径（支持度相同时较长者优先）。
+
+    已收集满 top_k 条路径后，连接时以第 top_k 名的支持度作为阈值，支持度更低的路径不再参与连接。
+
+    参数：
+    - top_k: 返回的路径数量上限，其余参数同 NDTTJ。
+
+    返回：
+    - ranked_paths: 按排名排序的列表，每项为包含 'path'（轨迹点列表）和 'support'（支持轨迹数）的字典。
+    """
+
+    if not trajectories:
+        raise ValueError("轨迹数据为空或无效")
+
+    encoder, encoded = encode_trajectories(trajectories)
+    best = TopK(top_k, kmin, mmin)
+    for k, pruned_table in _iter_levels(encoded, mmin, progress, threshold=best.threshold, observe=observe):
+        if k >= kmin:
+            for path, traj_bits in pruned_table.items():
+                best.offer(path, popcount(traj_bits))
+
+    return [{'path': encoder.decode_path(path), 'support': support} for path, support in best.ranked()]
+
+
+def _iter_levels(encoded, mmin, progress=None, threshold=None, observe=None):
+    """
+    逐阶产出 (k, k 阶频繁路径表)；threshold 为可选的回调，返回连接下一阶时使用的支持度阈值（默认 mmin）。
+    """
+    started = time.perf_counter()
+    # 步骤 1：初始化 1 阶路径表（长度为 2 的路径），支持集为轨迹位图
+    bitmap_index = BitmapIndex()
+    path_table = collections.defaultdict(int)
+    for trajectory_id, points in encoded:
+        trajectory_bit = bitmap_index.bit(trajectory_id)
+        for path in zip(points, points[1:]):
+            path_table[path] |= trajectory_bit
 
     # 初始剪枝：移除频繁度小于 mmin 的路径
     pruned_table = {
-        path: traj_ids
-        for path, traj_ids in path_table.items()
-        if len(traj_ids) >= mmin
+        path: traj_bits
+        for path, traj_bits in path_table.items()
+        if popcount(traj_bits) >= mmin
     }
 
     k = 2  # 当前路径长度
-    result_paths = dict(pruned_table)
+    if observe:
+        observe('join_candidates', len(path_table), k)
+        _observe_level(observe, k, len(path_table), pruned_table, started)
+    if progress:
+        progress(k, len(pruned_table))
 
     # 步骤 2：迭代生成更长的路径
     while pruned_table:
-        next_path_table = collections.defaultdict(set)
-        paths = list(pruned_table.keys())
-        for path1 in paths:
-            for path2 in paths:
-                # 检查路径是否可以连接
-                if path1[1:] == path2[:-1]:
-                    new_path = path1 + (path2[-1],)
-                    combined_ids = pruned_table[path1].intersection(pruned_table[path2])
-                    if len(combined_ids) >= mmin:
-                        next_path_table[new_path] = combined_ids
+        yield k, pruned_table
+
+        started = time.perf_counter()
+        next_path_table = join_path_table(pruned_table, threshold() if threshold else mmin, observe, k + 1)
 
         pruned_table = next_path_table
-        result_paths.update(pruned_table)
         k += 1  # 增加路径长度
+        if observe:
+            _observe_level(observe, k, None, pruned_table, started)
+        if progress:
+            progress(k, len(pruned_table))
 
-    # 收集满足 kmin 的路径
-    final_paths = {
-        path: traj_ids
-        for path, traj_ids in result_paths.items()
-        if len(path) >= kmin
-    }
 
-    # 转换为所需的输出格式
-    hotspot_paths = []
-    for path in final_paths.keys():
-        hotspot_path = []
-        for item in path:
-            hotspot_path.append({
-                'latitude': item[0],
-                'longitude': item[1]
-            })
-        hotspot_paths.append(hotspot_path)
-
-    return hotspot_paths
+def _observe_level(observe, k, candidate_count, pruned_table, started):
+    observe('path_table_size', len(pruned_table), k)
+    if candidate_count is not None:
+        observe('pruned_entries', candidate_count - len(pruned_table), k)
+    observe('level_seconds', time.perf_counter() - started, k)
+
+
+def join_path_table(pruned_table, mmin, observe=None, k=None):
+    """
+    连接 k 阶频繁路径表，生成 k+1 阶频繁路径表。
+
+    路径表按 (k-1) 阶前缀建立哈希索引，每条路径只与前缀等于其 (k-1) 阶后缀的路径连接，
+    避免两两比较；支持度已不足 mmin 的路径对直接跳过，不做交集。
+
+    参数：
+    - pruned_table: k 阶频繁路径表，路径 -> 轨迹位图。
+    - mmin: 最小频繁度。
+    - observe, k: 可选的统计回调与所生成路径表的阶数，上报连接候选数与未达到 mmin 而剪掉的候选数。
+
+    返回：
+    - next_path_table: k+1 阶频繁路径表。
+    """
+    by_prefix = collections.defaultdict(list)
+    for path, traj_bits in pruned_table.items():
+        if popcount(traj_bits) >= mmin:
+            by_prefix[path[:-1]].append(path)
+
+    next_path_table = {}
+    candidate_count = 0
+    for path1, bits1 in pruned_table.items():
+        if popcount(bits1) < mmin:
+            continue
+        candidates = by_prefix.get(path1[1:], ())
+        candidate_count += len(candidates)
+        for path2 in candidates:
+            combined_bits = bits1 & pruned_table[path2]
+            if popcount(combined_bits) >= mmin:
+                next_path_table[path1 + (path2[-1],)] = combined_bits
+    if observe:
+        observe('join_candidates', candidate_count, k)
+        observe('pruned_entries', candidate_count - len(next_path_table), k)
+    return next_path_table
@@ -1,7 +1,16 @@
 import collections
+import multiprocessing
+import time
+from array import array
+from backend.scripts.bitmap import BitmapIndex, popcount
+from backend.scripts.encoding import encode_trajectories
+from backend.scripts.topk import TopK
 
+# 节点总数低于该值时并行的进程开销大于收益，直接顺序执行
+PARALLEL_MIN_NODES = 50000
 
-def NDTTT(trajectories, kmin, mmin):
+
+def NDTTT(trajectories, kmin, mmin, progress=None, workers=None, observe=None):
     """
     NDTTT（N-Degree Trajectory Table Traversal）算法实现，用于从轨迹数据中挖掘热点路径。
 
@@ -9,73 +18,216 @@ def NDTTT(trajectories, kmin, mmin):
     - trajectories: 轨迹列表，每个轨迹是一个包含 'nodes' 和 'trajectory_id' 的字典。
     - kmin: 最小路径长度。
     - mmin: 最小频繁度。
+    - progress: 可选的进度回调，每完成一阶路径表时以 (当前路径长度 k, 路径表大小) 调用。
+    - workers: 可选的并行进程数，大于 1 且数据量足够大时，每一阶的路径扩展按轨迹分片由进程池并行计数，
+      结果（包括顺序）与顺序执行完全一致。
+    - observe: 可选的统计回调，以 (指标名, 数值, k) 调用，上报每一阶的路径表大小 path_table_size、
+      扩展得到的候选路径数 join_candidates、剪枝的表项数 pruned_entries 与计算耗时 level_seconds。
 
     返回：
     - hotspot_paths: 热点路径列表。
     """
+    return list(iter_NDTTT(trajectories, kmin, mmin, progress, workers, observe))
+
+
+def iter_NDTTT(trajectories, kmin, mmin, progress=None, workers=None, observe=None, with_support=False):
+    """
+    NDTTT 的生成器版本：每完成一阶路径表，就逐条产出其中满足 kmin 的路径，
+    只保留当前一阶的路径表，内存占用不随结果总量增长；产出顺序与 NDTTT 的返回值一致。
+
+    参数同 NDTTT；with_support 为 True 时产出 (路径, 支持轨迹数)。
+
+    产出：
+    - hotspot_path: 热点路径，即轨迹点的列表。
+    """
+
+    if not trajectories:
+        raise ValueError("轨迹数据为空或无效")
+
+    # 轨迹点只编码一次，之后每一阶都直接在整数数组上滑动窗口
+    encoder, encoded = encode_trajectories(trajectories)
+
+    # 当前一阶的路径已经确定，在扩展下一阶之前产出（解码为所需的输出格式）
+    for k, pruned_table in _iter_levels(encoded, mmin, progress, workers, observe=observe):
+        if k >= kmin:
+            for path, traj_bits in pruned_table.items():
+                yield (encoder.decode_path(path), popcount(traj_bits)) if with_support else encoder.decode_path(path)
+
+
+def top_k_NDTTT(trajectories, kmin, mmin, top_k, progress=None, workers=None, observe=None):
+    """
+    Top-k 版 NDTTT：返回支持度最高的 top_k 条热点路径（支持度相同时较长者优先）。
+
+    已收集满 top_k 条路径后，以第 top_k 名的支持度作为阈值，支持度更低的路径不再扩展。
+
+    参数：
+    - top_k: 返回的路径数量上限，其余参数同 NDTTT。
+
+    返回：
+    - ranked_paths: 按排名排序的列表，每项为包含 'path'（轨迹点列表）和 'support'（支持轨迹数）的字典。
+    """
 
     if not trajectories:
         raise ValueError("轨迹数据为空或无效")
 
-    # 步骤 1：初始化 1 阶路径表（单个点的路径）
-    path_table = collections.defaultdict(set)
-    for trajectory in trajectories:
-        trajectory_id = trajectory['trajectory_id']
-        nodes = trajectory['nodes']
-        for node in nodes:
-            point_tuple = (node['latitude'], node['longitude'])
-            path = (point_tuple,)
-            path_table[path].add(trajectory_id)
+    encoder, encoded = encode_trajectories(trajectories)
+    best = TopK(top_k, kmin, mmin)
+    for k, pruned_table in _iter_levels(encoded, mmin, progress, workers, threshold=best.threshold, observe=observe):
+        if k >= kmin:
+            for path, traj_bits in pruned_table.items():
+                best.offer(path, popcount(traj_bits))
+
+    return [{'path': encoder.decode_path(path), 'support': support} for path, support in best.ranked()]
+
+
+def _iter_levels(encoded, mmin, progress=None, workers=None, threshold=None, observe=None):
+    """
+    逐阶产出 (k, k 阶频繁路径表)；threshold 为可选的回调，返回扩展下一阶时使用的支持度阈值（默认 mmin）。
+    """
+    started = time.perf_counter()
+    # 步骤 1：初始化 1 阶路径表（单个点的路径），支持集为轨迹位图
+    bitmap_index = BitmapIndex()
+    trajectory_bits = [bitmap_index.bit(trajectory_id) for trajectory_id, _ in encoded]
+    path_table = collections.defaultdict(int)
+    for (_, points), trajectory_bit in zip(encoded, trajectory_bits):
+        for point in points:
+            path_table[(point,)] |= trajectory_bit
 
     # 初始剪枝：移除频繁度小于 mmin 的路径
     pruned_table = {
-        path: traj_ids
-        for path, traj_ids in path_table.items()
-        if len(traj_ids) >= mmin
+        path: traj_bits
+        for path, traj_bits in path_table.items()
+        if popcount(traj_bits) >= mmin
     }
 
     k = 1  # 当前路径长度
-    result_paths = dict(pruned_table)
+    if observe:
+        _observe_level(observe, k, len(path_table), pruned_table, started)
+    if progress:
+        progress(k, len(pruned_table))
 
     # 步骤 2：遍历并生成更长的路径
-    while pruned_table:
-        next_path_table = collections.defaultdict(set)
-        for trajectory in trajectories:
-            trajectory_id = trajectory['trajectory_id']
-            nodes = trajectory['nodes']
-            trajectory_points = [(node['latitude'], node['longitude']) for node in nodes]
-            trajectory_length = len(trajectory_points)
-            for i in range(trajectory_length - k):
-                current_path = tuple(trajectory_points[i:i + k])
-                if current_path in pruned_table and trajectory_id in pruned_table[current_path]:
-                    extended_path = current_path + (trajectory_points[i + k],)
-                    next_path_table[extended_path].add(trajectory_id)
-
-        # 剪枝：移除频繁度小于 mmin 的路径
-        pruned_table = {
-            path: traj_ids
-            for path, traj_ids in next_path_table.items()
-            if len(traj_ids) >= mmin
-        }
-        result_paths.update(pruned_table)
-        k += 1  # 增加路径长度
-
-    # 收集满足 kmin 的路径
-    final_paths = {
-        path: traj_ids
-        for path, traj_ids in result_paths.items()
-        if len(path) >= kmin
-    }
+    pool = None
+    if _use_parallel(workers, encoded):
+        shards, flat_points, offsets, positions = _shard_trajectories(encoded, trajectory_bits, workers)
+        # 轨迹数据只在创建进程池时传给各进程一次，之后每一阶只发送分片范围与上一阶的频繁路径
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(flat_points, offsets, positions))
+
+    try:
+        while pruned_table:
+            yield k, pruned_table
+            started = time.perf_counter()
+
+            # 阈值提升后，支持度不足的路径的所有扩展也必然不足，不再扩展
+            minimum = threshold() if threshold else mmin
+            if minimum > mmin:
+                pruned_table = {
+                    path: traj_bits
+                    for path, traj_bits in pruned_table.items()
+                    if popcount(traj_bits) >= minimum
+                }
+
+            if pool is None:
+                next_path_table = collections.defaultdict(int)
+                for (_, points), trajectory_bit in zip(encoded, trajectory_bits):
+                    for i in range(len(points) - k):
+                        current_path = tuple(points[i:i + k])
+                        if pruned_table.get(current_path, 0) & trajectory_bit:
+                            extended_path = current_path + (points[i + k],)
+                            next_path_table[extended_path] |= trajectory_bit
+            else:
+                # 各分片的局部路径表按分片顺序合并，插入顺序与顺序执行一致
+                frequent_paths = frozenset(pruned_table)
+                next_path_table = collections.defaultdict(int)
+                partial_tables = pool.imap(_extend_shard, [(start, stop, k, frequent_paths) for start, stop in shards])
+                for partial_table in partial_tables:
+                    for path, traj_bits in partial_table.items():
+                        next_path_table[path] |= traj_bits
+
+            # 剪枝：移除频繁度小于 mmin（或提升后的阈值）的路径
+            pruned_table = {
+                path: traj_bits
+                for path, traj_bits in next_path_table.items()
+                if popcount(traj_bits) >= minimum
+            }
+            k += 1  # 增加路径长度
+            if observe:
+                _observe_level(observe, k, len(next_path_table), pruned_table, started)
+            if progress:
+                progress(k, len(pruned_table))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def _observe_level(observe, k, candidate_count, pruned_table, started):
+    observe('join_candidates', candidate_count, k)
+    observe('path_table_size', len(pruned_table), k)
+    observe('pruned_entries', candidate_count - len(pruned_table), k)
+    observe('level_seconds', time.perf_counter() - started, k)
+
+
+def _use_parallel(workers, encoded):
+    if not workers or workers <= 1 or len(encoded) < 2:
+        return False
+    if sum(len(points) for _, points in encoded) < PARALLEL_MIN_NODES:
+        return False
+    # 守护进程（如 Celery prefork 工作进程）不能再创建子进程，回退为顺序执行
+    return not multiprocessing.current_process().daemon
+
+
+def _shard_trajectories(encoded, trajectory_bits, workers):
+    """
+    把轨迹拼接为连续的整数数组，并按节点数大致均分为 workers 个连续分片。
+
+    返回：
+    - (shards, flat_points, offsets, positions): 分片的轨迹下标范围列表、拼接后的轨迹点、
+      每条轨迹在拼接数组中的起始偏移（末尾附加总长度），以及每条轨迹在位图中的位置。
+    """
+    flat_points = array('i')
+    offsets = array('q', [0])
+    for _, points in encoded:
+        flat_points.extend(points)
+        offsets.append(len(flat_points))
+    positions = array('q', [trajectory_bit.bit_length() - 1 for trajectory_bit in trajectory_bits])
+
+    shards = []
+    start = 0
+    shard_nodes = len(flat_points) / workers
+    for index in range(1, len(encoded) + 1):
+        if index == len(encoded) or offsets[index] >= shard_nodes * (len(shards) + 1):
+            shards.append((start, index))
+            start = index
+    return shards, flat_points, offsets, positions
+
+
+_shared_trajectories = None
+
+
+def _init_worker(flat_points, offsets, positions):
+    global _shared_trajectories
+    _shared_trajectories = (flat_points, offsets, positions)
 
-    # 转换为所需的输出格式
-    hotspot_paths = []
-    for path in final_paths.keys():
-        hotspot_path = []
-        for item in path:
-            hotspot_path.append({
-                'latitude': item[0],
-                'longitude': item[1]
-            })
-        hotspot_paths.append(hotspot_path)
-
-    return hotspot_paths
+
+def _extend_shard(task):
+    """
+    在进程池中对一个分片内的轨迹做一阶路径扩展。
+
+    轨迹窗口本身就出现在该轨迹中，因此窗口属于上一阶频繁路径时，该轨迹必然在其支持集内，
+    只需判断路径是否频繁即可。
+
+    返回：
+    - partial_table: 该分片的局部路径表 {扩展后的路径: 轨迹位图}。
+    """
+    start, stop, k, frequent_paths = task
+    flat_points, offsets, positions = _shared_trajectories
+    partial_table = {}
+    for index in range(start, stop):
+        trajectory_bit = 1 << positions[index]
+        for i in range(offsets[index], offsets[index + 1] - k):
+            current_path = tuple(flat_points[i:i + k])
+            if current_path in frequent_paths:
+                extended_path = current_path + (flat_points[i + k],)
+                partial_table[extended_path] = partial_table.get(extended_path, 0) | trajectory_bit
+    return partial_table
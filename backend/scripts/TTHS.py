@@ -1,86 +1,256 @@
 import collections
-import sys
+from backend.scripts.bitmap import BitmapIndex, popcount
+from backend.scripts.encoding import encode_trajectories
+from backend.scripts.topk import TopK
 
-# 增加递归深度限制
-sys.setrecursionlimit(2000)
 
-
-def TTHS(trajectories, kmin, mmin):
+def TTHS(trajectories, kmin, mmin, progress=None, max_length=None, max_results=None, observe=None):
     """
     TTHS（Trajectory Traversal Hotspots Search）算法实现，用于在轨迹图中搜索热点路径。
 
+    热点路径为频繁边（转移频率不低于 mmin）构成的子图中、节点不重复的简单路径。
+    所有起点共享同一份频繁边邻接表和可达深度上界，每条路径只会被枚举一次，
+    无需为每个起点维护已访问路径集合；图中存在环时也能正常结束。
+
     参数：
     - trajectories: 轨迹列表，每个轨迹是一个包含 'nodes' 和 'trajectory_id' 的字典。
     - kmin: 最小路径长度。
     - mmin: 最小频繁度。
+    - progress: 可选的进度回调，每完成一个起点的搜索时以 (已找到的最长路径长度, 结果集大小) 调用。
+    - max_length: 可选的路径长度上限。
+    - max_results: 可选的结果数量上限，达到后停止搜索。
+    - observe: 可选的统计回调，以 (指标名, 数值, None) 调用，上报轨迹图的节点数 graph_nodes、
+      边数 graph_edges 与频繁边数 frequent_edges。
 
     返回：
     - hotspot_paths: 热点路径列表。
     """
+    return list(iter_TTHS(trajectories, kmin, mmin, progress, max_length, max_results, observe))
+
+
+def iter_TTHS(trajectories, kmin, mmin, progress=None, max_length=None, max_results=None, observe=None,
+              with_support=False):
+    """
+    TTHS 的生成器版本：搜索到一条路径就立即产出，产出顺序与 TTHS 的返回值一致。
+
+    参数同 TTHS；with_support 为 True 时产出 (路径, 支持度)，支持度的含义同 top_k_TTHS。
+
+    产出：
+    - hotspot_path: 热点路径，即轨迹点的列表。
+    """
+
+    if not trajectories:
+        raise ValueError("轨迹数据为空或无效")
+
+    # 轨迹点编码为整数 ID 后构建轨迹图
+    encoder, encoded = encode_trajectories(trajectories)
+    graph = build_graph(encoded)
+
+    # 解码为所需的输出格式
+    for path, support in iter_graph_paths(graph, kmin, mmin, progress, max_length, max_results, observe=observe):
+        yield (encoder.decode_path(path), support) if with_support else encoder.decode_path(path)
+
+
+def top_k_TTHS(trajectories, kmin, mmin, top_k, progress=None, max_length=None, observe=None):
+    """
+    Top-k 版 TTHS：返回支持度最高的 top_k 条热点路径（支持度相同时较长者优先）。
+
+    TTHS 的路径来自轨迹图而非单条轨迹，路径的支持度取其各条边转移频率的最小值；
+    已收集满 top_k 条路径后，以第 top_k 名的支持度作为阈值，转移频率更低的边不再展开。
+    单点路径没有支持度，不参与排名。
+
+    参数：
+    - top_k: 返回的路径数量上限，其余参数同 TTHS。
+
+    返回：
+    - ranked_paths: 按排名排序的列表，每项为包含 'path'（轨迹点列表）和 'support'（路径支持度）的字典。
+    """
 
     if not trajectories:
         raise ValueError("轨迹数据为空或无效")
 
-    # 构建轨迹图
-    graph = build_graph(trajectories)
-    result_paths = set()
+    encoder, encoded = encode_trajectories(trajectories)
+    graph = build_graph(encoded)
+    best = TopK(top_k, kmin, mmin)
+    for path, support in iter_graph_paths(
+        graph, kmin, mmin, progress, max_length, threshold=best.threshold, observe=observe
+    ):
+        best.offer(path, support)
+
+    return [{'path': encoder.decode_path(path), 'support': support} for path, support in best.ranked()]
+
 
-    # 使用显式栈实现迭代版的 DFS
-    def dfs_iterative(start_node, kmin, mmin):
-        stack = [(start_node, [start_node], float('inf'))]  # 栈中存储 (当前节点, 当前路径, 当前频率)
-        visited_paths = set()
+def iter_graph_paths(graph, kmin, mmin, progress=None, max_length=None, max_results=None, threshold=None,
+                     observe=None):
+    """
+    在轨迹图中逐条产出满足 kmin / mmin 的简单路径及其支持度（各条边转移频率的最小值）。
+
+    参数同 TTHS，graph 为 build_graph 的返回值；threshold 为可选的回调，
+    返回展开路径时要求的最低支持度（默认 mmin），用于 top-k 搜索中动态提升阈值。
+
+    产出：
+    - (path, support): 节点元组与路径支持度；单点路径的支持度为 0。
+    """
+    # 所有起点共享：只保留频繁边的邻接表（包含只作为终点出现的节点）
+    adjacency = {}
+    for node, neighbors in graph.items():
+        adjacency.setdefault(node, [])
+        for neighbor, freq in neighbors.items():
+            adjacency.setdefault(neighbor, [])
+            if freq >= mmin:
+                adjacency[node].append((neighbor, freq))
+    if observe:
+        observe('graph_nodes', len(adjacency), None)
+        observe('graph_edges', sum(len(neighbors) for neighbors in graph.values()), None)
+        observe('frequent_edges', sum(len(neighbors) for neighbors in adjacency.values()), None)
+
+    # 所有起点共享：从每个节点出发的简单路径最多包含的节点数
+    depth_bound = _depth_bounds({
+        node: [neighbor for neighbor, _ in neighbors] for node, neighbors in adjacency.items()
+    })
+    length_limit = max_length if max_length is not None else len(adjacency)
+    emitted = 0
+    longest_path = 0
+
+    for start_node in adjacency:
+        if max_results is not None and emitted >= max_results:
+            return
+        # 从该起点出发不可能达到 kmin 的路径直接跳过
+        if min(depth_bound[start_node], length_limit) < kmin:
+            if progress:
+                progress(longest_path, emitted)
+            continue
+
+        # 显式栈深度优先搜索：路径原地增删，不为每次入栈复制路径；supports[i] 为前 i+1 个节点构成的路径的支持度
+        path = [start_node]
+        on_path = {start_node}
+        supports = [float('inf')]
+        stack = [iter(adjacency[start_node])]
+        if kmin <= 1:
+            yield (start_node,), 0
+            emitted += 1
+            longest_path = max(longest_path, 1)
 
         while stack:
-            current_node, current_path, current_frequency = stack.pop()
-            if tuple(current_path) in visited_paths:
+            if max_results is not None and emitted >= max_results:
+                return
+            neighbor, freq = next(stack[-1], (None, None))
+            if neighbor is None:
+                stack.pop()
+                supports.pop()
+                on_path.discard(path.pop())
+                continue
+            if neighbor in on_path or len(path) >= length_limit:
                 continue
-            visited_paths.add(tuple(current_path))
+            # 即使走到底也达不到 kmin 的分支无需展开
+            if len(path) + depth_bound[neighbor] < kmin:
+                continue
+            # 支持度只会随路径延长而降低，低于当前阈值的分支无需展开
+            support = min(supports[-1], freq)
+            if threshold is not None and support < threshold():
+                continue
+
+            path.append(neighbor)
+            on_path.add(neighbor)
+            supports.append(support)
+            stack.append(iter(adjacency[neighbor]))
+            if len(path) >= kmin:
+                yield tuple(path), support
+                emitted += 1
+                longest_path = max(longest_path, len(path))
+
+        if progress:
+            progress(longest_path, emitted)
+
 
-            if len(current_path) >= kmin and current_frequency >= mmin:
-                result_paths.add(tuple(current_path))
+def _depth_bounds(adjacency):
+    """
+    计算从每个节点出发的简单路径最多包含的节点数（上界）。
 
-            for neighbor, freq in graph[current_node].items():
-                min_freq = min(current_frequency, freq)
-                if min_freq >= mmin:
-                    stack.append((neighbor, current_path + [neighbor], min_freq))
+    先用迭代版 Tarjan 算法求强连通分量，分量按逆拓扑序产出；
+    每个分量的上界为其节点数加上后继分量上界的最大值。
+    """
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    scc_stack = []
+    component = {}
+    component_bound = []
+    counter = 0
 
-    # 遍历所有节点，进行迭代版 DFS
-    for node in graph.keys():
-        dfs_iterative(node, kmin, mmin)
+    for root in adjacency:
+        if root in index:
+            continue
+        work = [(root, iter(adjacency[root]))]
+        index[root] = lowlink[root] = counter
+        counter += 1
+        scc_stack.append(root)
+        on_stack.add(root)
 
-    # 转换为所需的输出格式
-    hotspot_paths = []
-    for path in result_paths:
-        hotspot_path = []
-        for item in path:
-            hotspot_path.append({
-                'latitude': item[0],
-                'longitude': item[1]
-            })
-        hotspot_paths.append(hotspot_path)
+        while work:
+            node, neighbors = work[-1]
+            advanced = False
+            for neighbor in neighbors:
+                if neighbor not in index:
+                    index[neighbor] = lowlink[neighbor] = counter
+                    counter += 1
+                    scc_stack.append(neighbor)
+                    on_stack.add(neighbor)
+                    work.append((neighbor, iter(adjacency[neighbor])))
+                    advanced = True
+                    break
+                if neighbor in on_stack:
+                    lowlink[node] = min(lowlink[node], index[neighbor])
+            if advanced:
+                continue
 
-    return hotspot_paths
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index[node]:
+                # 弹出一个强连通分量，其后继分量都已处理完毕
+                members = []
+                while True:
+                    member = scc_stack.pop()
+                    on_stack.discard(member)
+                    component[member] = len(component_bound)
+                    members.append(member)
+                    if member == node:
+                        break
+                current = len(component_bound)
+                successor_bound = max(
+                    (component_bound[component[neighbor]]
+                     for member in members
+                     for neighbor in adjacency[member]
+                     if component[neighbor] != current),
+                    default=0
+                )
+                component_bound.append(len(members) + successor_bound)
 
+    return {node: component_bound[component[node]] for node in adjacency}
 
-def build_graph(trajectories):
+
+def build_graph(encoded):
     """
-    构建轨迹图，节点为轨迹点，边的权重为两点之间的转移频率。
+    构建轨迹图，节点为轨迹点 ID，边的权重为两点之间的转移频率。
 
     参数：
-    - trajectories: 轨迹列表。
+    - encoded: encode_trajectories 返回的 (trajectory_id, 点 ID 数组) 列表。
 
     返回：
     - graph: 以邻接表形式存储的图结构。
     """
+    # 每条边的支持集用轨迹位图记录，同一轨迹重复经过的边自然只计一次
+    bitmap_index = BitmapIndex()
+    edge_bits = collections.defaultdict(lambda: collections.defaultdict(int))
+    for trajectory_id, points in encoded:
+        trajectory_bit = bitmap_index.bit(trajectory_id)
+        for node, next_node in zip(points, points[1:]):
+            edge_bits[node][next_node] |= trajectory_bit
+
     graph = collections.defaultdict(lambda: collections.defaultdict(int))
-    for trajectory in trajectories:
-        nodes = trajectory['nodes']
-        visited_edges = set()
-        for i in range(len(nodes) - 1):
-            node = (nodes[i]['latitude'], nodes[i]['longitude'])
-            next_node = (nodes[i + 1]['latitude'], nodes[i + 1]['longitude'])
-            edge = (node, next_node)
-            if edge not in visited_edges:
-                graph[node][next_node] += 1
-                visited_edges.add(edge)
+    for node, neighbors in edge_bits.items():
+        for next_node, traj_bits in neighbors.items():
+            graph[node][next_node] = popcount(traj_bits)
     return graph
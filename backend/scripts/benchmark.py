@@ -0,0 +1,355 @@
+"""
+NDTTJ / NDTTT / TTHS 挖掘算法的离线基准测试。
+
+合成数据的形态参照 Geolife：轨迹点按 csv_to_mysql.py 的方式保留四位小数（约 11 米网格），
+采样间隔数秒，轨迹长度在均值附近波动；一部分轨迹会经过若干条公共的"热点路线"。
+同一参数和随机种子总是生成相同的数据，结果可重复，可用于回归对比和重新确定算法切换阈值。
+
+用法示例：
+    python -m backend.scripts.benchmark --trajectories 20 50 200 --kmin 3 5 --mmin 2 6
+    python -m backend.scripts.benchmark --output baseline.json
+    python -m backend.scripts.benchmark --baseline baseline.json --tolerance 0.2
+    python -m backend.scripts.benchmark --calibrate cost_model.json
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from backend.scripts.NDTTJ import NDTTJ
+from backend.scripts.NDTTT import NDTTT
+from backend.scripts.TTHS import TTHS
+from backend.scripts.planner import collect_statistics, cost_features, load_cost_model, plan_mining
+
+ALGORITHMS = {
+    'NDTTJ': NDTTJ,
+    'NDTTT': NDTTT,
+    'TTHS': TTHS,
+}
+
+# 合成数据的中心点（北京，Geolife 数据集的主要区域）与网格步长
+ORIGIN = (39.9042, 116.4074)
+GRID_STEP = 0.0001
+MOVES = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+
+def _walk(rng, start, length, extent, visited):
+    """
+    在 [-extent, extent] 的网格内做不重复经过的随机游走，无路可走时提前结束。
+    """
+    cells = []
+    current = start
+    for _ in range(length):
+        if current in visited:
+            break
+        visited.add(current)
+        cells.append(current)
+        candidates = [
+            (current[0] + dx, current[1] + dy) for dx, dy in MOVES
+            if abs(current[0] + dx) <= extent and abs(current[1] + dy) <= extent
+            and (current[0] + dx, current[1] + dy) not in visited
+        ]
+        if not candidates:
+            break
+        current = rng.choice(candidates)
+    return cells
+
+
+def generate_trajectories(num_trajectories, length=50, point_reuse=0.5, hotspot_density=0.3,
+                          num_hotspots=5, seed=0):
+    """
+    生成 Geolife 形态的合成轨迹。
+
+    单条轨迹内的点互不重复：NDTTJ 的连接在出现环路时不会终止，真实数据经 5 分钟间隔切分后也很少原地绕圈。
+
+    参数：
+    - num_trajectories: 轨迹数量。
+    - length: 平均轨迹长度（点数），每条轨迹在 50%~150% 之间随机取值。
+    - point_reuse: 点复用程度，取值 [0, 1)；越大网格范围越小，不同轨迹经过相同点的概率越高。
+    - hotspot_density: 经过热点路线的轨迹比例，取值 [0, 1]。
+    - num_hotspots: 热点路线数量。
+    - seed: 随机种子。
+
+    返回：
+    - trajectories: 轨迹列表，结构同 load_processed_data 的返回值。
+    """
+    if not 0 <= point_reuse < 1:
+        raise ValueError("point_reuse 必须在 [0, 1) 之间")
+    if not 0 <= hotspot_density <= 1:
+        raise ValueError("hotspot_density 必须在 [0, 1] 之间")
+
+    rng = random.Random(seed)
+    # 网格半径：不复用时大致能容纳所有轨迹点，复用程度越高网格越小
+    extent = max(length, int((num_trajectories * length) ** 0.5 * (1 - point_reuse)))
+
+    hotspots = [
+        _walk(rng, (rng.randint(-extent, extent), rng.randint(-extent, extent)), length, extent, set())
+        for _ in range(num_hotspots)
+    ]
+
+    trajectories = []
+    timestamp = 1224730000  # Geolife 数据集的起始时间附近
+    for trajectory_id in range(num_trajectories):
+        target_length = max(2, int(length * rng.uniform(0.5, 1.5)))
+        visited = set()
+        cells = []
+        if hotspots and rng.random() < hotspot_density:
+            # 截取热点路线中的一段，前后接上随机游走
+            route = rng.choice(hotspots)
+            segment_length = min(len(route), max(2, target_length // 2))
+            offset = rng.randint(0, len(route) - segment_length)
+            segment = route[offset:offset + segment_length]
+            prefix_length = rng.randint(0, target_length - segment_length)
+            start = (segment[0][0] + rng.choice((-1, 1)), segment[0][1] + rng.choice((-1, 1)))
+            visited.update(segment)
+            cells = _walk(rng, start, prefix_length, extent, visited)[::-1]
+            cells.extend(segment)
+            suffix = target_length - len(cells)
+            if suffix > 0:
+                last = segment[-1]
+                extra = _walk(rng, (last[0] + rng.choice((-1, 1)), last[1] + rng.choice((-1, 1))),
+                              suffix, extent, visited)
+                cells.extend(extra)
+        else:
+            start = (rng.randint(-extent, extent), rng.randint(-extent, extent))
+            cells = _walk(rng, start, target_length, extent, visited)
+
+        nodes = []
+        for x, y in cells:
+            timestamp += rng.randint(1, 5)
+            nodes.append({
+                'latitude': round(ORIGIN[0] + x * GRID_STEP, 4),
+                'longitude': round(ORIGIN[1] + y * GRID_STEP, 4),
+                'timestamp': timestamp
+            })
+        timestamp += 600  # 与下一条轨迹之间超过 5 分钟的间隔
+        trajectories.append({'trajectory_id': trajectory_id, 'nodes': nodes})
+
+    return trajectories
+
+
+def _run_once(algorithm, trajectories, kmin, mmin, tths_options):
+    if algorithm == 'TTHS':
+        return ALGORITHMS[algorithm](trajectories, kmin, mmin, **tths_options)
+    return ALGORITHMS[algorithm](trajectories, kmin, mmin)
+
+
+def measure(algorithm, trajectories, kmin, mmin, repeat=3, tths_options=None):
+    """
+    测量单个算法在一组参数下的表现。
+
+    计时取 repeat 次运行中的最小值；峰值内存由额外一次 tracemalloc 跟踪的运行得到，
+    避免跟踪开销计入耗时。
+
+    返回：
+    - result: 包含 seconds、peak_mb、paths、max_length 的字典。
+    """
+    tths_options = tths_options or {}
+    best = None
+    hotspots = []
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        started = time.perf_counter()
+        hotspots = _run_once(algorithm, trajectories, kmin, mmin, tths_options)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        _run_once(algorithm, trajectories, kmin, mmin, tths_options)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'seconds': best,
+        'peak_mb': peak / (1024 * 1024),
+        'paths': len(hotspots),
+        'max_length': max((len(path) for path in hotspots), default=0),
+    }
+
+
+def run_benchmark(trajectory_counts, kmins, mmins, algorithms=tuple(ALGORITHMS), length=50,
+                  point_reuse=0.5, hotspot_density=0.3, num_hotspots=5, seed=0, repeat=3,
+                  tths_options=None, cost_model=None, report=None):
+    """
+    在 轨迹数量 × kmin × mmin 的参数网格上运行各算法。
+
+    参数：
+    - cost_model: 代价模型系数，用于记录规划器在每组参数下会选择的算法。
+    - report: 可选回调，每得到一条结果时调用，便于边跑边输出。
+
+    返回：
+    - results: 结果字典列表，每项包含参数、measure 的测量值、代价模型特征 features 与规划器的选择 planned。
+    """
+    tths_options = tths_options or {}
+    results = []
+    for num_trajectories in trajectory_counts:
+        trajectories = generate_trajectories(
+            num_trajectories, length=length, point_reuse=point_reuse,
+            hotspot_density=hotspot_density, num_hotspots=num_hotspots, seed=seed
+        )
+        for kmin, mmin in itertools.product(kmins, mmins):
+            statistics = collect_statistics(trajectories, mmin)
+            features = cost_features(statistics, kmin, mmin, **tths_options)
+            planned = plan_mining(trajectories, kmin, mmin, cost_model=cost_model, **tths_options)['algorithm']
+            for algorithm in algorithms:
+                # 存在环路时 NDTTJ 不会终止，规划器也不会选择它
+                if features[algorithm] is None:
+                    continue
+                result = {
+                    'algorithm': algorithm,
+                    'trajectories': num_trajectories,
+                    'kmin': kmin,
+                    'mmin': mmin,
+                    'features': features[algorithm],
+                    'planned': planned,
+                }
+                result.update(measure(algorithm, trajectories, kmin, mmin, repeat=repeat, tths_options=tths_options))
+                results.append(result)
+                if report:
+                    report(result)
+    return results
+
+
+def _result_key(result):
+    return result['algorithm'], result['trajectories'], result['kmin'], result['mmin']
+
+
+def compare_results(results, baseline, tolerance=0.2):
+    """
+    与基线结果对比，返回回归描述列表：耗时超出基线 (1 + tolerance) 倍，或结果数量不一致。
+    """
+    baseline_by_key = {_result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline_by_key.get(_result_key(result))
+        if previous is None:
+            continue
+        name = "{} n={} kmin={} mmin={}".format(*_result_key(result))
+        if result['paths'] != previous['paths']:
+            regressions.append(f"{name}: 结果数量 {previous['paths']} -> {result['paths']}")
+        if result['seconds'] > previous['seconds'] * (1 + tolerance):
+            regressions.append(f"{name}: 耗时 {previous['seconds']:.4f}s -> {result['seconds']:.4f}s")
+    return regressions
+
+
+def fastest_by_size(results):
+    """按轨迹数量汇总各参数组合下最快的算法，用于重新确定算法切换阈值"""
+    totals = {}
+    for result in results:
+        size_totals = totals.setdefault(result['trajectories'], {})
+        size_totals[result['algorithm']] = size_totals.get(result['algorithm'], 0) + result['seconds']
+    return {size: min(size_totals, key=size_totals.get) for size, size_totals in sorted(totals.items())}
+
+
+def fit_cost_model(results):
+    """
+    用基准测试结果拟合代价模型系数：对每个算法按相对误差做最小二乘，负系数截断为 0。
+
+    返回：
+    - cost_model: 可保存为 JSON 并通过 MINING_COST_MODEL 配置加载的系数字典。
+    """
+    import numpy as np
+
+    cost_model = load_cost_model()
+    for algorithm, coefficients in cost_model.items():
+        rows = [result for result in results if result['algorithm'] == algorithm and result['seconds'] > 0]
+        if not rows:
+            continue
+        names = sorted(coefficients)
+        # 每行除以实测耗时，使小规模与大规模数据的相对误差同等重要
+        a = np.array([[row['features'][name] / row['seconds'] for name in names] for row in rows])
+        b = np.ones(len(rows))
+        solution, *_ = np.linalg.lstsq(a, b, rcond=None)
+        cost_model[algorithm] = {name: max(float(value), 0.0) for name, value in zip(names, solution)}
+    return cost_model
+
+
+def planner_accuracy(results):
+    """统计规划器选中实测最快算法的参数组合比例"""
+    fastest = {}
+    planned = {}
+    for result in results:
+        key = (result['trajectories'], result['kmin'], result['mmin'])
+        if key not in fastest or result['seconds'] < fastest[key][1]:
+            fastest[key] = (result['algorithm'], result['seconds'])
+        planned[key] = result['planned']
+    hits = sum(1 for key, (algorithm, _) in fastest.items() if planned[key] == algorithm)
+    return hits, len(fastest)
+
+
+def _format_row(result):
+    return (f"{result['algorithm']:<6} {result['trajectories']:>6} {result['kmin']:>5} {result['mmin']:>5} "
+            f"{result['seconds']:>10.4f} {result['peak_mb']:>9.2f} {result['paths']:>8} {result['max_length']:>6} "
+            f"{result['planned']:>6}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NDTTJ / NDTTT / TTHS 离线基准测试")
+    parser.add_argument('--trajectories', type=int, nargs='+', default=[20, 50, 200, 1000], help="轨迹数量")
+    parser.add_argument('--kmin', type=int, nargs='+', default=[3, 5], help="最小路径长度")
+    parser.add_argument('--mmin', type=int, nargs='+', default=[2, 6], help="最小频繁度")
+    parser.add_argument('--algorithms', nargs='+', choices=list(ALGORITHMS), default=list(ALGORITHMS))
+    parser.add_argument('--length', type=int, default=50, help="平均轨迹长度")
+    parser.add_argument('--point-reuse', type=float, default=0.5, help="点复用程度 [0, 1)")
+    parser.add_argument('--hotspot-density', type=float, default=0.3, help="经过热点路线的轨迹比例 [0, 1]")
+    parser.add_argument('--hotspots', type=int, default=5, help="热点路线数量")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="计时重复次数（取最小值）")
+    parser.add_argument('--tths-max-length', type=int,
+                        default=int(os.getenv('TTHS_MAX_LENGTH')) if os.getenv('TTHS_MAX_LENGTH') else None)
+    # 低 mmin 下 TTHS 的简单路径数量会爆炸式增长，未配置时默认截断，避免基准测试耗尽内存
+    parser.add_argument('--tths-max-results', type=int,
+                        default=int(os.getenv('TTHS_MAX_RESULTS')) if os.getenv('TTHS_MAX_RESULTS') else 100000)
+    parser.add_argument('--cost-model', default=os.getenv('MINING_COST_MODEL'), help="代价模型系数 JSON 文件")
+    parser.add_argument('--calibrate', help="用本次结果拟合代价模型系数并保存为 JSON 文件")
+    parser.add_argument('--output', help="将结果保存为 JSON 文件，可作为之后对比的基线")
+    parser.add_argument('--baseline', help="与基线 JSON 文件对比，出现回归时以非零状态码退出")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="允许的耗时增长比例")
+    args = parser.parse_args(argv)
+
+    print(f"{'算法':<6} {'轨迹数':>6} {'kmin':>5} {'mmin':>5} {'耗时(s)':>10} {'峰值(MB)':>9} {'路径数':>8} {'最长':>6} {'规划':>6}")
+    results = run_benchmark(
+        args.trajectories, args.kmin, args.mmin, algorithms=args.algorithms, length=args.length,
+        point_reuse=args.point_reuse, hotspot_density=args.hotspot_density, num_hotspots=args.hotspots,
+        seed=args.seed, repeat=args.repeat,
+        tths_options={'max_length': args.tths_max_length, 'max_results': args.tths_max_results},
+        cost_model=load_cost_model(args.cost_model),
+        report=lambda result: print(_format_row(result), flush=True)
+    )
+
+    print("\n各轨迹数量下总耗时最短的算法：")
+    for size, algorithm in fastest_by_size(results).items():
+        print(f"  {size:>6} 条轨迹: {algorithm}")
+    hits, total = planner_accuracy(results)
+    print(f"规划器选中最快算法的参数组合：{hits}/{total}")
+
+    if args.calibrate:
+        with open(args.calibrate, 'w', encoding='utf-8') as f:
+            json.dump(fit_cost_model(results), f, indent=4)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, ensure_ascii=False, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare_results(results, baseline, args.tolerance)
+        if regressions:
+            print("\n与基线相比出现回归：")
+            for regression in regressions:
+                print("  " + regression)
+            return 1
+        print("\n与基线相比未发现回归。")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
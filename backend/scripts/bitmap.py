@@ -0,0 +1,51 @@
+"""
+轨迹支持集的位图表示。
+
+支持集用 Python 整数表示，第 i 位为 1 表示第 i 条轨迹包含该路径；
+求交集为按字的位与运算，支持度为位计数，内存占用约为每条轨迹 1 bit。
+"""
+
+if hasattr(int, 'bit_count'):
+    popcount = int.bit_count
+else:
+    def popcount(bitmap):
+        """统计位图中 1 的个数（即支持度）"""
+        return bin(bitmap).count('1')
+
+
+def iter_bits(bitmap):
+    """按从低到高的顺序产出位图中所有为 1 的位的位置"""
+    while bitmap:
+        lowest = bitmap & -bitmap
+        yield lowest.bit_length() - 1
+        bitmap ^= lowest
+
+
+class BitmapIndex:
+    """
+    轨迹 ID 与位图位置的映射，位置按首次登记的顺序分配且不再改变，
+    可以随增量挖掘状态一起保存。
+    """
+
+    def __init__(self):
+        self.ids = []
+        self.positions = {}
+
+    def bit(self, trajectory_id):
+        """返回轨迹对应的单个位，未登记的轨迹分配下一个位置"""
+        position = self.positions.get(trajectory_id)
+        if position is None:
+            position = self.positions[trajectory_id] = len(self.ids)
+            self.ids.append(trajectory_id)
+        return 1 << position
+
+    def mask(self, trajectory_ids):
+        """返回一组已登记轨迹的位图"""
+        bitmap = 0
+        for trajectory_id in trajectory_ids:
+            bitmap |= 1 << self.positions[trajectory_id]
+        return bitmap
+
+    def decode(self, bitmap):
+        """将位图还原为轨迹 ID 列表"""
+        return [self.ids[position] for position in iter_bits(bitmap)]
@@ -0,0 +1,198 @@
+"""
+列式轨迹存储。
+
+一个用户的全部轨迹保存为一个文件：JSON 文件头之后依次是轨迹 ID、轨迹偏移、纬度、经度与时间戳五个定长数组，
+读取时以内存映射（numpy.memmap）直接访问，不解析 JSON、不创建节点字典；
+挖掘算法通过 encode_trajectories 直接在数组上完成轨迹点编码。
+
+文件格式：
+- 8 字节小端无符号整数：文件头长度 H（按 8 字节对齐）。
+- H 字节 JSON 文件头：{"version", "trajectories", "points", "meta"}，meta 为调用方的同步信息。
+- trajectory_ids: int64[trajectories]
+- offsets: int64[trajectories + 1]，第 i 条轨迹的点位于 [offsets[i], offsets[i + 1])
+- latitudes / longitudes / timestamps: float64[points]
+"""
+import json
+import os
+import struct
+import tempfile
+from array import array
+import numpy as np
+
+FORMAT_VERSION = 1
+
+_HEADER_LENGTH = struct.Struct('<Q')
+
+
+class ColumnarTrajectories:
+    """
+    轨迹集合的列式表示，可以直接传给 NDTTJ / NDTTT / TTHS 与规划器。
+
+    迭代时按需构造与 load_processed_data 相同结构的轨迹字典，供仍需要节点字典的代码使用。
+    """
+
+    def __init__(self, trajectory_ids, offsets, latitudes, longitudes, timestamps, meta=None):
+        self.trajectory_ids = trajectory_ids
+        self.offsets = offsets
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.timestamps = timestamps
+        self.meta = meta or {}
+
+    @classmethod
+    def from_trajectories(cls, trajectories, meta=None):
+        """
+        由轨迹字典列表构建，每个轨迹是一个包含 'trajectory_id' 和 'nodes' 的字典；没有节点的轨迹被跳过。
+        """
+        trajectory_ids = []
+        lengths = []
+        latitudes, longitudes, timestamps = array('d'), array('d'), array('d')
+        for trajectory in trajectories:
+            nodes = trajectory['nodes']
+            if not nodes:
+                continue
+            trajectory_ids.append(trajectory['trajectory_id'])
+            lengths.append(len(nodes))
+            for node in nodes:
+                latitudes.append(node['latitude'])
+                longitudes.append(node['longitude'])
+                timestamp = node.get('timestamp')
+                timestamps.append(np.nan if timestamp is None else timestamp)
+
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(
+            np.array(trajectory_ids, dtype=np.int64), offsets,
+            np.frombuffer(latitudes, dtype=np.float64), np.frombuffer(longitudes, dtype=np.float64),
+            np.frombuffer(timestamps, dtype=np.float64), meta
+        )
+
+    def __len__(self):
+        return len(self.trajectory_ids)
+
+    def __repr__(self):
+        return f"<ColumnarTrajectories trajectories={len(self)} points={len(self.latitudes)}>"
+
+    def __iter__(self):
+        latitudes, longitudes = self.latitudes.tolist(), self.longitudes.tolist()
+        timestamps = self.timestamps.tolist()
+        offsets = self.offsets.tolist()
+        for index, trajectory_id in enumerate(self.trajectory_ids.tolist()):
+            nodes = [
+                {"latitude": latitudes[i], "longitude": longitudes[i], "timestamp": timestamps[i]}
+                for i in range(offsets[index], offsets[index + 1])
+            ]
+            yield {"trajectory_id": trajectory_id, "nodes": nodes}
+
+    def select(self, trajectory_ids):
+        """返回只包含指定轨迹（保持原有顺序）的新集合，只复制被选中轨迹的点"""
+        index = np.flatnonzero(np.isin(self.trajectory_ids, np.asarray(list(trajectory_ids), dtype=np.int64)))
+        lengths = np.diff(self.offsets)[index]
+        offsets = np.zeros(len(index) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        point_index = np.arange(offsets[-1]) + np.repeat(self.offsets[index] - offsets[:-1], lengths)
+        return ColumnarTrajectories(
+            self.trajectory_ids[index], offsets, self.latitudes[point_index],
+            self.longitudes[point_index], self.timestamps[point_index], self.meta
+        )
+
+    def append(self, other, meta=None):
+        """返回追加了另一组轨迹后的新集合"""
+        offsets = np.concatenate((self.offsets, other.offsets[1:] + self.offsets[-1]))
+        return ColumnarTrajectories(
+            np.concatenate((self.trajectory_ids, other.trajectory_ids)), offsets,
+            np.concatenate((self.latitudes, other.latitudes)),
+            np.concatenate((self.longitudes, other.longitudes)),
+            np.concatenate((self.timestamps, other.timestamps)),
+            self.meta if meta is None else meta
+        )
+
+    def encode(self, encoder):
+        """
+        在数组上完成轨迹点编码：先对 (纬度, 经度) 去重，再按首次出现的顺序把不同的点交给编码器，
+        分配的 ID 与逐个节点调用 encoder.encode_nodes 完全一致；每条轨迹的点 ID 从整数数组整段复制。
+
+        返回：
+        - encoded: (trajectory_id, 点 ID 数组) 的列表。
+        """
+        if not len(self.latitudes):
+            return [(trajectory_id, array('i')) for trajectory_id in self.trajectory_ids.tolist()]
+
+        # 经纬度合并为一个复数，一次 unique 完成二维去重
+        keys = np.asarray(self.latitudes) + 1j * np.asarray(self.longitudes)
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        order = np.argsort(first, kind='stable')
+        unique_ids = np.empty(len(first), dtype=np.int32)
+        unique_ids[order] = encoder.encode_points(
+            self.latitudes[first[order]].tolist(), self.longitudes[first[order]].tolist()
+        )
+        point_ids = unique_ids[inverse.reshape(-1)]
+
+        encoded = []
+        offsets = self.offsets.tolist()
+        for index, trajectory_id in enumerate(self.trajectory_ids.tolist()):
+            points = array('i')
+            points.frombytes(point_ids[offsets[index]:offsets[index + 1]].tobytes())
+            encoded.append((trajectory_id, points))
+        return encoded
+
+
+def write_columnar(path, trajectories):
+    """
+    把列式轨迹集合写入文件：先写临时文件再原子替换，读取方不会看到写了一半的文件。
+    """
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "trajectories": len(trajectories),
+        "points": len(trajectories.latitudes),
+        "meta": trajectories.meta
+    }).encode('utf-8')
+    header += b' ' * (-len(header) % 8)
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER_LENGTH.pack(len(header)))
+            f.write(header)
+            for column, dtype in (
+                (trajectories.trajectory_ids, np.int64), (trajectories.offsets, np.int64),
+                (trajectories.latitudes, np.float64), (trajectories.longitudes, np.float64),
+                (trajectories.timestamps, np.float64)
+            ):
+                f.write(np.ascontiguousarray(column, dtype=dtype).tobytes())
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+
+def read_columnar(path):
+    """
+    以内存映射方式打开列式轨迹文件，数组直接映射文件内容，不做复制。
+
+    返回：
+    - trajectories: ColumnarTrajectories；文件不存在或格式版本不符时返回 None。
+    """
+    try:
+        with open(path, 'rb') as f:
+            (header_length,) = _HEADER_LENGTH.unpack(f.read(_HEADER_LENGTH.size))
+            header = json.loads(f.read(header_length))
+    except (FileNotFoundError, struct.error, ValueError):
+        return None
+    if header.get("version") != FORMAT_VERSION:
+        return None
+
+    count, points = header["trajectories"], header["points"]
+    offset = _HEADER_LENGTH.size + header_length
+    columns = []
+    for dtype, length in ((np.int64, count), (np.int64, count + 1),
+                          (np.float64, points), (np.float64, points), (np.float64, points)):
+        if length:
+            columns.append(np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(length,)))
+        else:
+            columns.append(np.empty(0, dtype=dtype))
+        offset += length * np.dtype(dtype).itemsize
+    return ColumnarTrajectories(*columns, meta=header["meta"])
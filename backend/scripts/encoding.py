@@ -0,0 +1,78 @@
+"""
+轨迹点的整数编码。
+
+每个不同的 (纬度, 经度) 点在一次挖掘中只被哈希一次，映射为从 0 开始的整数 ID；
+轨迹以紧凑的 array('i') 存储，挖掘算法只在整数 ID 上运算，
+仅在输出结果时再解码为经纬度。
+"""
+from array import array
+from backend.scripts.columnar import ColumnarTrajectories
+
+
+class PointEncoder:
+    """
+    轨迹点与整数 ID 的双向映射，ID 按首次出现的顺序分配且不再改变，
+    可以随增量挖掘状态一起保存。
+    """
+
+    def __init__(self):
+        self.points = []
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.points)
+
+    def encode_point(self, latitude, longitude):
+        """返回点的整数 ID，未出现过的点分配下一个 ID"""
+        point = (latitude, longitude)
+        point_id = self.ids.get(point)
+        if point_id is None:
+            point_id = self.ids[point] = len(self.points)
+            self.points.append(point)
+        return point_id
+
+    def encode_points(self, latitudes, longitudes):
+        """批量编码一组互不相同的点，返回对应的 ID 列表；编码器为空时直接按顺序分配"""
+        if not self.points:
+            self.points = list(zip(latitudes, longitudes))
+            self.ids = dict(zip(self.points, range(len(self.points))))
+            return list(range(len(self.points)))
+        return [self.encode_point(latitude, longitude) for latitude, longitude in zip(latitudes, longitudes)]
+
+    def encode_nodes(self, nodes):
+        """将轨迹节点列表编码为整数数组，只使用经纬度，忽略时间戳"""
+        return array('i', [self.encode_point(node['latitude'], node['longitude']) for node in nodes])
+
+    def decode_path(self, path):
+        """将整数 ID 路径解码为所需的输出格式"""
+        hotspot_path = []
+        for point_id in path:
+            latitude, longitude = self.points[point_id]
+            hotspot_path.append({
+                'latitude': latitude,
+                'longitude': longitude
+            })
+        return hotspot_path
+
+
+def encode_trajectories(trajectories, encoder=None):
+    """
+    编码一组轨迹。
+
+    参数：
+    - trajectories: 轨迹列表，每个轨迹是一个包含 'nodes' 和 'trajectory_id' 的字典；
+      也可以是列式存储的 ColumnarTrajectories，此时直接在数组上编码。
+    - encoder: 可选的已有编码器，不传时新建。
+
+    返回：
+    - (encoder, encoded): 编码器，以及 (trajectory_id, 点 ID 数组) 的列表。
+    """
+    if encoder is None:
+        encoder = PointEncoder()
+    if isinstance(trajectories, ColumnarTrajectories):
+        return encoder, trajectories.encode(encoder)
+    encoded = [
+        (trajectory['trajectory_id'], encoder.encode_nodes(trajectory['nodes']))
+        for trajectory in trajectories
+    ]
+    return encoder, encoded
@@ -0,0 +1,231 @@
+import collections
+from backend.scripts.bitmap import BitmapIndex, popcount
+from backend.scripts.encoding import PointEncoder
+from backend.scripts.topk import TopK
+
+# 挖掘状态的格式版本，格式变化后旧状态会被丢弃并全量重建
+STATE_VERSION = 3
+
+
+def _frequent(table, mmin):
+    return {path: traj_bits for path, traj_bits in table.items() if popcount(traj_bits) >= mmin}
+
+
+def update_NDTTT_state(state, new_trajectories, mmin, load_trajectories, progress=None):
+    """
+    增量版 NDTTT：把新轨迹合并进已保存的各阶路径表，结果与全量重新挖掘一致。
+
+    状态中保存每一阶的候选路径表（未剪枝），即所有由上一阶频繁路径扩展得到的路径及其轨迹位图，
+    以及轨迹 ID 与位图位置、轨迹点与整数 ID 的映射。
+    新轨迹只需扫描一遍；只有"因新轨迹而变为频繁"的路径，
+    才需要回扫它原有支持集中的旧轨迹来补齐下一阶的候选。
+
+    参数：
+    - state: 上一次的挖掘状态，为 None 时从空状态开始（即全量挖掘）。
+    - new_trajectories: 新增轨迹列表，'trajectory_id' 必须在所有轨迹中唯一且稳定（如数据库主键）。
+    - mmin: 最小频繁度，必须与状态中的一致。
+    - load_trajectories: 回调，传入轨迹 ID 集合，返回这些旧轨迹（结构同 new_trajectories）。
+    - progress: 可选的进度回调，每完成一阶路径表时以 (当前路径长度 k, 路径表大小) 调用。
+
+    返回：
+    - state: 更新后的挖掘状态。
+    """
+    if state is None:
+        state = {
+            "version": STATE_VERSION, "algorithm": "NDTTT", "mmin": mmin,
+            "bitmap_index": BitmapIndex(), "encoder": PointEncoder(), "tables": []
+        }
+    if state["mmin"] != mmin:
+        raise ValueError("增量挖掘的最小频繁度与已保存的状态不一致")
+
+    tables = state["tables"]
+    bitmap_index = state["bitmap_index"]
+    encoder = state["encoder"]
+    new_points = {
+        bitmap_index.bit(trajectory['trajectory_id']): encoder.encode_nodes(trajectory['nodes'])
+        for trajectory in new_trajectories
+    }
+    new_bits = 0
+    for trajectory_bit in new_points:
+        new_bits |= trajectory_bit
+
+    # 1 阶路径表：所有单点路径
+    if not tables:
+        tables.append(collections.defaultdict(int))
+    for trajectory_bit, points in new_points.items():
+        for point in points:
+            tables[0][(point,)] |= trajectory_bit
+
+    k = 1
+    while True:
+        pruned_table = _frequent(tables[k - 1], mmin)
+        if progress:
+            progress(k, len(pruned_table))
+        if not pruned_table:
+            # 更高阶的候选都由频繁路径扩展而来，此时必然为空
+            del tables[k:]
+            break
+
+        # 本次新变为频繁的路径：旧支持集不足 mmin
+        newly_frequent = {
+            path: traj_bits & ~new_bits
+            for path, traj_bits in pruned_table.items()
+            if popcount(traj_bits & ~new_bits) < mmin
+        }
+
+        if len(tables) == k:
+            tables.append(collections.defaultdict(int))
+        next_path_table = tables[k]
+
+        # 新轨迹：扩展其中所有频繁路径的出现位置
+        for trajectory_bit, points in new_points.items():
+            for i in range(len(points) - k):
+                current_path = tuple(points[i:i + k])
+                if current_path in pruned_table:
+                    next_path_table[current_path + (points[i + k],)] |= trajectory_bit
+
+        # 旧轨迹：只回扫新变为频繁的路径所在的轨迹
+        old_bits = 0
+        for traj_bits in newly_frequent.values():
+            old_bits |= traj_bits
+        if old_bits:
+            for trajectory in load_trajectories(bitmap_index.decode(old_bits)):
+                trajectory_bit = bitmap_index.bit(trajectory['trajectory_id'])
+                points = encoder.encode_nodes(trajectory['nodes'])
+                for i in range(len(points) - k):
+                    current_path = tuple(points[i:i + k])
+                    if newly_frequent.get(current_path, 0) & trajectory_bit:
+                        next_path_table[current_path + (points[i + k],)] |= trajectory_bit
+
+        k += 1
+
+    return state
+
+
+def update_NDTTJ_state(state, new_trajectories, mmin, progress=None):
+    """
+    增量版 NDTTJ：把新轨迹合并进已保存的各阶频繁路径表，结果与全量重新挖掘一致。
+
+    NDTTJ 中 k+1 阶路径的支持集只取决于两条 k 阶父路径的支持集，
+    因此只需保存完整的 2 阶路径表（未剪枝）、各阶频繁路径表，
+    以及轨迹 ID 与位图位置、轨迹点与整数 ID 的映射，
+    每一阶只对支持集发生变化的路径重新做连接，其余表项保持不变，无需回读旧轨迹。
+
+    参数：
+    - state: 上一次的挖掘状态，为 None 时从空状态开始（即全量挖掘）。
+    - new_trajectories: 新增轨迹列表，'trajectory_id' 必须在所有轨迹中唯一且稳定（如数据库主键）。
+    - mmin: 最小频繁度，必须与状态中的一致。
+    - progress: 可选的进度回调，每完成一阶路径表时以 (当前路径长度 k, 路径表大小) 调用。
+
+    返回：
+    - state: 更新后的挖掘状态。
+    """
+    if state is None:
+        state = {
+            "version": STATE_VERSION, "algorithm": "NDTTJ", "mmin": mmin,
+            "bitmap_index": BitmapIndex(), "encoder": PointEncoder(),
+            "edges": collections.defaultdict(int), "tables": []
+        }
+    if state["mmin"] != mmin:
+        raise ValueError("增量挖掘的最小频繁度与已保存的状态不一致")
+
+    edges = state["edges"]
+    tables = state["tables"]
+    bitmap_index = state["bitmap_index"]
+    encoder = state["encoder"]
+
+    # 2 阶路径表：所有相邻两点构成的路径
+    touched = set()
+    for trajectory in new_trajectories:
+        trajectory_bit = bitmap_index.bit(trajectory['trajectory_id'])
+        points = encoder.encode_nodes(trajectory['nodes'])
+        for path in zip(points, points[1:]):
+            edges[path] |= trajectory_bit
+            touched.add(path)
+
+    if not tables:
+        tables.append({})
+    pruned_table = tables[0]
+    pruned_table.update(_frequent({path: edges[path] for path in touched}, mmin))
+    changed = touched & pruned_table.keys()
+
+    k = 2
+    while True:
+        if progress:
+            progress(k, len(pruned_table))
+        if not changed:
+            # 支持集未变化的路径连接结果也不变，更高阶的表无需更新
+            break
+
+        by_prefix = collections.defaultdict(list)
+        by_suffix = collections.defaultdict(list)
+        for path in pruned_table:
+            by_prefix[path[:-1]].append(path)
+            by_suffix[path[1:]].append(path)
+
+        if len(tables) == k - 1:
+            tables.append({})
+        next_path_table = tables[k - 1]
+        next_changed = set()
+
+        def join(path1, path2):
+            combined_bits = pruned_table[path1] & pruned_table[path2]
+            if popcount(combined_bits) >= mmin:
+                new_path = path1 + (path2[-1],)
+                if next_path_table.get(new_path) != combined_bits:
+                    next_path_table[new_path] = combined_bits
+                    next_changed.add(new_path)
+
+        for path in changed:
+            # 作为左路径连接
+            for path2 in by_prefix.get(path[1:], ()):
+                join(path, path2)
+            # 作为右路径连接，左路径也发生变化时已在上面处理
+            for path1 in by_suffix.get(path[:-1], ()):
+                if path1 not in changed:
+                    join(path1, path)
+
+        if not next_path_table:
+            del tables[k - 1:]
+            break
+        pruned_table = next_path_table
+        changed = next_changed
+        k += 1
+
+    return state
+
+
+def hotspots_from_state(state, kmin):
+    """
+    从挖掘状态中收集满足 kmin 的频繁路径，并转换为所需的输出格式。
+
+    返回：
+    - hotspot_paths: 热点路径列表。
+    """
+    return list(iter_hotspots_from_state(state, kmin))
+
+
+def iter_hotspots_from_state(state, kmin, with_support=False):
+    """hotspots_from_state 的生成器版本，逐条产出解码后的热点路径；with_support 为 True 时产出 (路径, 支持轨迹数)"""
+    mmin = state["mmin"]
+    encoder = state["encoder"]
+    for table in state["tables"]:
+        for path, traj_bits in table.items():
+            support = popcount(traj_bits)
+            if len(path) >= kmin and support >= mmin:
+                yield (encoder.decode_path(path), support) if with_support else encoder.decode_path(path)
+
+
+def top_k_from_state(state, kmin, top_k):
+    """
+    从挖掘状态中取支持度最高的 top_k 条路径（支持度相同时较长者优先）。
+
+    返回：
+    - ranked_paths: 按排名排序的列表，每项为包含 'path' 和 'support' 的字典。
+    """
+    best = TopK(top_k, kmin, state["mmin"])
+    for table in state["tables"]:
+        for path, traj_bits in table.items():
+            best.offer(path, popcount(traj_bits))
+    encoder = state["encoder"]
+    return [{'path': encoder.decode_path(path), 'support': support} for path, support in best.ranked()]
@@ -0,0 +1,171 @@
+"""
+基于代价估计的挖掘算法选择。
+
+只扫描一遍轨迹，统计节点总数、不同点数、平均/最大长度以及频繁边（至少出现在 mmin 条轨迹中的相邻点对）的分布，
+再用线性代价模型分别估计 NDTTJ / NDTTT / TTHS 的耗时，选择估计代价最小的算法。
+模型系数可以用 `python -m backend.scripts.benchmark --calibrate` 在目标机器上重新拟合。
+"""
+import collections
+import json
+import math
+from backend.scripts.encoding import encode_trajectories
+
+# 默认系数（秒 / 单位特征），由合成数据基准测试拟合得到
+DEFAULT_COST_MODEL = {
+    'NDTTJ': {'nodes': 1.2e-6, 'join': 2.1e-6},
+    'NDTTT': {'nodes': 6.2e-7, 'scan': 6.1e-7},
+    'TTHS': {'nodes': 5.9e-6, 'search': 1.0e-6},
+}
+
+# TTHS 路径数量估计的上限，防止分支因子较大时数值溢出
+MAX_ESTIMATED_PATHS = 1e15
+
+
+def load_cost_model(path=None):
+    """
+    读取代价模型系数；未指定文件时返回默认系数，文件中缺失的项沿用默认值。
+    """
+    model = {algorithm: dict(coefficients) for algorithm, coefficients in DEFAULT_COST_MODEL.items()}
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            for algorithm, coefficients in json.load(f).items():
+                model.setdefault(algorithm, {}).update(coefficients)
+    return model
+
+
+def collect_statistics(trajectories, mmin):
+    """
+    统计影响挖掘代价的轨迹特征，耗时与节点总数成线性关系。
+
+    参数：
+    - trajectories: 轨迹列表，每个轨迹是一个包含 'nodes' 和 'trajectory_id' 的字典。
+    - mmin: 最小频繁度。
+
+    返回：
+    - statistics: 统计信息字典：
+      trajectories / total_nodes / distinct_points / avg_length / max_length：轨迹规模；
+      frequent_points / frequent_edges / branching：频繁边构成的子图规模与平均出度；
+      max_run：轨迹中连续频繁边构成的最长片段的点数，是频繁路径长度（即挖掘层数）的上界；
+      run_subpaths：所有连续频繁片段的子路径数之和，用于估计候选路径数量；
+      cyclic：是否有轨迹在频繁边上形成环路（此时 NDTTJ 的连接不会终止）。
+    """
+    _, encoded = encode_trajectories(trajectories)
+
+    # 第一遍：每条边的支持度（同一轨迹内重复经过只计一次）
+    edge_support = collections.Counter()
+    distinct_points = set()
+    total_nodes = 0
+    max_length = 0
+    for _, points in encoded:
+        total_nodes += len(points)
+        max_length = max(max_length, len(points))
+        distinct_points.update(points)
+        edge_support.update(set(zip(points, points[1:])))
+
+    frequent_edges = [edge for edge, support in edge_support.items() if support >= mmin]
+    frequent_sources = {edge[0] for edge in frequent_edges}
+    frequent_points = frequent_sources | {edge[1] for edge in frequent_edges}
+
+    # 第二遍：连续频繁边片段的长度与环路检测
+    max_run = 0
+    run_subpaths = 0
+    cyclic = False
+    for _, points in encoded:
+        run = 0
+        positions = {}
+        for i, edge in enumerate(zip(points, points[1:])):
+            if edge_support[edge] >= mmin:
+                run += 1
+                for position, point in ((i, edge[0]), (i + 1, edge[1])):
+                    if positions.setdefault(point, position) != position:
+                        cyclic = True
+            else:
+                run_subpaths += run * (run + 1) // 2
+                max_run = max(max_run, run + 1 if run else 0)
+                run = 0
+        run_subpaths += run * (run + 1) // 2
+        max_run = max(max_run, run + 1 if run else 0)
+
+    return {
+        'trajectories': len(encoded),
+        'total_nodes': total_nodes,
+        'distinct_points': len(distinct_points),
+        'avg_length': total_nodes / len(encoded) if encoded else 0,
+        'max_length': max_length,
+        'frequent_points': len(frequent_points),
+        'frequent_edges': len(frequent_edges),
+        'branching': len(frequent_edges) / len(frequent_sources) if frequent_sources else 0,
+        'max_run': max_run,
+        'run_subpaths': run_subpaths,
+        'cyclic': cyclic,
+    }
+
+
+def cost_features(statistics, kmin, mmin, max_length=None, max_results=None):
+    """
+    计算各算法代价模型的特征值；某个算法不适用时其特征为 None。
+
+    - NDTTT 每一阶都扫描全部轨迹窗口：scan = 节点总数 × 层数；
+    - NDTTJ 的连接代价与候选路径数量及分支因子相关：join = 候选路径数 × 分支因子；
+    - TTHS 枚举频繁子图中的全部简单路径：search = 频繁点数 × 按分支因子几何增长的路径数。
+    """
+    levels = max(statistics['max_run'], 1)
+    total_nodes = statistics['total_nodes']
+    branching = max(statistics['branching'], 1.0)
+
+    # 频繁路径至少出现在 mmin 条轨迹中，片段子路径数按 mmin 折算为不同路径的数量
+    candidate_paths = statistics['run_subpaths'] / max(mmin, 1)
+
+    depth = levels if max_length is None else min(levels, max_length)
+    if branching == 1.0:
+        paths_per_start = depth
+    else:
+        exponent = min(depth, math.log(MAX_ESTIMATED_PATHS) / math.log(branching))
+        paths_per_start = (branching ** exponent - 1) / (branching - 1)
+    search = min(statistics['frequent_points'] * paths_per_start, MAX_ESTIMATED_PATHS)
+    if depth < kmin:
+        # 没有能达到 kmin 的路径，所有起点都会被可达深度上界直接剪掉
+        search = statistics['frequent_points']
+    if max_results is not None:
+        search = min(search, max_results * depth)
+
+    return {
+        'NDTTJ': None if statistics['cyclic'] else {'nodes': total_nodes, 'join': candidate_paths * branching},
+        'NDTTT': {'nodes': total_nodes, 'scan': total_nodes * levels},
+        'TTHS': {'nodes': total_nodes, 'search': search},
+    }
+
+
+def plan_mining(trajectories, kmin, mmin, cost_model=None, max_length=None, max_results=None):
+    """
+    估计各算法的代价并选择代价最小的算法。
+
+    参数：
+    - trajectories: 轨迹列表。
+    - kmin: 最小路径长度。
+    - mmin: 最小频繁度。
+    - cost_model: 代价模型系数，默认使用 DEFAULT_COST_MODEL。
+    - max_length / max_results: TTHS 的路径长度与结果数量上限。
+
+    返回：
+    - plan: 包含 algorithm（选中的算法）、estimates（各算法的估计耗时，单位秒；不适用时为 None）
+      与 statistics（collect_statistics 的结果）的字典。
+    """
+    cost_model = cost_model or DEFAULT_COST_MODEL
+    statistics = collect_statistics(trajectories, mmin)
+    features = cost_features(statistics, kmin, mmin, max_length=max_length, max_results=max_results)
+
+    estimates = {}
+    for algorithm, algorithm_features in features.items():
+        if algorithm_features is None:
+            estimates[algorithm] = None
+            continue
+        coefficients = cost_model[algorithm]
+        estimates[algorithm] = sum(coefficients.get(name, 0) * value for name, value in algorithm_features.items())
+
+    applicable = {algorithm: estimate for algorithm, estimate in estimates.items() if estimate is not None}
+    return {
+        'algorithm': min(applicable, key=applicable.get),
+        'estimates': estimates,
+        'statistics': statistics,
+    }
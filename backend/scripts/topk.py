@@ -0,0 +1,65 @@
+"""
+Top-k 热点路径挖掘的公共部分。
+
+路径按支持度从高到低排序，支持度相同时较长的路径优先，再相同时按挖掘算法的产出顺序。
+支持度是反单调的（路径扩展后支持度不会升高），因此当已收集满 k 条路径时，
+第 k 名的支持度就是新的有效阈值，支持度低于它的路径及其所有扩展都可以提前剪掉。
+"""
+import heapq
+
+
+class TopK:
+    """
+    保留最好的 k 条路径，并给出随之动态提升的支持度阈值。
+    """
+
+    def __init__(self, k, kmin, mmin):
+        if k < 1:
+            raise ValueError("top_k 必须为正整数")
+        self.k = k
+        self.kmin = kmin
+        self.mmin = mmin
+        self.heap = []  # 小顶堆，堆顶为当前第 k 名
+        self.sequence = 0
+
+    def threshold(self):
+        """当前的有效支持度阈值：未收集满 k 条时为 mmin，否则为第 k 名的支持度"""
+        if len(self.heap) < self.k:
+            return self.mmin
+        return max(self.mmin, self.heap[0][0])
+
+    def offer(self, path, support):
+        """提交一条候选路径，长度不足 kmin 或排不进前 k 名时忽略"""
+        if len(path) < self.kmin or support < self.mmin:
+            return
+        # 序号取负：支持度和长度都相同时，先产出的路径排名更高
+        entry = (support, len(path), -self.sequence, path)
+        self.sequence += 1
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif entry > self.heap[0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def ranked(self):
+        """
+        返回：
+        - ranked: 按排名排序的 (路径, 支持度) 列表。
+        """
+        return [(path, support) for support, _, _, path in sorted(self.heap, reverse=True)]
+
+
+def rank_paths(paths_with_support):
+    """
+    按与 TopK 相同的规则对全部路径排序，不限制数量，用于完整结果的排序保存。
+
+    参数：
+    - paths_with_support: 产出 (路径, 支持度) 的可迭代对象。
+
+    返回：
+    - ranked: 按排名排序的 (路径, 支持度) 列表。
+    """
+    entries = [
+        (support, len(path), -sequence, path) for sequence, (path, support) in enumerate(paths_with_support)
+    ]
+    entries.sort(key=lambda entry: entry[:3], reverse=True)
+    return [(path, support) for support, _, _, path in entries]